@@ -0,0 +1,187 @@
+/*
+ * Clientside drawing of the dashboard graphs, used when myapp.py runs with
+ * DASHBOARD_MODE=clientside. The page carries the data as columnar arrays
+ * (dashboard_data.DashboardData.payload()), sorted by year and with leagues
+ * and teams as codes, and these functions filter it and build the same
+ * figures myapp.py's Python callback draws, without a request to the server.
+ */
+(function () {
+    "use strict";
+
+    var BASE_STAT_CATEGORIES = [["bases_stolen", "Bases Stolen"], ["caught_stealing", "Caught Stealing"]];
+
+    // first index whose year is not below year (upper = false) or above it (upper = true)
+    function yearBound(years, year, upper) {
+        var low = 0, high = years.length;
+        while (low < high) {
+            var middle = (low + high) >>> 1;
+            if (upper ? years[middle] <= year : years[middle] < year) {
+                low = middle + 1;
+            } else {
+                high = middle;
+            }
+        }
+        return low;
+    }
+
+    // which codes of a list of names are selected
+    function codeLookup(names, selected) {
+        var lookup = new Uint8Array(names.length);
+        var wanted = new Set(selected || []);
+        for (var code = 0; code < names.length; code++) {
+            lookup[code] = wanted.has(names[code]) ? 1 : 0;
+        }
+        return lookup;
+    }
+
+    // indexes of the rows of a frame in the year range and selected leagues (and teams, when given)
+    function selectRows(frame, years, leagueLookup, teamLookup) {
+        var start = yearBound(frame.year, years[0], false);
+        var stop = yearBound(frame.year, years[1], true);
+        var rows = [];
+        for (var row = start; row < stop; row++) {
+            if (frame.league[row] >= 0 && leagueLookup[frame.league[row]]
+                    && (!teamLookup || (frame.team[row] >= 0 && teamLookup[frame.team[row]]))) {
+                rows.push(row);
+            }
+        }
+        return rows;
+    }
+
+    function pick(column, rows) {
+        return rows.map(function (row) { return column[row]; });
+    }
+
+    function layout(data, extra) {
+        var result = {
+            template: data.template,
+            xaxis: {anchor: "y", domain: [0.0, 1.0]},
+            yaxis: {anchor: "x", domain: [0.0, 1.0]},
+            legend: {tracegroupgap: 0}
+        };
+        return Object.assign(result, extra);
+    }
+
+    function colour(data, index) {
+        var colours = data.template.layout.colorway;
+        return colours[index % colours.length];
+    }
+
+    function lineGraph(data, years, rows) {
+        var frame = data.leaders;
+        return {
+            data: [{
+                type: "scatter", mode: "lines", name: "", legendgroup: "", showlegend: false,
+                orientation: "v", xaxis: "x", yaxis: "y",
+                hovertemplate: "Year=%{x}<br>Number of Bases Stolen=%{y}<extra></extra>",
+                line: {color: colour(data, 0), dash: "solid"}, marker: {symbol: "circle"},
+                x: pick(frame.year, rows), y: pick(frame.bases_stolen, rows)
+            }],
+            layout: layout(data, {
+                xaxis: {anchor: "y", domain: [0.0, 1.0], title: {text: "Year"}},
+                yaxis: {anchor: "x", domain: [0.0, 1.0], title: {text: "Number of Bases Stolen"}},
+                title: {text: "Most Stolen Bases By Year (" + years[0] + "-" + years[1] + ") "}
+            })
+        };
+    }
+
+    function stackedBarGraph(data, years, rows) {
+        var frame = data.team_stats;
+        // sums by team, the teams in alphabetical order as the categories are
+        var sums = {};
+        rows.forEach(function (row) {
+            var team = frame.team[row];
+            if (!sums[team]) {
+                sums[team] = {bases_stolen: 0, caught_stealing: 0};
+            }
+            sums[team].bases_stolen += frame.bases_stolen[row];
+            sums[team].caught_stealing += frame.caught_stealing[row];
+        });
+        var codes = Object.keys(sums).map(Number).sort(function (a, b) { return a - b; });
+        // teams tied for tenth place may be picked differently from the server's unstable sort
+        var top10 = codes.slice().sort(function (a, b) {
+            return sums[b].bases_stolen - sums[a].bases_stolen;
+        }).slice(0, 10);
+        var shown = codes.filter(function (code) { return top10.indexOf(code) >= 0; });
+        var teamNames = shown.map(function (code) { return data.teams[code]; });
+        return {
+            data: BASE_STAT_CATEGORIES.map(function (category, index) {
+                return {
+                    type: "bar", name: category[1], legendgroup: category[1], showlegend: true,
+                    orientation: "v", textposition: "auto", xaxis: "x", yaxis: "y",
+                    hovertemplate: "base_stat_category=" + category[1]
+                        + "<br>Team Name=%{x}<br>Number of Bases=%{y}<extra></extra>",
+                    marker: {color: colour(data, index), pattern: {shape: ""}},
+                    x: teamNames,
+                    y: shown.map(function (code) { return sums[code][category[0]]; })
+                };
+            }).filter(function (trace) { return trace.x.length > 0; }),
+            layout: layout(data, {
+                xaxis: {anchor: "y", domain: [0.0, 1.0], title: {text: "Team Name"},
+                        categoryorder: "array",
+                        categoryarray: top10.map(function (code) { return data.teams[code]; })},
+                yaxis: {anchor: "x", domain: [0.0, 1.0], title: {text: "Number of Bases"}},
+                legend: {title: {text: "<b>Base Statistic Category</b>"}, tracegroupgap: 0},
+                title: {text: "Top 10 Teams by Total Bases Stolen Between (" + years[0] + "-" + years[1] + ")"},
+                barmode: "stack"
+            })
+        };
+    }
+
+    function salaryHistogram(data, years, rows) {
+        var frame = data.salary_bins;
+        var total = 0;
+        rows.forEach(function (row) { total += frame.players[row]; });
+        var bins = Math.max(1, Math.round(Math.sqrt(total)) * 2);
+        var traces = [];
+        data.league_order.forEach(function (league, index) {
+            var code = data.leagues.indexOf(league);
+            var mine = rows.filter(function (row) { return frame.league[row] === code; });
+            if (mine.length === 0) {
+                return;
+            }
+            traces.push({
+                type: "histogram", histfunc: "sum", bingroup: "x", nbinsx: bins,
+                name: league, legendgroup: league, showlegend: true,
+                orientation: "v", xaxis: "x", yaxis: "y",
+                hovertemplate: "league=" + league
+                    + "<br>Player Salary($)=%{x}<br>sum of players=%{y}<extra></extra>",
+                marker: {color: colour(data, index), pattern: {shape: ""}},
+                x: pick(frame.salary, mine), y: pick(frame.players, mine)
+            });
+        });
+        return {
+            data: traces,
+            layout: layout(data, {
+                xaxis: {anchor: "y", domain: [0.0, 1.0], title: {text: "Player Salary($)"}},
+                yaxis: {anchor: "x", domain: [0.0, 1.0], title: {text: "count"}, type: "log"},
+                legend: {title: {text: "<b>Baseball League</b>"}, tracegroupgap: 0},
+                title: {text: "Distribution of Player Salary Who Stole the Most Bases ("
+                        + years[0] + "-" + years[1] + ")"},
+                barmode: "relative"
+            })
+        };
+    }
+
+    // the three figures for a selection, in the order of the graphs on the page
+    function drawGraphs(years, leagues, teams, data) {
+        if (!data || !years) {
+            return [{}, {}, {}];
+        }
+        var leagueLookup = codeLookup(data.leagues, leagues);
+        var teamLookup = codeLookup(data.teams, teams);
+        return [
+            lineGraph(data, years, selectRows(data.leaders, years, leagueLookup, null)),
+            stackedBarGraph(data, years, selectRows(data.team_stats, years, leagueLookup, teamLookup)),
+            salaryHistogram(data, years, selectRows(data.salary_bins, years, leagueLookup, teamLookup))
+        ];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        dashboard: {drawGraphs: drawGraphs}
+    });
+
+    if (typeof module !== "undefined") {
+        module.exports = {drawGraphs: drawGraphs};
+    }
+}());
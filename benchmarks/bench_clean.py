@@ -0,0 +1,206 @@
+"""Benchmark the clean.py engine against the original script's pandas code on
+synthetic raw tables.
+
+Each table gets --rows rows of realistic values mixed with the rows the cleaner
+removes (repeated headers, missing values). Both versions read the same CSV
+files, and their cleaned and removed rows are checked to be identical.
+
+    py benchmarks/bench_clean.py --rows 2000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import clean
+
+TEAMS = np.array(["Chicago Cubs", "St. Louis Cardinals", "New York Yankees",
+                  "Boston Red Sox", "Oakland Athletics", "Washington Senators"])
+
+
+def _years(rng, rows):
+    return rng.integers(1876, 2025, rows).astype(str)
+
+
+def _with_junk(df, rng, junk_row, share=0.05):
+    junk = rng.random(len(df)) < share
+    for column, value in junk_row.items():
+        df.loc[junk, column] = value
+    return df
+
+
+def make_leaders(rows, rng):
+    df = pd.DataFrame({
+        "Year": _years(rng, rows),
+        "League": rng.choice(["American League", "National League"], rows),
+        "Player ID": np.char.add("player", rng.integers(0, 5000, rows).astype(str)),
+        "Player Name": np.char.add("Player ", rng.integers(0, 5000, rows).astype(str)),
+        "Team": rng.choice(TEAMS, rows),
+        "Bases Stolen": rng.integers(10, 130, rows).astype(str),
+    })
+    return _with_junk(df, rng, {"Year": "Year", "Player ID": "", "Player Name": "-",
+                                "Team": "-", "Bases Stolen": "-"})
+
+
+def make_base_running(rows, rng):
+    sb = rng.integers(0, 1500, rows)
+    df = pd.DataFrame({
+        "Player ID": np.char.add("player", rng.integers(0, 5000, rows).astype(str)),
+        "Team": np.char.add(np.char.add(_years(rng, rows), " "), rng.choice(TEAMS, rows)),
+        "Stolen Bases (SB)": np.where(sb >= 1000, np.char.add("1,", (sb % 1000).astype(str).astype("U3")),
+                                      sb.astype(str)),
+        "Caught Stealing (CS)": np.where(rng.random(rows) < 0.1, "-",
+                                         rng.integers(0, 40, rows).astype(str)),
+        "Stolen Bases Percentage": np.char.add(".", rng.integers(100, 999, rows).astype(str)),
+    })
+    career = rng.random(rows) < 0.05
+    df.loc[career, "Team"] = "12 Years"
+    return _with_junk(df, rng, {"Team": "Team", "Stolen Bases (SB)": "SB",
+                                "Caught Stealing (CS)": "CS", "Stolen Bases Percentage": "SB%"})
+
+
+def make_salary(rows, rng):
+    salary = rng.integers(1000, 30_000_000, rows)
+    kind = rng.random(rows)
+    df = pd.DataFrame({
+        "Player ID": np.char.add("player", rng.integers(0, 5000, rows).astype(str)),
+        "Team": np.char.add(np.char.add(_years(rng, rows), " "), rng.choice(TEAMS, rows)),
+        "Uniform Numbers": rng.integers(0, 99, rows).astype(str),
+        "Salary": np.where(kind < 0.05, clean.BLANK_SALARY,
+                           np.where(kind < 0.2, "Undetermined",
+                                    np.char.add("$", salary.astype(str)))),
+    })
+    return _with_junk(df, rng, {"Team": "Team | Roster", "Uniform Numbers": "Uniform Numbers",
+                                "Salary": "Salary"})
+
+
+# the cleaning code of clean.py before it became an engine
+def legacy_leaders(df):
+    is_valid = (df["Year"].str.isdigit()
+                & df["League"].isin(["American League", "National League"])
+                & df["Bases Stolen"].str.isdigit())
+    removed = df[is_valid == False]
+    yoy_df = df[is_valid == True].copy()
+    yoy_df["Year"] = yoy_df["Year"].astype(int)
+    yoy_df["Player ID"] = yoy_df["Player ID"].astype(str).str.strip()
+    yoy_df["Player Name"] = yoy_df["Player Name"].astype(str).str.strip()
+    yoy_df["Team"] = yoy_df["Team"].astype(str).str.strip()
+    yoy_df["Bases Stolen"] = yoy_df["Bases Stolen"].astype(int)
+    return yoy_df, removed
+
+
+def legacy_base_running(df):
+    is_valid = (df["Team"].astype(str).str.match(r"\d+ \w+", na=False)
+                & df["Stolen Bases (SB)"].str.contains(r"(\d|-)", na=False)
+                & df["Caught Stealing (CS)"].str.contains(r"(\d|-)", na=False)
+                & df["Stolen Bases Percentage"].str.contains(r"(\d|-)", na=False))
+    removed = df[is_valid == False]
+    stats_df = df[is_valid == True].copy()
+    stats_df.rename(columns={"Team": "Year and Team"}, inplace=True)
+    stats_df[["Year", "Team"]] = stats_df["Year and Team"].str.split(" ", n=1, expand=True)
+    stats_df = stats_df.drop(columns=["Year and Team"])
+    stats_df["Year"] = stats_df["Year"].astype(int)
+    stats_df["Team"] = stats_df["Team"].astype(str).str.strip()
+    stats_df["Stolen Bases (SB)"] = stats_df["Stolen Bases (SB)"].replace("[,-]", "", regex=True).replace("", 0).astype(int)
+    stats_df["Caught Stealing (CS)"] = stats_df["Caught Stealing (CS)"].replace("[,-]", "", regex=True).replace("", 0).astype(int)
+    stats_df["Stolen Bases Percentage"] = stats_df["Stolen Bases Percentage"].replace("[-]", "", regex=True).replace("", 0).astype(float)
+    return stats_df, removed
+
+
+def legacy_salary(df):
+    is_valid = (df["Team"].astype(str).str.match(r"\d+ \w+", na=False)
+                & df["Uniform Numbers"].str.contains(r"(\d|-|n/a)", na=False)
+                & df["Salary"].str.contains(r'(Undetermined|$|")', na=False))
+    removed = df[is_valid == False]
+    salary_df = df[is_valid == True].copy()
+    salary_df.rename(columns={"Team": "Year and Team"}, inplace=True)
+    salary_df[["Year", "Team"]] = salary_df["Year and Team"].str.split(" ", n=1, expand=True)
+    salary_df = salary_df.drop(columns=["Year and Team"])
+    salary_df["Year"] = salary_df["Year"].astype(int)
+    salary_df["Team"] = salary_df["Team"].astype(str).str.strip()
+    salary_df["Uniform Numbers"] = salary_df["Uniform Numbers"].astype(str).str.strip()
+    salary_df["Salary"] = salary_df["Salary"].astype(str).str.strip()
+    salary_df["Salary"] = salary_df["Salary"].replace('"     "', None)
+    salary_df["Salary"] = salary_df["Salary"].ffill()
+    salary_df["Salary"] = salary_df["Salary"].replace("Undetermined", None)
+    salary_df["Salary"] = salary_df["Salary"].replace(r"[\$,]", "", regex=True).astype(float)
+    return salary_df, removed
+
+
+TABLES = [
+    ("bases_stolen_league_leaders", make_leaders, legacy_leaders, clean.LEADERS_SCHEMA),
+    ("base_running_stats", make_base_running, legacy_base_running, clean.BASE_RUNNING_SCHEMA),
+    ("player_salary", make_salary, legacy_salary, clean.SALARY_SCHEMA),
+]
+
+
+def same(left, right):
+    left = left.reset_index(drop=True)
+    right = right.reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(left.astype(object).where(left.notna(), None),
+                                      right.astype(object).where(right.notna(), None),
+                                      check_dtype=False)
+        return True
+    except AssertionError:
+        return False
+
+
+def timed(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per table")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    kernels = [name for name in clean.KERNELS
+               if _available(name)]
+    print(f"{args.rows:,} rows per table, best of {args.repeat} runs")
+    print(f"{'table':<30} {'version':<9} {'read (s)':>9} {'clean (s)':>10} {'speedup':>8}  identical")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, make, legacy, schema in TABLES:
+            path = os.path.join(directory, f"{name}.csv")
+            make(args.rows, rng).to_csv(path, index=False)
+
+            read_time, raw = timed(lambda: pd.read_csv(path), args.repeat)
+            legacy_time, expected = timed(lambda: legacy(raw), args.repeat)
+            print(f"{name:<30} {'legacy':<9} {read_time:>9.3f} {legacy_time:>10.3f} {1:>7.1f}x")
+
+            for kernel_name in kernels:
+                engine = clean.get_kernels(kernel_name)
+                read_time, raw_table = timed(lambda: clean.read_raw(path, engine), args.repeat)
+                clean_time, result = timed(lambda: clean.clean_table(raw_table, schema, engine),
+                                           args.repeat)
+                identical = all(same(a, b) for a, b in zip(result, expected))
+                print(f"{'':<30} {kernel_name:<9} {read_time:>9.3f} {clean_time:>10.3f} "
+                      f"{legacy_time / clean_time:>7.1f}x  {identical}")
+
+
+def _available(name):
+    try:
+        clean.get_kernels(name)
+        return True
+    except ImportError:
+        return False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Benchmark the dashboard's filters on object-string frames against the
+categorical frames dashboard_data.py holds, on a synthetic leader history.
+
+Each frame has --rows rows of seasons, leagues, teams, bases stolen and
+salaries. Filtering by a year range, both leagues and half of the teams is
+timed with the isin masks myapp.py used before, with category code lookups
+over the whole frame, and with dashboard_data.filter()'s binary search of a
+frame sorted by year before the code lookups; all must select the same rows.
+Memory is the frame's own size and the growth of the resident set of a fresh
+process while it builds the frame.
+
+    py benchmarks/bench_dashboard.py --rows 5000000
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import dashboard_data
+
+LEAGUES = np.array(["American League", "National League"])
+
+
+# resident set size of this process in bytes, None where /proc is not available
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def make_leaders(rows, teams, seed, coded=False):
+    rng = np.random.default_rng(seed)
+    names = [f"Team {number:03d}" for number in range(teams)]
+    league_codes = rng.integers(0, 2, rows)
+    team_codes = rng.integers(0, teams, rows)
+    if coded:
+        league = pd.Categorical.from_codes(league_codes.astype(np.int8), list(LEAGUES))
+        team = pd.Categorical.from_codes(team_codes.astype(np.int16), names)
+    else:
+        # a string object per row, as reading the frame from SQLite gives
+        league = np.array([(LEAGUES[code] + " ")[:-1] for code in league_codes], dtype=object)
+        team = np.array([(names[code] + " ")[:-1] for code in team_codes], dtype=object)
+    return pd.DataFrame({
+        "year": rng.integers(1876, 2026, rows),
+        "league": league,
+        "team": team,
+        "bases_stolen": rng.integers(10, 130, rows),
+        "salary": np.where(rng.random(rows) < 0.3, np.nan, rng.integers(1000, 30_000_000, rows)),
+    })
+
+
+def object_filter(df, years, leagues, teams):
+    return df[(df["league"].isin(leagues))
+              & (df["team"].isin(teams))
+              & (df["year"] >= years[0])
+              & (df["year"] <= years[1])]
+
+
+def categorical_filter(df, years, leagues, teams):
+    mask = (df["year"].to_numpy() >= years[0]) & (df["year"].to_numpy() <= years[1])
+    mask &= dashboard_data.code_mask(df["league"], leagues)
+    mask &= dashboard_data.code_mask(df["team"], teams)
+    return df[mask]
+
+
+def sorted_filter(df, year_column, years, leagues, teams):
+    start, stop = dashboard_data.year_slice(year_column, years)
+    df = df.iloc[start:stop]
+    mask = dashboard_data.code_mask(df["league"], leagues)
+    mask &= dashboard_data.code_mask(df["team"], teams)
+    return df[mask]
+
+
+# growth of the resident set of a fresh process while it builds a frame
+def build_rss(rows, teams, seed, coded):
+    gc.collect()
+    before = rss()
+    df = make_leaders(rows, teams, seed, coded)
+    gc.collect()
+    after = rss()
+    del df
+    return after - before if before is not None and after is not None else None
+
+
+def measured_rss(rows, teams, seed, coded):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(build_rss, (rows, teams, seed, coded))
+
+
+def timed(function, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), result
+
+
+def mb(size):
+    return "n/a" if size is None else f"{size / 2**20:.1f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--teams", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-year", type=int, default=1950)
+    parser.add_argument("--last-year", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    leaders = make_leaders(args.rows, args.teams, args.seed)
+    coded = make_leaders(args.rows, args.teams, args.seed, coded=True)
+    object_rss = measured_rss(args.rows, args.teams, args.seed, False)
+    coded_rss = measured_rss(args.rows, args.teams, args.seed, True)
+
+    years = (args.first_year, args.last_year)
+    leagues = list(LEAGUES)
+    teams = sorted(leaders["team"].unique())[::2]
+
+    object_time, expected = timed(lambda: object_filter(leaders, years, leagues, teams), args.repeat)
+    coded_time, result = timed(lambda: categorical_filter(coded, years, leagues, teams), args.repeat)
+    by_year = coded.sort_values("year", kind="stable")
+    year_column = by_year["year"].to_numpy()
+    sorted_time, sorted_result = timed(lambda: sorted_filter(by_year, year_column, years, leagues, teams),
+                                       args.repeat)
+    identical = (expected.index.equals(result.index)
+                 and expected.index.sort_values().equals(sorted_result.index.sort_values()))
+
+    print(f"{args.rows:,} rows, {args.teams} teams, median of {args.repeat} runs")
+    print(f"{'frames':<12} {'filter (ms)':>12} {'speedup':>8} {'frame (MB)':>11} {'RSS (MB)':>9}")
+    print(f"{'object':<12} {object_time * 1000:>12.2f} {1:>7.1f}x "
+          f"{mb(leaders.memory_usage(deep=True, index=False).sum()):>11} {mb(object_rss):>9}")
+    print(f"{'categorical':<12} {coded_time * 1000:>12.2f} {object_time / coded_time:>7.1f}x "
+          f"{mb(coded.memory_usage(deep=True, index=False).sum()):>11} {mb(coded_rss):>9}")
+    print(f"{'by year':<12} {sorted_time * 1000:>12.2f} {object_time / sorted_time:>7.1f}x "
+          f"{mb(by_year.memory_usage(deep=True, index=False).sum()):>11} {mb(coded_rss):>9}")
+    print(f"same rows selected: {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark the page_parser backends against the old Selenium parsing path on saved pages.
+
+Point --pages at a directory of pages saved from the website. Files with
+"hisb4" in their name are parsed as the leadership board, every other
+.html/.shtml file as a player page. The Selenium path opens each page from
+disk in headless Chrome and times only the find_elements/.text work that
+web_scraping.py used to do, not the page load.
+
+    py benchmarks/bench_parsers.py --pages saved_pages --repeat 5 --selenium
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from page_parser import BACKENDS, get_backend, parse_leaderboard, parse_player_page
+
+
+# the player page parsing from web_scraping.py before page_parser.py existed
+def selenium_parse_player_page(driver, player):
+    from selenium.webdriver.common.by import By
+
+    base_running_stats = []
+    player_salary = []
+    tables = driver.find_elements(By.TAG_NAME, "table")
+    for row in tables[-2].find_elements(By.TAG_NAME, "tr")[1:]:
+        cells = row.find_elements(By.TAG_NAME, "td")
+        if len(cells) == 13:
+            base_running_stats.append((player,) + tuple(cell.text.strip() for cell in cells[:4]))
+    for row in tables[-1].find_elements(By.TAG_NAME, "tr")[1:]:
+        cells = row.find_elements(By.TAG_NAME, "td")
+        if len(cells) == 5:
+            player_salary.append((player,) + tuple(cell.text.strip() for cell in cells[:3]))
+    return base_running_stats, player_salary
+
+
+# the leadership board parsing from web_scraping.py before page_parser.py existed
+def selenium_parse_leaderboard(driver):
+    from selenium.webdriver.common.by import By
+
+    yearly_data = []
+    table = driver.find_elements(By.TAG_NAME, "table")[0]
+    for row in table.find_elements(By.TAG_NAME, "tr")[1:]:
+        cells = row.find_elements(By.TAG_NAME, "td")
+        if len(cells) != 8:
+            continue
+        for offset, league in ((0, "American League"), (4, "National League")):
+            player = cells[offset + 1]
+            links = player.find_elements(By.CSS_SELECTOR, "a[href]")
+            player_id = links[0].get_attribute("href").strip().partition("p=")[2] if links else ""
+            yearly_data.append((cells[offset].text.strip(), league, player_id,
+                                player.text.strip(), cells[offset + 3].text.strip(),
+                                cells[offset + 2].text.strip()))
+    return yearly_data
+
+
+def find_pages(directory):
+    pages = sorted(p for p in Path(directory).rglob("*")
+                   if p.suffix in (".html", ".shtml") and p.is_file())
+    if not pages:
+        raise SystemExit(f"no .html or .shtml pages found in {directory}")
+    return pages
+
+
+def parse_page(path, html, backend):
+    if "hisb4" in path.name:
+        return parse_leaderboard(html, backend)
+    return parse_player_page(html, path.stem, backend)
+
+
+def bench_backend(name, pages, repeat):
+    backend = get_backend(name)
+    htmls = [(path, path.read_text(encoding="utf-8", errors="replace")) for path in pages]
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path, html in htmls:
+            parse_page(path, html, backend)
+        timings.append(time.perf_counter() - start)
+    return timings, [parse_page(path, html, backend) for path, html in htmls]
+
+
+def bench_selenium(pages, repeat):
+    from fetcher import make_chrome_driver
+
+    driver = make_chrome_driver()
+    timings = [0.0] * repeat
+    results = []
+    try:
+        for path in pages:
+            driver.get(path.resolve().as_uri())
+            for attempt in range(repeat):
+                start = time.perf_counter()
+                if "hisb4" in path.name:
+                    result = selenium_parse_leaderboard(driver)
+                else:
+                    result = selenium_parse_player_page(driver, path.stem)
+                timings[attempt] += time.perf_counter() - start
+            results.append(result)
+    finally:
+        driver.quit()
+    return timings, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", required=True, help="directory of saved pages")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--selenium", action="store_true",
+                        help="also time the old Selenium path (needs Chrome)")
+    args = parser.parse_args(argv)
+
+    pages = find_pages(args.pages)
+    print(f"{len(pages)} pages, best of {args.repeat} runs")
+    print(f"{'parser':<12} {'total (s)':>10} {'per page (ms)':>14} {'speedup':>8}  rows match")
+
+    results = {}
+    for name in BACKENDS:
+        try:
+            results[name] = bench_backend(name, pages, args.repeat)
+        except ImportError:
+            print(f"{name:<12} not installed")
+    if args.selenium:
+        results["selenium"] = bench_selenium(pages, args.repeat)
+
+    reference = results["selenium"][1] if "selenium" in results else results["html.parser"][1]
+    slowest = max(min(timings) for timings, _ in results.values())
+    for name, (timings, rows) in results.items():
+        best = min(timings)
+        print(f"{name:<12} {best:>10.4f} {best / len(pages) * 1000:>14.3f} "
+              f"{slowest / best:>7.1f}x  {rows == reference}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Benchmark every stage of the pipeline on synthetic data at several scales.
+
+For each --scales value, synthetic.py writes the raw tables and pages of that
+many times the real number of players into a working directory. Each step
+below then runs in a fresh process, so the peak memory recorded is its own:
+
+    generate          synthetic.py writing the raw tables and pages
+    parse             page_parser.py on the leadership board and every player page
+    clean_<table>     clean.py on each raw table
+    load              sql_database.py building a new database from the cleaned tables
+    reload            sql_database.py again on that database, where nothing has changed
+    query_<case>      a query of query_db.py, run --repeat times over one connection
+    dashboard_load    dashboard_data.py reading the frames from the database
+    callback_<view>   myapp.py's server callback drawing the three graphs for a set of filters
+    payload           the data the clientside mode of myapp.py sends with the page
+
+Each step records its time (the median of --repeat runs for queries and
+callbacks), the resident set of its process before it started and at its peak,
+and the rows it handled. The results, with the machine, Python version and git
+commit, are written to a JSON file; --compare prints the change of every step
+from an earlier results file.
+
+    py benchmarks/bench_pipeline.py --scales 10 100 1000
+    py benchmarks/bench_pipeline.py --scales 10 --compare benchmark_results/20260101-120000.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import clean
+import interchange
+import sinks
+import synthetic
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RESULTS_DIR = "benchmark_results"
+
+# the query and the values each query step runs it with
+QUERY_CASES = {
+    "top_salaries": ("top_salaries", {}),
+    "top_salaries_1990s": ("top_salaries", {"year_start": 1990, "year_end": 1999}),
+    "top_team_sb_perc": ("top_team_sb_perc", {}),
+    "top_team_sb_perc_chicago": ("top_team_sb_perc", {"team": "Chicago"}),
+    "top_sb_perc_diff": ("top_sb_perc_diff", {}),
+    "top_sb_perc_diff_close": ("top_sb_perc_diff", {"threshold": 0.05}),
+}
+
+# the filters of each callback step: years, leagues, and every other team (all teams when False)
+CALLBACK_VIEWS = {
+    "default": ((1900, 2025), ("American League", "National League"), False),
+    "decade": ((1980, 1989), ("American League", "National League"), False),
+    "one_league_half_teams": ((1876, 2025), ("National League",), True),
+}
+
+
+# resident set size of this process in bytes, None where /proc is not available
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+# the largest resident set this process has had, None where the resource module is not available
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def mb(size):
+    return None if size is None else round(size / 2**20, 1)
+
+
+def timed(function, repeat=1):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+# the directories of one scale's data inside the working directory
+def paths(work):
+    return {name: os.path.join(work, name)
+            for name in ("raw_data", "pages", "cleaned_data", "removed_data", "db")}
+
+
+def _db_path(work):
+    return os.path.join(paths(work)["db"], "base_running.db")
+
+
+def step_generate(work, scale, seed):
+    seconds, counts = timed(lambda: synthetic.generate(work, scale, seed))
+    return {"seconds": seconds, "rows": sum(rows for name, rows in counts.items() if name != "pages"),
+            "pages": counts["pages"]}
+
+
+def step_parse(work, backend):
+    import page_parser
+
+    backend = page_parser.get_backend(backend)
+    pages = paths(work)["pages"]
+
+    def parse():
+        counts = {}
+        board = Path(pages, "hitting", "hisb4.shtml").read_text(encoding="utf-8")
+        counts["bases_stolen_league_leaders"] = len(page_parser.parse_leaderboard(board, backend))
+        counts["base_running_stats"] = counts["player_salary"] = 0
+        for page in sorted(Path(pages, "players").iterdir()):
+            stats, salaries = page_parser.parse_player_page(page.read_text(encoding="utf-8"), page.stem, backend)
+            counts["base_running_stats"] += len(stats)
+            counts["player_salary"] += len(salaries)
+        return counts
+
+    seconds, counts = timed(parse)
+    raw = {name: sum(1 for _ in sinks.read_rows("csv", paths(work)["raw_data"], name)) for name in counts}
+    return {"seconds": seconds, "rows": sum(counts.values()), "backend": type(backend).__name__,
+            "matches_raw": counts == raw}
+
+
+def step_clean(work, name, kernels, chunk_rows, file_format):
+    directories = paths(work)
+    os.makedirs(directories["cleaned_data"], exist_ok=True)
+    os.makedirs(directories["removed_data"], exist_ok=True)
+    seconds, writers = timed(lambda: clean.clean_file(
+        name, clean.get_kernels(kernels), chunk_rows, directories["raw_data"],
+        directories["cleaned_data"], directories["removed_data"], "csv", file_format))
+    return {"seconds": seconds, "rows": writers["cleaned"].rows + writers["removed"].rows,
+            "cleaned_rows": writers["cleaned"].rows}
+
+
+def step_load(work, file_format, batch_size, fresh):
+    import sql_database
+
+    directories = paths(work)
+    os.makedirs(directories["db"], exist_ok=True)
+    db_path = _db_path(work)
+    if fresh and os.path.exists(db_path):
+        os.remove(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        prepare_seconds, rows = timed(lambda: {
+            table: list(table_rows) for table, table_rows in sql_database.table_rows(
+                sql_database.read_cleaned(directories["cleaned_data"], file_format)).items()})
+        build_seconds, _ = timed(lambda: sql_database.build_database(db_path, rows, batch_size))
+    return {"seconds": prepare_seconds + build_seconds, "prepare_seconds": prepare_seconds,
+            "build_seconds": build_seconds, "rows": sum(len(table_rows) for table_rows in rows.values()),
+            "db_mb": mb(os.path.getsize(db_path))}
+
+
+def step_query(work, case, repeat):
+    import connections
+    import query_db
+
+    name, parameters = QUERY_CASES[case]
+    with connections.ReadOnlyDatabase(_db_path(work)) as database:
+        conn = database.connection()
+        function = query_db.QUERY_FUNCTIONS[name]
+        first_seconds, _ = timed(lambda: function(conn, **parameters))
+        seconds, rows = timed(lambda: function(conn, **parameters), repeat)
+    return {"seconds": seconds, "first_seconds": first_seconds, "rows": len(rows)}
+
+
+def step_dashboard_load(work):
+    import dashboard_data
+
+    data = dashboard_data.DashboardData(_db_path(work))
+    seconds, frames = timed(data.frames)
+    return {"seconds": seconds, "rows": sum(len(frame) for frame in frames.values()),
+            "frames_mb": mb(sum(frame.memory_usage(deep=True).sum() for frame in frames.values()))}
+
+
+def step_callback(work, view, repeat):
+    import plotly.io as pio
+
+    import dashboard_data
+    import myapp
+
+    myapp.data = dashboard_data.DashboardData(_db_path(work))
+    myapp.data.preload()
+    years, leagues, half_teams = CALLBACK_VIEWS[view]
+    teams = myapp.data.leaders["team"].cat.categories.tolist()
+    if half_teams:
+        teams = teams[::2]
+    arguments = (list(years), list(leagues), teams)
+    # the callback without the figure cache in front of it
+    update_graphs = myapp.update_graphs.__wrapped__
+    filter_seconds, selected = timed(lambda: myapp.data.select(*arguments), repeat)
+    seconds, figures = timed(lambda: update_graphs(*arguments), repeat)
+    response_bytes = sum(len(pio.to_json(figure)) for figure in figures)
+    return {"seconds": seconds, "filter_seconds": filter_seconds, "draw_seconds": seconds - filter_seconds,
+            "rows": sum(len(frame) for frame in selected.values()), "response_bytes": response_bytes}
+
+
+def step_payload(work, repeat):
+    import dashboard_data
+
+    data = dashboard_data.DashboardData(_db_path(work))
+    data.preload()
+
+    def build():
+        # payload() keeps what it built for the database version, so every run builds it again
+        data._payload = None
+        return json.dumps(data.payload())
+
+    seconds, payload = timed(build, repeat)
+    return {"seconds": seconds, "rows": sum(len(frame) for frame in data.frames().values()),
+            "payload_bytes": len(payload)}
+
+
+# run a step and measure the memory of the process it ran in
+def measured(step, *args):
+    start_rss = rss()
+    result = step(*args)
+    result["start_rss_mb"] = mb(start_rss)
+    result["peak_rss_mb"] = mb(peak_rss())
+    return result
+
+
+# run a step in a fresh process, so its peak memory is not that of the steps before it
+def in_process(step, *args):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(measured, (step, *args))
+
+
+# every step for one scale, in the order they run
+def steps(work, scale, args):
+    yield "generate", step_generate, (work, scale, args.seed)
+    yield "parse", step_parse, (work, args.parser)
+    for name in clean.TABLES:
+        yield f"clean_{name}", step_clean, (work, name, args.kernels, args.chunk_rows, args.format)
+    yield "load", step_load, (work, args.format, args.batch_size, True)
+    yield "reload", step_load, (work, args.format, args.batch_size, False)
+    for case in QUERY_CASES:
+        yield f"query_{case}", step_query, (work, case, args.repeat)
+    yield "dashboard_load", step_dashboard_load, (work,)
+    for view in CALLBACK_VIEWS:
+        yield f"callback_{view}", step_callback, (work, view, args.repeat)
+    yield "payload", step_payload, (work, args.repeat)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine():
+    return {"platform": platform.platform(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "python": platform.python_version()}
+
+
+def print_result(result):
+    peak = "n/a" if result.get("peak_rss_mb") is None else f"{result['peak_rss_mb']:.1f}"
+    print(f"x{result['scale']:<5} {result['step']:<40} {result['seconds']:>10.4f}s "
+          f"{peak:>9} MB {result['rows']:>12,} rows")
+
+
+# the change of every step's time and peak memory from an earlier results file
+def compare(results, previous):
+    before = {(result["scale"], result["step"]): result for result in previous["results"]}
+    print(f"\nCompared with {previous.get('commit') or 'unknown commit'} of {previous['created']}")
+    print(f"{'scale':<6} {'step':<40} {'time':>9} {'peak memory':>12}")
+    for result in results:
+        old = before.get((result["scale"], result["step"]))
+        if old is None:
+            continue
+        time_change = result["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        memory_change = ("n/a" if not result.get("peak_rss_mb") or not old.get("peak_rss_mb")
+                         else f"{result['peak_rss_mb'] / old['peak_rss_mb']:.2f}x")
+        print(f"x{result['scale']:<5} {result['step']:<40} {time_change:>8.2f}x {memory_change:>12}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage, query and dashboard callback on "
+                                                 "synthetic data and record their peak memory.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10],
+                        help="times as many players as the real scrape, such as 10 100 1000")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each query and callback")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parser", choices=["selectolax", "lxml", "html.parser"], default=None,
+                        help="html parser to time, defaults to the fastest one installed")
+    parser.add_argument("--kernels", choices=list(clean.KERNELS), default=None,
+                        help="backend clean.py uses, defaults to pyarrow when installed")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="clean each raw file in chunks of about this many rows")
+    parser.add_argument("--format", choices=interchange.FORMATS, default="csv",
+                        help="format of the cleaned tables passed from clean.py to sql_database.py")
+    parser.add_argument("--batch-size", type=int, default=50_000,
+                        help="rows sent to SQLite per executemany call")
+    parser.add_argument("--workdir", default=None,
+                        help="directory the synthetic data is written in, a temporary one by default")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic data afterwards")
+    parser.add_argument("--output", default=None,
+                        help=f"results file, {RESULTS_DIR}/<date and time>.json by default")
+    parser.add_argument("--compare", default=None, help="an earlier results file to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    created = datetime.datetime.now(datetime.timezone.utc)
+    output = args.output or os.path.join(RESULTS_DIR, created.strftime("%Y%m%d-%H%M%S") + ".json")
+    workdir = args.workdir or tempfile.mkdtemp(prefix="mlb_bench_")
+    options = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir", "keep")}
+
+    results = []
+    try:
+        for scale in args.scales:
+            work = os.path.join(workdir, f"x{scale}")
+            shutil.rmtree(work, ignore_errors=True)
+            for name, step, step_args in steps(work, scale, args):
+                result = {"scale": scale, "step": name, **in_process(step, *step_args)}
+                results.append(result)
+                print_result(result)
+    finally:
+        if not args.keep and args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"created": created.isoformat(timespec="seconds"), "commit": git_commit(),
+                   "machine": machine(), "options": options, "results": results}, f, indent=1)
+    print(f"Saved: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
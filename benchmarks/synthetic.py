@@ -0,0 +1,369 @@
+"""Generate a synthetic MLB stolen base history, larger than the real one.
+
+The real scrape has about 300 leadership board rows and the pages of about 110
+players. This writes the same three raw tables web_scraping.py writes, and the
+pages it would have scraped them from, for --scale times as many players:
+
+    raw_data/bases_stolen_league_leaders.csv, base_running_stats.csv, player_salary.csv
+    pages/hitting/hisb4.shtml       the leadership board
+    pages/players/<player id>.html  one page per player
+
+Players have careers on teams of the era, so seasons, leagues and salaries
+look like the real ones, and the rows have the quirks clean.py handles: the
+repeated header rows of the board and of every player's tables, "-" for
+leagues without a leader and counts not recorded in early seasons, career
+total rows, Undetermined salaries and the blank salary the website shows as
+'"     "'. There are more leaders per season than on the real board, as ties.
+Parsing the pages with page_parser.py gives back exactly the rows of the raw
+tables, in the same order.
+
+    py benchmarks/synthetic.py --scale 100 --out synthetic_data
+"""
+import argparse
+import html
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import clean
+import interchange
+import sinks
+from web_scraping import RAW_TABLES
+
+# players with a page in the real scrape, and so players per unit of scale
+PLAYERS = 111
+FIRST_YEAR = 1876
+LAST_YEAR = 2025
+# stolen bases were first counted in 1886 and caught stealing in 1920
+FIRST_SB_YEAR = 1886
+FIRST_CS_YEAR = 1920
+
+# city, nickname, league and the seasons the team played
+TEAMS = [
+    ("Boston", "Red Caps", "National League", 1876, 1882),
+    ("Hartford", "Dark Blues", "National League", 1876, 1877),
+    ("Louisville", "Grays", "National League", 1876, 1877),
+    ("Chicago", "White Stockings", "National League", 1876, 1889),
+    ("Providence", "Grays", "National League", 1878, 1885),
+    ("Boston", "Beaneaters", "National League", 1883, 1911),
+    ("Philadelphia", "Phillies", "National League", 1883, 2025),
+    ("New York", "Giants", "National League", 1885, 1957),
+    ("Washington", "Senators", "National League", 1886, 1889),
+    ("Cincinnati", "Reds", "National League", 1890, 2025),
+    ("Pittsburgh", "Pirates", "National League", 1891, 2025),
+    ("Baltimore", "Orioles", "National League", 1892, 1899),
+    ("St. Louis", "Cardinals", "National League", 1900, 2025),
+    ("Brooklyn", "Superbas", "National League", 1899, 1910),
+    ("Chicago", "Cubs", "National League", 1903, 2025),
+    ("Boston", "Braves", "National League", 1912, 1952),
+    ("Brooklyn", "Dodgers", "National League", 1932, 1957),
+    ("Milwaukee", "Braves", "National League", 1953, 1965),
+    ("Los Angeles", "Dodgers", "National League", 1958, 2025),
+    ("San Francisco", "Giants", "National League", 1958, 2025),
+    ("New York", "Mets", "National League", 1962, 2025),
+    ("Houston", "Astros", "National League", 1965, 2012),
+    ("Atlanta", "Braves", "National League", 1966, 2025),
+    ("Montreal", "Expos", "National League", 1969, 2004),
+    ("San Diego", "Padres", "National League", 1969, 2025),
+    ("Florida", "Marlins", "National League", 1993, 2011),
+    ("Washington", "Nationals", "National League", 2005, 2025),
+    ("Miami", "Marlins", "National League", 2012, 2025),
+    ("Chicago", "White Sox", "American League", 1901, 2025),
+    ("Detroit", "Tigers", "American League", 1901, 2025),
+    ("Philadelphia", "Athletics", "American League", 1901, 1954),
+    ("Washington", "Senators", "American League", 1901, 1971),
+    ("St. Louis", "Browns", "American League", 1902, 1953),
+    ("Boston", "Red Sox", "American League", 1908, 2025),
+    ("New York", "Yankees", "American League", 1913, 2025),
+    ("Cleveland", "Indians", "American League", 1915, 2021),
+    ("Baltimore", "Orioles", "American League", 1954, 2025),
+    ("Kansas City", "Athletics", "American League", 1955, 1967),
+    ("Minnesota", "Twins", "American League", 1961, 2025),
+    ("California", "Angels", "American League", 1965, 1996),
+    ("Oakland", "Athletics", "American League", 1968, 2024),
+    ("Kansas City", "Royals", "American League", 1969, 2025),
+    ("Texas", "Rangers", "American League", 1972, 2025),
+    ("Seattle", "Mariners", "American League", 1977, 2025),
+    ("Toronto", "Blue Jays", "American League", 1977, 2025),
+    ("Cleveland", "Guardians", "American League", 2022, 2025),
+]
+
+FIRST_NAMES = ["Billy", "Lou", "Ty", "Max", "Rickey", "Maury", "Vince", "Tim", "Willie", "Bert",
+               "Luis", "Eddie", "Joe", "Omar", "Kenny", "Ron", "Davey", "Juan", "Jose", "Tommy",
+               "Hugh", "Arlie", "Sam", "George", "Frank", "Harry", "Jimmy", "Bobby", "Carl", "Dee",
+               "Otis", "Chuck", "Marquis", "Jacoby", "Esteban", "Trea", "Ronald", "Bobby", "Elvis", "Jorge"]
+LAST_NAMES = ["Hamilton", "Brock", "Cobb", "Carey", "Henderson", "Wills", "Coleman", "Raines", "Wilson",
+              "Campaneris", "Aparicio", "Collins", "Kelley", "Moreno", "Lofton", "LeFlore", "Lopes",
+              "Pierre", "Reyes", "Harper", "Nicol", "Latham", "Rice", "Case", "Chance", "Stovey",
+              "Sheckard", "Maranville", "Werber", "Gordon", "Nixon", "Knoblauch", "Grissom", "Ellsbury",
+              "Figgins", "Turner", "Acuna", "Witt", "Andrus", "Mateo", "Stirnweiss", "Hoy", "Lange",
+              "Fogarty", "Brown", "Clarke", "Smith", "Walker", "Davis", "Young", "Taylor", "Martin",
+              "Allen", "Jackson", "Lewis", "Scott", "Bell", "Kemp", "Hunter", "O'Leary"]
+
+LEADERBOARD_HEADER = ("Year", "American League", "Stolen Bases", "Team(s)",
+                      "Year", "National League", "Stolen Bases", "Team(s)")
+STATS_HEADER = ("Team", "SB", "CS", "SB%", "G", "AB", "R", "H", "2B", "3B", "HR", "BB", "SO")
+SALARY_HEADER = ("Team | Roster", "Uniform Numbers", "Salary", "Position", "Payroll Rank")
+# the blank salary cell of the website, read as '"     "'
+BLANK_SALARY_HTML = '"' + "&nbsp;" * 5 + '"'
+
+
+class Season:
+    """One stint of a player with a team in a season"""
+
+    def __init__(self, year, team, sb, cs):
+        self.year = year
+        self.team = team
+        self.sb = sb
+        self.cs = cs
+
+
+# a player id in the website's style: the start of the last and first names and a number
+def player_id(first, last, taken):
+    prefix = ("".join(c for c in last if c.isalpha())[:5] + first[:2]).lower()
+    taken[prefix] = taken.get(prefix, 0) + 1
+    return f"{prefix}{taken[prefix]:02d}"
+
+
+def teams_in(year):
+    return [team for team in TEAMS if team[3] <= year <= team[4]]
+
+
+# the seasons of a career, with the team changing now and then and some seasons split between teams
+def career(rng):
+    length = min(max(2, round(rng.gauss(12, 5))), 24)
+    start = rng.randint(1880, LAST_YEAR - 1)
+    start = max(min(start, LAST_YEAR - length + 1), FIRST_SB_YEAR - length + 1)
+    speed = rng.uniform(0.3, 1.0)
+    team = None
+    seasons = []
+    for year in range(start, start + length):
+        active = teams_in(year)
+        if team not in active or rng.random() < 0.12:
+            team = rng.choice(active)
+        stints = [team]
+        if rng.random() < 0.05 and len(active) > 1:
+            team = rng.choice([other for other in active if other is not team])
+            stints.append(team)
+        for stint in stints:
+            sb = int(rng.triangular(0, 70, 10) * speed) // len(stints)
+            cs = int(sb * rng.uniform(0.1, 0.5))
+            seasons.append(Season(year, stint, sb, cs))
+    return seasons
+
+
+def percentage(sb, cs):
+    if sb + cs == 0:
+        return ".000"
+    text = f"{sb / (sb + cs):.3f}"
+    return text[1:] if text.startswith("0") else text
+
+
+# the text of the base running stats cells of a season: "-" where the website has nothing
+def stats_cells(season):
+    sb = str(season.sb) if season.year >= FIRST_SB_YEAR else "-"
+    if season.year < FIRST_CS_YEAR:
+        return sb, "-", "-"
+    return sb, str(season.cs), percentage(season.sb, season.cs)
+
+
+def salary_amount(rng, year):
+    if year < 1965:
+        base = 2_000 * 1.03 ** (year - FIRST_YEAR)
+    else:
+        base = 25_000 * 1.12 ** (year - 1965)
+    return round(base * rng.lognormvariate(0, 0.6), -2)
+
+
+# the rows of a player's base running stats and salary tables, as the page shows them
+def player_tables(rng, seasons):
+    stats = [STATS_HEADER[:4]]
+    salaries = [SALARY_HEADER[:3]]
+    for index, season in enumerate(seasons):
+        city, nickname = season.team[:2]
+        stats.append((f"{season.year} {nickname}", *stats_cells(season)))
+
+        if season.year < 1930:
+            uniform = "n/a"
+        elif rng.random() < 0.03:
+            uniform = f"{rng.randint(1, 60)}, {rng.randint(1, 60)}"
+        else:
+            uniform = str(rng.randint(1, 60))
+        kind = rng.random()
+        if kind < (0.7 if season.year < 1920 else 0.08):
+            salary = "Undetermined"
+        elif kind > 0.97 and index > 0:
+            salary = clean.BLANK_SALARY
+        else:
+            salary = f"${salary_amount(rng, season.year):,.2f}"
+        salaries.append((f"{season.year} {city} {nickname}", uniform, salary))
+
+    years = len({season.year for season in seasons})
+    sb = sum(season.sb for season in seasons if season.year >= FIRST_SB_YEAR)
+    cs = sum(season.cs for season in seasons if season.year >= FIRST_CS_YEAR)
+    stats.append(("Career", "SB", "CS", "SB%"))
+    stats.append((f"{years} Years", f"{sb:,}", f"{cs:,}", percentage(sb, cs)))
+    return stats, salaries
+
+
+# every player: id, name, seasons, and the seasons they led their league in
+def make_players(scale, rng):
+    taken = {}
+    players = []
+    for _ in range(PLAYERS * scale):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        seasons = career(rng)
+        countable = [season for season in seasons if season.year >= FIRST_SB_YEAR]
+        led = rng.sample(countable, min(len(countable), rng.randint(1, 4)))
+        for season in led:
+            season.sb = rng.randint(40, 130)
+            season.cs = int(season.sb * rng.uniform(0.1, 0.35))
+        players.append((player_id(first, last, taken), f"{first} {last}", seasons, led))
+    return players
+
+
+# the rows of the leadership board: the American and National League leaders of each year side
+# by side, ties on rows of their own, and "-" where a league had no leader
+def leaderboard_rows(players):
+    leaders = {}
+    for player, name, _, led in players:
+        for season in led:
+            city, _, league = season.team[:3]
+            leaders.setdefault((season.year, league), []).append((-season.sb, player, name, city))
+    rows = [LEADERBOARD_HEADER]
+    for year in range(FIRST_YEAR, LAST_YEAR + 1):
+        american = sorted(leaders.get((year, "American League"), []))
+        national = sorted(leaders.get((year, "National League"), []))
+        for index in range(max(len(american), len(national), 1)):
+            row = []
+            for side in (american, national):
+                if index < len(side):
+                    sb, player, name, city = side[index]
+                    row.append((str(year), (player, name), str(-sb), city))
+                else:
+                    row.append((str(year), ("", "-"), "-", "-"))
+            rows.append(row[0] + row[1])
+    rows.append(LEADERBOARD_HEADER)
+    return rows
+
+
+# the raw leaders rows web_scraping.py gets from the board, one per league
+def leader_records(rows):
+    for row in rows:
+        for offset, league in ((0, "American League"), (4, "National League")):
+            year, player, bases, team = row[offset:offset + 4]
+            player, name = player if isinstance(player, tuple) else ("", player)
+            yield year, league, player, name, team, bases
+
+
+def _cell(value):
+    if isinstance(value, tuple):
+        player, name = value
+        if not player:
+            return f"<td>{html.escape(name)}</td>"
+        return f'<td><a href="../players/player.php?p={player}">{html.escape(name)}</a></td>'
+    if value == clean.BLANK_SALARY:
+        return f"<td>{BLANK_SALARY_HTML}</td>"
+    return f"<td>{html.escape(value)}</td>"
+
+
+def _table(title, rows, width):
+    lines = [f'<table class="boxed"><tr><td class="header" colspan="{width}">{html.escape(title)}</td></tr>']
+    lines.extend(f"<tr>{''.join(_cell(value) for value in row)}</tr>" for row in rows)
+    lines.append(f'<tr><td class="banner" colspan="{width}">Baseball Almanac</td></tr></table>')
+    return "\n".join(lines)
+
+
+def _page(title, tables):
+    body = "\n".join(tables)
+    return (f"<!DOCTYPE html>\n<html><head><title>{html.escape(title)}</title>"
+            f"<style>td {{ padding: 2px }}</style></head>\n<body>\n"
+            f'<div class="menu"><a href="../yearmenu.shtml">Year Menu</a></div>\n'
+            f"{body}\n</body></html>\n")
+
+
+def leaderboard_page(rows):
+    return _page("Stolen Bases Leaders", [_table("Year by Year Leaders for Stolen Bases", rows, 8)])
+
+
+def player_page(name, stats, salaries, rng):
+    def filler():
+        return tuple(str(rng.randint(0, 600)) for _ in range(9))
+
+    stats_rows = [STATS_HEADER] + [row + filler() for row in stats[1:]]
+    salary_rows = [SALARY_HEADER] + [row + ("OF", str(rng.randint(1, 30))) for row in salaries[1:]]
+    return _page(name, [_table(f"{name} Batting Stats", [filler() + filler()[:4]], 13),
+                        _table(f"{name} Base Running Stats", stats_rows, 13),
+                        _table(f"{name} Salary", salary_rows, 5)])
+
+
+def write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def generate(out_dir, scale=10, seed=0, raw_format="csv", pages=True):
+    """Write the raw tables into out_dir/raw_data and, with pages, the pages they are scraped
+    from into out_dir/pages. Returns the rows of each raw table and the pages written"""
+    rng = random.Random(seed)
+    raw_dir = os.path.join(out_dir, "raw_data")
+    os.makedirs(raw_dir, exist_ok=True)
+    if pages:
+        os.makedirs(os.path.join(out_dir, "pages", "hitting"), exist_ok=True)
+        os.makedirs(os.path.join(out_dir, "pages", "players"), exist_ok=True)
+
+    players = make_players(scale, rng)
+    board = leaderboard_rows(players)
+    counts = {}
+    with sinks.open_sink(raw_format, raw_dir, "bases_stolen_league_leaders",
+                         RAW_TABLES["bases_stolen_league_leaders"], batch_size=50_000) as sink:
+        sink.write_many(leader_records(board))
+    counts["bases_stolen_league_leaders"] = sink.rows_written
+    if pages:
+        write_text(os.path.join(out_dir, "pages", "hitting", "hisb4.shtml"), leaderboard_page(board))
+
+    # players are written in the order of their ids, as the pages are parsed
+    stats_sink = sinks.open_sink(raw_format, raw_dir, "base_running_stats",
+                                 RAW_TABLES["base_running_stats"], batch_size=50_000)
+    salary_sink = sinks.open_sink(raw_format, raw_dir, "player_salary",
+                                  RAW_TABLES["player_salary"], batch_size=50_000)
+    with stats_sink, salary_sink:
+        for player, name, seasons, _ in sorted(players, key=lambda p: p[0]):
+            stats, salaries = player_tables(rng, seasons)
+            stats_sink.write_many((player, *row) for row in stats)
+            salary_sink.write_many((player, *row) for row in salaries)
+            if pages:
+                write_text(os.path.join(out_dir, "pages", "players", f"{player}.html"),
+                           player_page(name, stats, salaries, rng))
+    counts["base_running_stats"] = stats_sink.rows_written
+    counts["player_salary"] = salary_sink.rows_written
+    counts["pages"] = len(players) + 1 if pages else 0
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic raw tables and pages of the MLB "
+                                                 "stolen base history.")
+    parser.add_argument("--scale", type=int, default=10,
+                        help="times as many players as the real scrape, such as 10, 100 or 1000")
+    parser.add_argument("--out", default="synthetic_data",
+                        help="directory the raw_data and pages directories are written in")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw-format", choices=interchange.FORMATS, default="csv",
+                        help="format the raw tables are written in")
+    parser.add_argument("--no-pages", action="store_true", help="only write the raw tables")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    counts = generate(args.out, args.scale, args.seed, args.raw_format, not args.no_pages)
+    for name, rows in counts.items():
+        print(f"{name}: {rows:,}")
+    print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
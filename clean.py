@@ -1,141 +1,499 @@
-"""This program cleans the raw data which was retrieved from web_scraping.py"""
+"""This program cleans the raw data which was retrieved from web_scraping.py
+
+Each raw table is described by a TableSchema: for every column, the pattern a
+valid value must match and the rule which parses it into its final dtype. A
+table is validated and converted column by column with compiled pyarrow
+kernels (pandas string methods when pyarrow is not installed) instead of
+chains of replace/astype calls which copy the whole frame at every step.
+
+Run it as a script to clean the three tables in raw_data, or import
+clean_table and the schemas to clean tables elsewhere. With --chunk-rows the
+raw files are streamed in chunks, for files larger than memory. Raw tables can
+be read from, and cleaned tables written to, Arrow or Parquet files instead of
+CSV (--input-format, --output-format); the cleaned files then keep the types
+the parse rules produced, so sql_database.py reads them without parsing text.
+--trace and --metrics record the time and rows of each table (see instrumentation.py)"""
+import argparse
+import csv
+import warnings
+import numpy as np
 import pandas as pd
+import instrumentation
+import interchange
+
+# values pandas' read_csv reads as missing, used for every backend so they all
+# treat the raw files the same way
+NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+             "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+             "n/a", "nan", "null"]
+
+
+class Column:
+    """How one raw column is validated and parsed.
+
+    pattern: regex a valid value must contain (anchor it to match the whole value)
+    values: the only values which are valid
+    parse: name of the parse rule turning valid values into their final dtype
+    outputs: names of the cleaned columns the rule produces, defaults to the column name
+    """
+
+    def __init__(self, name, pattern=None, values=None, parse="text", outputs=None):
+        self.name = name
+        self.pattern = pattern
+        self.values = values
+        self.parse = parse
+        self.outputs = outputs or (name,)
+
+
+class TableSchema:
+    """The columns of a raw table and the order of the cleaned columns"""
+
+    def __init__(self, name, columns, output_columns=None):
+        self.name = name
+        self.columns = columns
+        self.output_columns = output_columns or [output for column in columns
+                                                 for output in column.outputs]
+
+
+LEADERS_SCHEMA = TableSchema("bases_stolen_league_leaders", [
+    Column("Year", pattern=r"^\d+$", parse="int"),
+    Column("League", values=("American League", "National League")),
+    Column("Player ID"),
+    Column("Player Name"),
+    Column("Team"),
+    Column("Bases Stolen", pattern=r"^\d+$", parse="int"),
+])
+
+BASE_RUNNING_SCHEMA = TableSchema("base_running_stats", [
+    Column("Player ID"),
+    Column("Team", pattern=r"^\d+ \w+", parse="year_team", outputs=("Year", "Team")),
+    Column("Stolen Bases (SB)", pattern=r"(\d|-)", parse="count"),
+    Column("Caught Stealing (CS)", pattern=r"(\d|-)", parse="count"),
+    Column("Stolen Bases Percentage", pattern=r"(\d|-)", parse="percentage"),
+], output_columns=["Player ID", "Stolen Bases (SB)", "Caught Stealing (CS)",
+                   "Stolen Bases Percentage", "Year", "Team"])
+
+SALARY_SCHEMA = TableSchema("player_salary", [
+    Column("Player ID"),
+    Column("Team", pattern=r"^\d+ \w+", parse="year_team", outputs=("Year", "Team")),
+    Column("Uniform Numbers", pattern=r"(\d|-|n/a)"),
+    Column("Salary", pattern=r'(Undetermined|$|")', parse="salary"),
+], output_columns=["Player ID", "Uniform Numbers", "Salary", "Year", "Team"])
+
+# a blank salary on the website, which is filled with the most recent salary
+BLANK_SALARY = '"     "'
+
+# the Arrow types of the columns each parse rule produces
+PARSE_TYPES = {
+    "text": ("string",),
+    "int": ("int64",),
+    "count": ("int64",),
+    "percentage": ("float64",),
+    "year_team": ("int64", "string"),
+    "salary": ("float64",),
+}
+
+
+# the type of every cleaned column of a table, by the parse rule which produces it
+def output_types(schema):
+    types = {}
+    for column in schema.columns:
+        types.update(zip(column.outputs, PARSE_TYPES[column.parse]))
+    # split_career's name for the year column of career rows
+    if "Year" in types:
+        types["Total Years"] = types["Year"]
+    return types
+
+
+class ArrowKernels:
+    """Parse rules built from pyarrow compute kernels"""
+
+    name = "pyarrow"
+
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pa_csv
+        self.pa = pa
+        self.pc = pc
+        self.csv = pa_csv
+
+    def _convert_options(self, path):
+        return self.csv.ConvertOptions(
+            column_types={name: self.pa.string() for name in read_header(path)},
+            null_values=NA_VALUES, strings_can_be_null=True)
+
+    def read(self, path):
+        return self.csv.read_csv(path, convert_options=self._convert_options(path))
+
+    # a raw table read from an Arrow or Parquet file, with NA_VALUES missing as they are in a csv file
+    def from_table(self, table):
+        pa, pc = self.pa, self.pc
+        na_values = pa.array(NA_VALUES, pa.string())
+        null = pa.scalar(None, pa.string())
+        columns = []
+        for column in table.columns:
+            column = pc.cast(column, pa.string())
+            columns.append(pc.if_else(pc.is_in(column, value_set=na_values), null, column))
+        return pa.table(columns, names=table.column_names)
+
+    # chunks are cut by size in bytes, sized from the average row length at the top of the file
+    def read_chunks(self, path, chunk_rows):
+        read_options = self.csv.ReadOptions(
+            block_size=max(1 << 12, chunk_rows * average_row_bytes(path)))
+        reader = self.csv.open_csv(path, read_options=read_options,
+                                   convert_options=self._convert_options(path))
+        empty = True
+        for batch in reader:
+            empty = False
+            yield self.pa.Table.from_batches([batch])
+        if empty:
+            yield reader.schema.empty_table()
+
+    def from_frame(self, df):
+        return self.pa.Table.from_pandas(df.astype(object), preserve_index=False)
+
+    def is_valid(self, array, column):
+        pc = self.pc
+        if column.values is not None:
+            valid = pc.is_in(array, value_set=self.pa.array(column.values, self.pa.string()))
+        else:
+            valid = pc.match_substring_regex(array, column.pattern)
+        return pc.fill_null(valid, False)
+
+    def all_valid(self, masks, length):
+        mask = self.pa.array([True] * length, self.pa.bool_()) if not masks else masks[0]
+        for other in masks[1:]:
+            mask = self.pc.and_(mask, other)
+        return mask
+
+    def split(self, table, mask):
+        return table.filter(mask), table.filter(self.pc.invert(mask))
+
+    def to_frame(self, columns):
+        return self.pa.table(columns).to_pandas()
+
+    def table_to_frame(self, table):
+        return table.to_pandas()
+
+    # astype(str).str.strip(): missing values become the text "nan"
+    def text(self, array, state):
+        return [self.pc.utf8_trim_whitespace(self.pc.fill_null(array, "nan"))]
+
+    def int(self, array, state):
+        return [self.pc.cast(array, self.pa.int64())]
+
+    def _number(self, array, remove, dtype):
+        pc = self.pc
+        digits = pc.replace_substring_regex(array, remove, "")
+        digits = pc.if_else(pc.equal(digits, ""), "0", digits)
+        return pc.cast(digits, dtype)
+
+    # "1,234" -> 1234, "-" -> 0
+    def count(self, array, state):
+        return [self._number(array, "[,-]", self.pa.int64())]
+
+    # ".753" -> 0.753, "-" -> 0.0
+    def percentage(self, array, state):
+        return [self._number(array, "[-]", self.pa.float64())]
+
+    # "1961 Chicago Cubs" -> 1961, "Chicago Cubs"
+    def year_team(self, array, state):
+        pc = self.pc
+        parts = pc.extract_regex(array, r"(?s)^(?P<year>[^ ]*) (?P<team>.*)$")
+        year = pc.cast(pc.struct_field(parts, "year"), self.pa.int64())
+        team = pc.utf8_trim_whitespace(pc.struct_field(parts, "team"))
+        return [year, team]
+
+    # "$4,800.00" -> 4800.0. A blank salary takes the most recent salary above it,
+    # carried over from earlier chunks in state, and "Undetermined" is missing
+    def salary(self, array, state):
+        pa, pc = self.pa, self.pc
+        null = pa.scalar(None, pa.string())
+        salary = pc.utf8_trim_whitespace(pc.fill_null(array, "nan"))
+        salary = pc.if_else(pc.equal(salary, BLANK_SALARY), null, salary)
+        carry = state.get("salary")
+        if carry is not None:
+            chunks = salary.chunks if isinstance(salary, pa.ChunkedArray) else [salary]
+            salary = pc.fill_null_forward(
+                pa.chunked_array([pa.array([carry], pa.string())] + chunks, pa.string())).slice(1)
+        else:
+            salary = pc.fill_null_forward(salary)
+        if len(salary):
+            state["salary"] = salary[-1].as_py()
+        salary = pc.if_else(pc.equal(salary, "Undetermined"), null, salary)
+        return [pc.cast(pc.replace_substring_regex(salary, r"[\$,]", ""), pa.float64())]
+
+
+class PandasKernels:
+    """The same parse rules with pandas string methods, for when pyarrow is not installed"""
+
+    name = "pandas"
+
+    def read(self, path):
+        return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=NA_VALUES)
+
+    def from_table(self, table):
+        df = table.to_pandas().astype(object)
+        return df.where(~df.isin(NA_VALUES) & df.notna(), np.nan)
+
+    def read_chunks(self, path, chunk_rows):
+        empty = True
+        with pd.read_csv(path, dtype=str, keep_default_na=False, na_values=NA_VALUES,
+                         chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                empty = False
+                yield chunk
+        if empty:
+            yield pd.DataFrame(columns=read_header(path), dtype=object)
+
+    def from_frame(self, df):
+        return df.astype(object)
+
+    def is_valid(self, series, column):
+        if column.values is not None:
+            return series.isin(column.values).to_numpy()
+        with warnings.catch_warnings():
+            # the patterns have groups, which pandas warns are not used by contains
+            warnings.simplefilter("ignore", UserWarning)
+            valid = series.str.contains(column.pattern, regex=True, na=False)
+        return valid.to_numpy(dtype=bool)
+
+    def all_valid(self, masks, length):
+        mask = np.ones(length, dtype=bool) if not masks else masks[0]
+        for other in masks[1:]:
+            mask = mask & other
+        return mask
+
+    def split(self, df, mask):
+        return df[mask].reset_index(drop=True), df[~mask]
+
+    def to_frame(self, columns):
+        return pd.DataFrame(columns)
+
+    def table_to_frame(self, df):
+        return df
+
+    def text(self, series, state):
+        return [series.astype(str).str.strip()]
+
+    def int(self, series, state):
+        return [series.astype(int)]
+
+    def _number(self, series, remove, dtype):
+        digits = series.str.replace(remove, "", regex=True)
+        return digits.where(digits != "", "0").astype(dtype)
+
+    def count(self, series, state):
+        return [self._number(series, "[,-]", int)]
+
+    def percentage(self, series, state):
+        return [self._number(series, "[-]", float)]
+
+    def year_team(self, series, state):
+        if series.empty:
+            return [series.astype(int), series.astype(str)]
+        parts = series.str.split(" ", n=1, expand=True)
+        return [parts[0].astype(int), parts[1].astype(str).str.strip()]
+
+    def salary(self, series, state):
+        salary = series.astype(str).str.strip()
+        salary = salary.where(salary != BLANK_SALARY, None)
+        if state.get("salary") is not None and len(salary) and pd.isna(salary.iloc[0]):
+            salary.iloc[0] = state["salary"]
+        salary = salary.ffill()
+        if len(salary):
+            state["salary"] = None if pd.isna(salary.iloc[-1]) else salary.iloc[-1]
+        salary = salary.where(salary != "Undetermined", None)
+        return [salary.str.replace(r"[\$,]", "", regex=True).astype(float)]
+
+
+KERNELS = {"pyarrow": ArrowKernels, "pandas": PandasKernels}
+_loaded = {}
+
+
+# get kernels by name, or pyarrow's when it is installed
+def get_kernels(name=None):
+    if name is None:
+        try:
+            return get_kernels("pyarrow")
+        except ImportError:
+            return get_kernels("pandas")
+    if name not in KERNELS:
+        raise ValueError(f"unknown kernels {name!r}, expected one of {', '.join(KERNELS)}")
+    if name not in _loaded:
+        _loaded[name] = KERNELS[name]()
+    return _loaded[name]
+
+
+def _resolve(kernels):
+    return kernels if hasattr(kernels, "is_valid") else get_kernels(kernels)
+
+
+def read_header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+
+def average_row_bytes(path, sample_bytes=1 << 20):
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    return max(1, len(sample) // max(1, sample.count(b"\n")))
+
+
+# read a raw csv, Arrow or Parquet file with every column as text
+def read_raw(path, kernels=None):
+    kernels = _resolve(kernels)
+    if interchange.path_format(path) == "csv":
+        return kernels.read(path)
+    return kernels.from_table(interchange.read_table(path))
+
+
+# read a raw file in chunks of about chunk_rows rows, or all at once without chunk_rows.
+# Arrow files are read in the record batches they were written in
+def read_raw_chunks(path, kernels=None, chunk_rows=None):
+    kernels = _resolve(kernels)
+    if chunk_rows is None:
+        yield read_raw(path, kernels)
+    elif interchange.path_format(path) == "csv":
+        yield from kernels.read_chunks(path, chunk_rows)
+    else:
+        import pyarrow as pa
+
+        empty = True
+        for batch in interchange.read_batches(path, batch_rows=chunk_rows):
+            empty = False
+            yield kernels.from_table(pa.Table.from_batches([batch]))
+        if empty:
+            yield read_raw(path, kernels)
+
+
+def clean_table(raw, schema, kernels=None, state=None):
+    """Validate and parse a raw table (a pyarrow Table or DataFrame of text).
+
+    Returns the cleaned rows and the removed rows as DataFrames. state carries
+    values between chunks of the same table, such as the last salary seen.
+    """
+    kernels = _resolve(kernels)
+    if isinstance(raw, pd.DataFrame):
+        raw = kernels.from_frame(raw)
+    state = {} if state is None else state
+
+    # a row is valid when every checked column is valid
+    masks = [kernels.is_valid(raw[column.name], column) for column in schema.columns
+             if column.pattern is not None or column.values is not None]
+    valid, removed = kernels.split(raw, kernels.all_valid(masks, len(raw)))
+
+    cleaned = {}
+    for column in schema.columns:
+        parse = getattr(kernels, column.parse)
+        cleaned.update(zip(column.outputs, parse(valid[column.name], state)))
+    cleaned_df = kernels.to_frame({name: cleaned[name] for name in schema.output_columns})
+    return cleaned_df, kernels.table_to_frame(removed)
 
-### Clean YoY stats first
-# Read files and display information
-original_yoy_df = pd.read_csv("raw_data/bases_stolen_league_leaders.csv")
-print(f"bases_stolen_league_leaders\n{original_yoy_df.head(5)}")
-print(f"original_yoy_df.dtypes\n{original_yoy_df.dtypes}")
-
-# filter for valid rows, which will have valid years
-valid_year = original_yoy_df["Year"].str.isdigit()
-valid_league = original_yoy_df["League"].isin(["American League", "National League"])
-valid_base = original_yoy_df["Bases Stolen"].str.isdigit()
-
-# combine all validations together
-is_valid = valid_year & valid_league & valid_base
-
-# seperate valid and remove rows
-removed_rows_yoy = original_yoy_df[is_valid == False]
-valid_rows_yoy = original_yoy_df[is_valid == True]
-
-# save removed rows
-removed_rows_yoy.to_csv("removed_data/bases_stolen_league_leaders_removed.csv",
-                        index=False)
-
-# clean valid data
-yoy_df = valid_rows_yoy.copy()
-yoy_df["Year"] = yoy_df["Year"].astype(int)
-yoy_df["Player ID"] = yoy_df["Player ID"].astype(str).str.strip()
-yoy_df["Player Name"] = yoy_df["Player Name"].astype(str).str.strip()
-yoy_df["Team"] = yoy_df["Team"].astype(str).str.strip()
-yoy_df["Bases Stolen"] = yoy_df["Bases Stolen"].astype(int)
-
-# save final cleaned data
-print(f"yoy_df.shape\n{list(yoy_df.shape)}")
-yoy_df.to_csv("cleaned_data/bases_stolen_league_leaders_cleaned.csv", index=False)
-
-print(f"\nremoved_rows.shape\n{removed_rows_yoy.shape}")
-print("\nSaved: bases_stolen_league_leaders_removed " + \
-      "and bases_stolen_league_leaders_cleaned")
-
-
-### Clean base_running_stats
-# Read files and display information
-original_stats_df = pd.read_csv("raw_data/base_running_stats.csv")
-print(f"base_running_stats\n{original_stats_df.head(5)}")
-print(f"original_stats_df.dtypes\n{original_stats_df.dtypes}")
-
-# filter for valid rows, which will have valid years
-valid_year_team = original_stats_df["Team"].astype(str).str.match(r"\d+ \w+", na=False)
-valid_sb = original_stats_df["Stolen Bases (SB)"].str.contains(r"(\d|-)", na=False)
-valid_cs = original_stats_df["Caught Stealing (CS)"].str.contains(r"(\d|-)", na=False)
-valid_sbp = original_stats_df["Stolen Bases Percentage"].str.contains(r"(\d|-)", na=False)
-
-# combine all validations together
-is_valid = valid_year_team & valid_sb & valid_cs & valid_sbp
-
-# seperate valid and remove rows
-removed_rows_stats = original_stats_df[is_valid == False]
-valid_rows_stats = original_stats_df[is_valid == True]
-
-# save removed rows
-removed_rows_stats.to_csv("removed_data/base_running_stats_removed.csv", 
-                        index=False)
-
-# clean valid data
-stats_df = valid_rows_stats.copy()
-stats_df.rename(columns={"Team": "Year and Team"}, inplace=True)
-stats_df[["Year", "Team"]] = stats_df["Year and Team"].str.split(" ", n=1, expand=True)
-stats_df = stats_df.drop(columns=["Year and Team"])
-stats_df["Year"] = stats_df["Year"].astype(int)
-stats_df["Team"] = stats_df["Team"].astype(str).str.strip()
-stats_df["Stolen Bases (SB)"] = stats_df["Stolen Bases (SB)"].replace("[,-]", "", regex=True).replace("", 0).astype(int)
-stats_df["Caught Stealing (CS)"] = stats_df["Caught Stealing (CS)"].replace("[,-]", "", regex=True).replace("", 0).astype(int)
-stats_df["Stolen Bases Percentage"] = stats_df["Stolen Bases Percentage"].replace("[-]", "", regex=True).replace("", 0).astype(float)
 
 # seperate career from year over year stats
-stats_yoy_df = stats_df[stats_df["Team"] != "Years"]
-career_df = stats_df[stats_df["Team"] == "Years"]
-career_df = career_df.drop(columns=["Team"])
-career_df = career_df.rename(columns={"Year":"Total Years"})
-
-# save final cleaned data
-print(f"stats_df.shape\n{stats_df.shape}")
-stats_df.to_csv("cleaned_data/base_running_stats_cleaned.csv", index=False)
-stats_yoy_df.to_csv("cleaned_data/base_running_stats_cleaned_yoy.csv", index=False)
-career_df.to_csv("cleaned_data/base_running_stats_cleaned_career.csv", index=False)
-
-print(f"\nremoved_rows_stats.shape\n{removed_rows_stats.shape}")
-print("\nSaved: base_running_stats_removed, " + \
-      "base_running_stats_cleaned, " + \
-      "base_running_stats_cleaned_yoy, and" + \
-      "base_running_stats_cleaned_career"
-        )
-
-
-### Clean base_running_stats
-# Read files and display information
-original_salary_df = pd.read_csv("raw_data/player_salary.csv")
-print(f"bases_stolen_league_leaders\n{original_salary_df.head(5)}")
-print(f"original_salary_df.dtypes\n{original_salary_df.dtypes}")
-
-# filter for valid rows, which will have valid years
-valid_year_team = original_salary_df["Team"].astype(str).str.match(r"\d+ \w+", na=False)
-valid_uni_num = original_salary_df["Uniform Numbers"].str.contains(r"(\d|-|n/a)", na=False)
-valid_salary = original_salary_df["Salary"].str.contains(r'(Undetermined|$|")', na=False)
-
-# combine all validations together
-is_valid = valid_year_team & valid_uni_num & valid_salary
-
-# seperate valid and remove rows
-removed_rows_salary = original_salary_df[is_valid == False]
-valid_rows_salary = original_salary_df[is_valid == True]
-
-# save removed rows
-removed_rows_salary.to_csv("removed_data/player_salary_removed.csv", 
-                        index=False)
-
-# clean valid data
-salary_df = valid_rows_salary.copy()
-salary_df.rename(columns={"Team": "Year and Team"}, inplace=True)
-salary_df[["Year", "Team"]] = salary_df["Year and Team"].str.split(" ", n=1, expand=True)
-salary_df = salary_df.drop(columns=["Year and Team"])
-salary_df["Year"] = salary_df["Year"].astype(int)
-salary_df["Team"] = salary_df["Team"].astype(str).str.strip()
-salary_df["Uniform Numbers"] = salary_df["Uniform Numbers"].astype(str).str.strip()
-
-# salary will need more work since values will need to be
-# altered and be filled by most recent salary if na
-salary_df["Salary"] = salary_df["Salary"].astype(str).str.strip()
-salary_df["Salary"] = salary_df["Salary"].replace('"     "', None)
-salary_df["Salary"] = salary_df["Salary"].fillna(method="ffill")
-salary_df["Salary"] = salary_df["Salary"].replace("Undetermined", None)
-salary_df["Salary"] = salary_df["Salary"].replace("[\$,]", "", regex=True).astype(float)
-
-# save final cleaned data
-print(f"salary_df.shape\n{salary_df.shape}")
-salary_df.to_csv("cleaned_data/player_salary_cleaned.csv", index=False)
-
-print(f"\nremoved_rows_salary.shape\n{removed_rows_salary.shape}")
-print("\nSaved: player_salary_removed and player_salary_cleaned")
+def split_career(stats_df):
+    stats_yoy_df = stats_df[stats_df["Team"] != "Years"]
+    career_df = stats_df[stats_df["Team"] == "Years"]
+    career_df = career_df.drop(columns=["Team"])
+    career_df = career_df.rename(columns={"Year": "Total Years"})
+    return stats_yoy_df, career_df
+
+
+# the files each table is cleaned into. Extra outputs are made from each chunk of cleaned rows
+TABLES = {
+    "bases_stolen_league_leaders": (LEADERS_SCHEMA, {}),
+    "base_running_stats": (BASE_RUNNING_SCHEMA, {
+        "base_running_stats_cleaned_yoy": lambda df: split_career(df)[0],
+        "base_running_stats_cleaned_career": lambda df: split_career(df)[1],
+    }),
+    "player_salary": (SALARY_SCHEMA, {}),
+}
+
+
+def clean_file(name, kernels=None, chunk_rows=None, raw_dir="raw_data",
+               cleaned_dir="cleaned_data", removed_dir="removed_data",
+               input_format="csv", output_format="csv", preview=False):
+    """Clean the raw table <name> in raw_data into cleaned_data and removed_data.
+
+    With chunk_rows the raw file is streamed in chunks of about that many rows
+    and every output is appended to as each chunk is cleaned, so files larger
+    than memory can be cleaned. State such as the last salary seen is carried
+    from one chunk to the next. input_format and output_format choose csv,
+    Arrow or Parquet files; cleaned Arrow and Parquet files are written with
+    output_types(), removed rows as the text they were. preview prints the
+    first rows of the raw table as they are read. Returns the writers of
+    every output file. The time and rows read are recorded as a "clean" span
+    of the table.
+    """
+    kernels = _resolve(kernels)
+    schema, extra_outputs = TABLES[name]
+    types = output_types(schema)
+    writers = {"removed": interchange.TableWriter(
+                   interchange.table_path(removed_dir, f"{name}_removed", output_format)),
+               "cleaned": interchange.TableWriter(
+                   interchange.table_path(cleaned_dir, f"{name}_cleaned", output_format), types=types)}
+    writers.update((output, interchange.TableWriter(
+                        interchange.table_path(cleaned_dir, output, output_format), types=types))
+                   for output in extra_outputs)
+
+    try:
+        with instrumentation.span("clean", table=name) as span:
+            state = {}
+            raw_path = interchange.table_path(raw_dir, name, input_format)
+            for raw in read_raw_chunks(raw_path, kernels, chunk_rows):
+                if preview:
+                    print(f"{name}\n{kernels.table_to_frame(raw).head(5)}")
+                    preview = False
+                cleaned_df, removed_df = clean_table(raw, schema, kernels, state)
+                writers["removed"].write(removed_df)
+                writers["cleaned"].write(cleaned_df)
+                for output, make in extra_outputs.items():
+                    writers[output].write(make(cleaned_df))
+            span.rows = writers["cleaned"].rows + writers["removed"].rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for output, writer in writers.items():
+        instrumentation.count("rows_total", writer.rows, stage="clean", table=name, output=output)
+    return writers
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clean the raw data tables from web_scraping.py.")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="stream each raw file in chunks of about this many rows "
+                             "instead of loading it whole")
+    parser.add_argument("--kernels", choices=list(KERNELS), default=None,
+                        help="backend the tables are cleaned with, defaults to pyarrow when installed")
+    parser.add_argument("--input-format", choices=interchange.FORMATS, default="csv",
+                        help="format of the raw tables web_scraping.py wrote")
+    parser.add_argument("--output-format", choices=interchange.FORMATS, default="csv",
+                        help="format the cleaned and removed tables are written in")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    kernels = get_kernels(args.kernels)
+    instrumentation.configure(args.trace, args.metrics)
+
+    try:
+        with instrumentation.span("clean"):
+            for name in TABLES:
+                # filter for valid rows, clean them and save the cleaned and removed rows,
+                # displaying the first raw rows as they are read
+                writers = clean_file(name, kernels, args.chunk_rows, input_format=args.input_format,
+                                     output_format=args.output_format, preview=True)
+
+                for output, writer in writers.items():
+                    print(f"{output}.shape\n{writer.shape}")
+                print(f"\nSaved: {', '.join(writer.path for writer in writers.values())}\n")
+    finally:
+        instrumentation.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Read-only connections to db/base_running.db, reused instead of opened per query.
+
+A ReadOnlyDatabase keeps one connection per thread, opened with the URI
+mode=ro so nothing can write through it. Each connection keeps sqlite3's
+cache of compiled statements, so a query run again on the same thread is
+not parsed and planned again. When the database file is rebuilt, every
+thread reconnects on its next query. immutable=True also tells SQLite the
+file never changes, which skips its locking; it is only safe for a file no
+process rewrites while it is open (a copy of the database, say).
+
+    with connections.ReadOnlyDatabase() as db:
+        rows = db.execute(queries.TOP_SALARIES.sql, (1950, 2000, 10)).fetchall()
+"""
+import os
+import sqlite3
+import threading
+
+DB_PATH = "db/base_running.db"
+
+# compiled statements each connection keeps; the shipped queries all fit with room to spare
+CACHED_STATEMENTS = 64
+
+
+# what changes when the database is rebuilt
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class ReadOnlyDatabase:
+    """One read-only connection per thread to a database file, closed together by close()"""
+
+    def __init__(self, db_path=DB_PATH, immutable=False, cached_statements=CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.immutable = immutable
+        self.cached_statements = cached_statements
+        self.opened = 0
+        self._local = threading.local()
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def _uri(self):
+        return f"file:{self.db_path}?mode=ro" + ("&immutable=1" if self.immutable else "")
+
+    def _open(self):
+        # check_same_thread is off only so close() can close every thread's connection
+        conn = sqlite3.connect(self._uri(), uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        with self._lock:
+            self._connections.add(conn)
+            self.opened += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+        conn.close()
+
+    # this thread's connection, opened on first use and again after the database file has changed
+    def connection(self):
+        version = file_signature(self.db_path)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and (self._local.version != version or conn not in self._connections):
+            if conn in self._connections:
+                self._discard(conn)
+            conn = None
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.version = version
+        return conn
+
+    def execute(self, sql, parameters=()):
+        return self.connection().execute(sql, parameters)
+
+    # close every thread's connection; threads still using the database open a new one on their next query
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
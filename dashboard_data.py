@@ -0,0 +1,242 @@
+"""The frames myapp.py draws from, loaded from db/base_running.db on first use.
+
+Nothing is read when the module is imported. The first callback or page load
+reads the frames, and every later access checks the database file's mtime and
+size, reloading the frames when the database has been rebuilt so the server
+never needs a restart. Under gunicorn, gunicorn.conf.py preloads them in the
+master process so the workers share one copy-on-write copy instead of each
+reading the database.
+
+With an Arrow directory (DASHBOARD_ARROW_DIR, needs pyarrow) the frames are also
+written once per database version as uncompressed Arrow files and memory mapped
+from there, so workers and restarts read them from the OS page cache instead of
+querying SQLite.
+
+League and team columns are held as categoricals, and filter() turns a set of
+selected leagues or teams into a lookup table indexed by category code, so a
+filter costs one array index per row instead of hashing a string. Every frame
+is kept sorted by year, so a year range is found by binary search and only the
+rows inside it are looked at.
+
+payload() gives the same frames as compact columnar arrays, for the mode of
+myapp.py that filters and draws the graphs in the browser.
+"""
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+import connections
+import queries
+
+DB_PATH = "db/base_running.db"
+
+# columns with few distinct values, stored as categoricals
+CATEGORICAL_COLUMNS = ("league", "team")
+
+# each frame and the query it is read with
+FRAMES = {
+    "leaders": queries.LEADER_SALARY,
+    "team_stats": queries.TEAM_BASE_STATS,
+    "salary_bins": queries.SALARY_BINS,
+}
+
+# frames select() filters by team; the line graph of leaders always shows every team
+TEAM_FILTERED = ("team_stats", "salary_bins")
+
+# columns of each frame sent to the browser when the dashboard filters and draws there
+PAYLOAD_COLUMNS = {
+    "leaders": ("year", "league", "bases_stolen"),
+    "team_stats": ("year", "league", "team", "bases_stolen", "caught_stealing"),
+    "salary_bins": ("year", "league", "team", "salary", "players"),
+}
+
+
+def _read_sqlite(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        frames = {name: pd.read_sql_query(query.sql, conn) for name, query in FRAMES.items()}
+    finally:
+        conn.close()
+    # floats, as the stacked bar graph has always summed them
+    frames["team_stats"][["bases_stolen", "caught_stealing"]] = \
+        frames["team_stats"][["bases_stolen", "caught_stealing"]].astype(float)
+    for column in CATEGORICAL_COLUMNS:
+        # the same categories in every frame, so one lookup table filters them all
+        categories = sorted(set().union(*(frame[column].dropna().unique() for frame in frames.values())))
+        for frame in frames.values():
+            frame[column] = pd.Categorical(frame[column], categories=categories)
+    for name, frame in frames.items():
+        # stable, so rows of the same year stay in the order the figures have always drawn them
+        frames[name] = frame.sort_values("year", kind="stable", ignore_index=True)
+    return frames
+
+
+# start and stop of the rows in a year range, in a frame sorted by year
+def year_slice(years, year_range):
+    return (int(np.searchsorted(years, year_range[0], side="left")),
+            int(np.searchsorted(years, year_range[1], side="right")))
+
+
+# which category codes are selected: one slot per category plus a last, never
+# selected, slot that missing values (code -1) land in
+def code_lookup(categories, selected):
+    lookup = np.zeros(len(categories) + 1, dtype=bool)
+    positions = categories.get_indexer(list(selected or []))
+    lookup[positions[positions >= 0]] = True
+    return lookup
+
+
+# rows whose value of a categorical column is one of the selected values
+def code_mask(series, selected):
+    return code_lookup(series.cat.categories, selected)[series.cat.codes.to_numpy()]
+
+
+def _arrow_path(directory, version, name):
+    return os.path.join(directory, version, f"{name}.arrow")
+
+
+# write the frames as Arrow files for this version of the database, unless another process already has,
+# and remove the files of earlier versions (processes still mapping them keep their pages)
+def _write_arrow(directory, version, frames):
+    import pyarrow as pa
+
+    os.makedirs(os.path.join(directory, version), exist_ok=True)
+    for entry in os.scandir(directory):
+        if entry.is_dir() and entry.name != version:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    for name, frame in frames.items():
+        path = _arrow_path(directory, version, name)
+        if os.path.exists(path):
+            continue
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(temporary, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temporary, path)
+
+
+def _read_arrow(directory, version):
+    import pyarrow as pa
+
+    frames = {}
+    for name in FRAMES:
+        path = _arrow_path(directory, version, name)
+        if not os.path.exists(path):
+            return None
+        with pa.memory_map(path) as source:
+            frames[name] = pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+    return frames
+
+
+class DashboardData:
+    """Lazily loaded frames of the dashboard, reloaded when the database file changes"""
+
+    def __init__(self, db_path=DB_PATH, arrow_dir=None):
+        self.db_path = db_path
+        self.arrow_dir = arrow_dir
+        self.version = None
+        self.loads = 0
+        self._loaded = None
+        self._payload = None
+        self._lock = threading.Lock()
+
+    # the frames for the current database and their year columns, loading or reloading them if needed
+    def _current(self):
+        version = connections.file_signature(self.db_path)
+        if self._loaded is None or version != self.version:
+            with self._lock:
+                if self._loaded is None or version != self.version:
+                    frames = self._load(version)
+                    years = {name: frame["year"].to_numpy() for name, frame in frames.items()}
+                    self._loaded = (frames, years)
+                    self.version = version
+                    self.loads += 1
+        return self._loaded
+
+    def frames(self):
+        return self._current()[0]
+
+    def _load(self, version):
+        if self.arrow_dir:
+            frames = _read_arrow(self.arrow_dir, version)
+            if frames is not None:
+                return frames
+        frames = _read_sqlite(self.db_path)
+        if self.arrow_dir:
+            _write_arrow(self.arrow_dir, version, frames)
+        return frames
+
+    # load the frames now, before gunicorn forks its workers
+    def preload(self):
+        self.frames()
+
+    # rows of a frame in the year range and the selected leagues and teams (all teams when teams is None)
+    def filter(self, name, years, leagues, teams=None):
+        frames, year_columns = self._current()
+        start, stop = year_slice(year_columns[name], years)
+        frame = frames[name].iloc[start:stop]
+        mask = code_mask(frame["league"], leagues)
+        if teams is not None:
+            mask &= code_mask(frame["team"], teams)
+        return frame[mask]
+
+    # every frame filtered by the year range and leagues, and those in TEAM_FILTERED by the teams too,
+    # all from the same version of the database
+    def select(self, years, leagues, teams):
+        frames, year_columns = self._current()
+        first = next(iter(frames.values()))
+        league_lookup = code_lookup(first["league"].cat.categories, leagues)
+        team_lookup = code_lookup(first["team"].cat.categories, teams)
+        selected = {}
+        for name, frame in frames.items():
+            start, stop = year_slice(year_columns[name], years)
+            frame = frame.iloc[start:stop]
+            mask = league_lookup[frame["league"].cat.codes.to_numpy()]
+            if name in TEAM_FILTERED:
+                mask &= team_lookup[frame["team"].cat.codes.to_numpy()]
+            selected[name] = frame[mask]
+        return selected
+
+    # the frames as columnar arrays for the browser, league and team given as codes into
+    # the "leagues" and "teams" lists; built once for each version of the database
+    def payload(self):
+        frames = self.frames()
+        payload = self._payload
+        if payload is None or payload["version"] != self.version:
+            first = frames["leaders"]
+            payload = {
+                "version": self.version,
+                "leagues": first["league"].cat.categories.tolist(),
+                "teams": first["team"].cat.categories.tolist(),
+                # leagues in the order they first appear, which decides their colours
+                "league_order": first["league"].unique().tolist(),
+            }
+            for name, columns in PAYLOAD_COLUMNS.items():
+                frame = frames[name]
+                payload[name] = {
+                    column: (frame[column].cat.codes if column in CATEGORICAL_COLUMNS
+                             else frame[column]).tolist()
+                    for column in columns
+                }
+            self._payload = payload
+        return payload
+
+    @property
+    def leaders(self):
+        return self.frames()["leaders"]
+
+    @property
+    def team_stats(self):
+        return self.frames()["team_stats"]
+
+    @property
+    def salary_bins(self):
+        return self.frames()["salary_bins"]
+
+
+def from_environment(db_path=DB_PATH):
+    return DashboardData(db_path, os.environ.get("DASHBOARD_ARROW_DIR"))
@@ -0,0 +1,237 @@
+"""Fetch pages from https://www.baseball-almanac.com/ concurrently over plain HTTP.
+Selenium is only started for pages that cannot be read without a browser, and
+pages kept in a PageCache (see page_cache.py) are only downloaded again when
+the server says they changed"""
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import instrumentation
+
+BASE_URL = "https://www.baseball-almanac.com"
+USER_AGENT = "Mozilla/5.0"
+
+
+# build the url of a player's page from their player id
+def player_url(player_id, base_url=BASE_URL):
+    return f"{base_url.rstrip('/')}/players/player.php?p={player_id}"
+
+
+# build the url of the bases stolen leadership board
+def leaderboard_url(base_url=BASE_URL):
+    return f"{base_url.rstrip('/')}/hitting/hisb4.shtml"
+
+
+# start a headless Chrome driver, configured the same way the scraper always has been
+def make_chrome_driver(user_agent=USER_AGENT):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument('--headless')  # Enable headless mode
+    options.add_argument('--disable-gpu')  # Optional, recommended for Windows
+    options.add_argument(f'user-agent={user_agent}')
+    options.add_argument("--log-level=3")
+    return webdriver.Chrome(options=options)
+
+
+class FetchConfig:
+    """Throughput and politeness limits for a Fetcher.
+
+    requests_per_second and burst are applied per host, so the default of one
+    request every 5 seconds matches the old time.sleep(5) between pages.
+    """
+
+    def __init__(self, max_workers=4, requests_per_second=0.2, burst=1,
+                 timeout=10, base_url=BASE_URL, user_agent=USER_AGENT,
+                 selenium_fallback=True):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.max_workers = max_workers
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.timeout = timeout
+        self.base_url = base_url
+        self.user_agent = user_agent
+        self.selenium_fallback = selenium_fallback
+
+
+class TokenBucket:
+    """Token bucket rate limiter shared by every thread hitting one host.
+
+    Tokens refill at `rate` per second up to `burst`. A caller that finds the
+    bucket empty reserves the next token and sleeps until it is due, so waiting
+    threads are served in the order they arrived.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class FetchError(Exception):
+    """Raised when a page could not be fetched over HTTP or through Selenium"""
+
+
+class Fetcher:
+    """Fetch pages through a bounded thread pool with a token bucket per host.
+
+    Pages are requested with plain HTTP. When a request fails, or the response
+    has no tables in it, the page is loaded through a single shared Selenium
+    driver instead (unless config.selenium_fallback is off). With a cache,
+    fresh pages are served from disk and stale ones are revalidated with
+    If-None-Match/If-Modified-Since.
+    """
+
+    def __init__(self, config=None, driver_factory=make_chrome_driver, cache=None):
+        self.config = config or FetchConfig()
+        self.cache = cache
+        self._driver_factory = driver_factory
+        self._driver = None
+        self._driver_lock = threading.Lock()
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # the Selenium driver is only started the first time it is needed
+    @property
+    def driver(self):
+        with self._driver_lock:
+            if self._driver is None:
+                self._driver = self._driver_factory(self.config.user_agent)
+            return self._driver
+
+    def close(self):
+        with self._driver_lock:
+            if self._driver is not None:
+                self._driver.quit()
+                self._driver = None
+
+    def _bucket(self, url):
+        host = urlsplit(url).netloc
+        with self._buckets_lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.config.requests_per_second,
+                                                  self.config.burst)
+            return self._buckets[host]
+
+    # wait for the rate limit of url's host, recording how long that took
+    def _wait_turn(self, url):
+        instrumentation.observe("rate_limit_wait_seconds", self._bucket(url).acquire())
+
+    # a page without any table is either an error page or one that needs javascript
+    @staticmethod
+    def needs_browser(html):
+        return "<table" not in html.lower()
+
+    def fetch_http(self, url, cached=None):
+        headers = {"User-Agent": self.config.user_agent}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        self._wait_turn(url)
+        start = time.perf_counter()
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.config.timeout) as response:
+                charset = response.headers.get_content_charset() or "utf-8"
+                html = response.read().decode(charset, errors="replace")
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or cached is None:
+                raise
+            # not modified, the cached page is still good
+            instrumentation.observe("fetch_seconds", time.perf_counter() - start, source="http")
+            self.cache.revalidated(url, e.headers.get("ETag"), e.headers.get("Last-Modified"))
+            return cached.body
+        instrumentation.observe("fetch_seconds", time.perf_counter() - start, source="http")
+
+        if self.cache is not None and not self.needs_browser(html):
+            self.cache.put(url, html, etag, last_modified)
+        return html
+
+    def fetch_selenium(self, url):
+        driver = self.driver
+        self._wait_turn(url)
+        # a single driver cannot be shared between threads
+        with self._driver_lock:
+            start = time.perf_counter()
+            driver.get(url)
+            html = driver.page_source
+            instrumentation.observe("fetch_seconds", time.perf_counter() - start, source="selenium")
+        if self.cache is not None:
+            self.cache.put(url, html)
+        return html
+
+    # the page at url. The time it took is recorded by where it came from: here for the cache,
+    # by fetch_http and fetch_selenium for requests, without the wait for the rate limit
+    def fetch(self, url):
+        start = time.perf_counter()
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and self.cache.is_fresh(cached):
+            instrumentation.observe("fetch_seconds", time.perf_counter() - start, source="cache")
+            return cached.body
+
+        try:
+            html = self.fetch_http(url, cached)
+            if not self.needs_browser(html):
+                return html
+            reason = "no tables in response"
+            instrumentation.count("fetch_errors_total", error="NoTables")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            reason = f"{type(e).__name__} {e}"
+            instrumentation.count("fetch_errors_total", error=type(e).__name__)
+
+        if not self.config.selenium_fallback:
+            raise FetchError(f"{url}: {reason}")
+        instrumentation.count("selenium_fallbacks_total")
+        try:
+            html = self.fetch_selenium(url)
+        except Exception as e:
+            raise FetchError(f"{url}: {reason}; Selenium fallback failed: "
+                             f"{type(e).__name__} {e}") from e
+        return html
+
+    def fetch_many(self, urls):
+        """Fetch every url in the pool, yielding (url, html, error) as each one
+        finishes. Exactly one of html and error is None."""
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as pool:
+            futures = {pool.submit(self.fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result(), None
+                except Exception as e:
+                    yield url, None, e
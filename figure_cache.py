@@ -0,0 +1,210 @@
+"""Server-side cache of the figures myapp.py draws.
+
+A figure is looked up by the callback's name and a canonical form of its filter
+values (string selections such as leagues and teams are sorted and de-duplicated,
+since their order never changes a figure), so everyone looking at the same view
+shares one figure. Each process keeps the most recently used figures in memory;
+a disk directory or a Redis server can be added behind it so gunicorn workers
+share what each of them has drawn. Keys include a signature of the database file,
+so a rebuilt database invalidates every cached figure.
+
+The defaults can be changed with environment variables:
+    FIGURE_CACHE_SIZE       figures kept in memory by each process (0 turns the cache off)
+    FIGURE_CACHE_DIR        directory shared by the workers
+    FIGURE_CACHE_REDIS_URL  Redis server shared by the workers (needs the redis package)
+"""
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+from connections import file_signature
+
+DEFAULT_SIZE = 128
+DISK_MAX_ENTRIES = 4096
+REDIS_TTL = 24 * 3600
+
+
+def _canonical(value):
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, str) for item in value):
+            return sorted(set(value))
+        return [_canonical(item) for item in value]
+    if hasattr(value, "tolist"):
+        return _canonical(value.tolist())
+    return value
+
+
+def _to_dict(figure):
+    return json.loads(pio.to_json(figure, validate=False))
+
+
+# the cache key of a callback called with these filter values
+def canonical_key(name, args):
+    return json.dumps([name, [_canonical(arg) for arg in args]], separators=(",", ":"), default=str)
+
+
+class DiskBackend:
+    """Figures as JSON files in one directory per database signature, shared by processes"""
+
+    def __init__(self, directory, max_entries=DISK_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def _path(self, version, key):
+        return os.path.join(self.directory, version, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, version, key):
+        try:
+            with open(self._path(version, key), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, version, key, value):
+        path = self._path(version, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(temporary, path)
+        self._trim(os.path.dirname(path))
+
+    # drop the oldest figures once the directory holds too many
+    def _trim(self, directory):
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    # remove the figures drawn from earlier versions of the database
+    def invalidate(self, version):
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and entry.name != version:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class RedisBackend:
+    """Figures in Redis, under keys carrying the database signature (needs the redis package)"""
+
+    def __init__(self, url, prefix="mlb-figure", ttl=REDIS_TTL):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, version, key):
+        return f"{self.prefix}:{version}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+    def get(self, version, key):
+        value = self.client.get(self._key(version, key))
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, version, key, value):
+        self.client.set(self._key(version, key), value, ex=self.ttl)
+
+    # figures of earlier versions are never looked up again and expire on their own
+    def invalidate(self, version):
+        pass
+
+
+class FigureCache:
+    """Least recently used figures of this process, in front of an optional shared backend"""
+
+    def __init__(self, version, maxsize=DEFAULT_SIZE, backend=None):
+        self.version = version
+        self.maxsize = maxsize
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._current = None
+        self._lock = threading.Lock()
+
+    # the database signature, clearing every figure when it has changed
+    def _check_version(self):
+        version = self.version()
+        if version != self._current:
+            with self._lock:
+                if version != self._current:
+                    self._figures.clear()
+                    if self.backend is not None and self._current is not None:
+                        self.backend.invalidate(version)
+                    self._current = version
+        return version
+
+    def get(self, key):
+        version = self._check_version()
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return figure
+        if self.backend is not None:
+            value = self.backend.get(version, key)
+            if value is not None:
+                figure = json.loads(value)
+                self._remember(key, figure)
+                self.hits += 1
+                return figure
+        self.misses += 1
+        return None
+
+    def set(self, key, figure):
+        version = self._check_version()
+        self._remember(key, figure)
+        if self.backend is not None:
+            self.backend.set(version, key, json.dumps(figure, separators=(",", ":")))
+
+    def _remember(self, key, figure):
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+
+    # decorator caching what a callback returns (a figure or a list of them, for callbacks
+    # with several outputs), by its name and canonical arguments
+    def memoize(self, name):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args):
+                if self.maxsize <= 0:
+                    return function(*args)
+                key = canonical_key(name, args)
+                figure = self.get(key)
+                if figure is None:
+                    result = function(*args)
+                    if isinstance(result, (list, tuple)):
+                        figure = [_to_dict(item) for item in result]
+                    else:
+                        figure = _to_dict(result)
+                    self.set(key, figure)
+                return figure
+            return wrapper
+        return decorator
+
+
+# a cache set up from the FIGURE_CACHE_* environment variables, invalidated when db_path changes
+def from_environment(db_path):
+    backend = None
+    if os.environ.get("FIGURE_CACHE_REDIS_URL"):
+        backend = RedisBackend(os.environ["FIGURE_CACHE_REDIS_URL"])
+    elif os.environ.get("FIGURE_CACHE_DIR"):
+        backend = DiskBackend(os.environ["FIGURE_CACHE_DIR"])
+    maxsize = int(os.environ.get("FIGURE_CACHE_SIZE", DEFAULT_SIZE))
+    return FigureCache(lambda: file_signature(db_path), maxsize, backend)
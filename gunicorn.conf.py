@@ -0,0 +1,42 @@
+"""gunicorn settings for serving myapp.py, read automatically when gunicorn starts in this directory:
+
+    gunicorn myapp:server
+
+The app is imported once in the master process and its frames loaded before the
+workers are forked, so they share one copy of the data instead of each reading
+the database on their first request."""
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+preload_app = True
+
+
+# runs in the master, where myapp has already been imported because of preload_app
+def pre_fork(server, worker):
+    import myapp
+
+    myapp.data.preload()
+
+
+# the workers record their metrics in one file (see server_metrics.py), which is only kept
+# while the server runs unless METRICS_DB names one
+_metrics_db_owned = "METRICS_DB" not in os.environ
+os.environ.setdefault("METRICS_DB", os.path.join(tempfile.gettempdir(), f"mlb_metrics_{os.getpid()}.db"))
+
+
+def _remove_metrics_db():
+    if _metrics_db_owned:
+        import server_metrics
+
+        server_metrics.remove_store(os.environ["METRICS_DB"])
+
+
+# runs in the master as it starts and as it stops
+def on_starting(server):
+    _remove_metrics_db()
+
+
+def on_exit(server):
+    _remove_metrics_db()
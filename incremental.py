@@ -0,0 +1,42 @@
+"""Work out which player pages need scraping again, by comparing a freshly scraped
+leadership board with what db/base_running.db already holds"""
+import os
+import sqlite3
+
+# players whose last recorded season is this close to the newest season in the
+# database may have played since, so their pages are scraped again
+ACTIVE_WINDOW = 2
+
+
+# read what the database knows about each player and the newest season it has
+def load_known(db_path):
+    if not os.path.exists(db_path):
+        return set(), {}, None
+    # read-only, so the scrape can never write to the database it is compared with
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        known_ids = {row[0] for row in conn.execute("SELECT player_id FROM players")}
+        last_seasons = dict(conn.execute(
+            "SELECT player_id, MAX(year) FROM player_yearly_stats GROUP BY player_id"))
+        latest_year = conn.execute("SELECT MAX(year) FROM yoy_leader").fetchone()[0]
+    finally:
+        conn.close()
+    return known_ids, last_seasons, latest_year
+
+
+# pick the player ids whose pages have to be fetched:
+# players the database has never seen, leaders of seasons newer than the database,
+# and players who were still active when the database was last built
+def players_to_fetch(yearly_data, db_path, active_window=ACTIVE_WINDOW):
+    known_ids, last_seasons, latest_year = load_known(db_path)
+    leader_ids = {row[2] for row in yearly_data if row[2]}
+    if latest_year is None:
+        return leader_ids
+
+    new_ids = leader_ids - known_ids
+    new_season_ids = {row[2] for row in yearly_data
+                      if row[2] and str(row[0]).isdigit() and int(row[0]) > latest_year}
+    active_ids = {player for player in leader_ids & known_ids
+                  if last_seasons.get(player) is None
+                  or last_seasons[player] >= latest_year - active_window}
+    return new_ids | new_season_ids | active_ids
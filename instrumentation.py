@@ -0,0 +1,357 @@
+"""Timings and counts of the scrape, clean and load stages.
+
+Code records three kinds of measurement through the module-level functions:
+
+    with span("clean", table="player_salary") as s:   # time a stage or a table in it
+        ...
+        s.rows = len(cleaned)                        # rows handled, for rows per second
+    count("page_retries_total")                      # add to a counter
+    observe("fetch_seconds", 0.42, source="http")    # add a value to a histogram
+    summarize("request_seconds", 0.05, route="/")    # add a value to a summary of recent percentiles
+
+Nothing is written until a script calls configure() with a trace file, a
+metrics file or both (web_scraping.py, clean.py and sql_database.py take
+--trace and --metrics). The trace gets one JSON object per line for every span
+as it ends and for every count and observation, in the order they happened,
+with the span of their thread they happened in. The metrics file is written by close() in the
+Prometheus text format: every span's total seconds, rows, runs and rows per
+second, every counter and gauge, every histogram as cumulative buckets with
+their sum and count, and every summary as the percentiles of its last values
+with the sum and count of them all. Spans which end with an exception add to exceptions_total.
+
+Measurements are kept in memory when no file is configured, so calling these
+functions costs little whether or not anything is written, and they can be
+called from any thread.
+
+    py web_scraping.py --trace logs/scrape.jsonl --metrics logs/scrape.prom
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+PREFIX = "mlb_"
+
+# upper bounds in seconds of the buckets histograms count values into
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+
+# the percentiles summaries give, over their last WINDOW values
+QUANTILES = (0.5, 0.9, 0.99)
+WINDOW = 1024
+
+# help text of the metrics in the Prometheus dump
+DESCRIPTIONS = {
+    "span_seconds_total": "Seconds spent in each stage and table",
+    "span_rows_total": "Rows handled in each stage and table",
+    "span_runs_total": "Times each stage and table ran",
+    "span_rows_per_second": "Rows handled per second in each stage and table",
+    "exceptions_total": "Spans which ended with an exception, by exception type",
+    "fetch_seconds": "Seconds to get a page, by where it came from, after waiting for the rate limit",
+    "rate_limit_wait_seconds": "Seconds a request waited for the rate limit of its host",
+    "fetch_errors_total": "Pages the plain HTTP request could not read, by exception type",
+    "selenium_fallbacks_total": "Pages loaded through Selenium after plain HTTP failed",
+    "parse_seconds": "Seconds to parse a page into rows",
+    "pages_total": "Player pages scraped",
+    "page_errors_total": "Player pages which could not be fetched or parsed, by exception type",
+    "page_retries_total": "Player pages put back in the queue to be tried again",
+    "pages_failed_total": "Player pages given up on after their last attempt",
+    "rows_total": "Rows written by each stage and table",
+    "request_seconds": "Seconds to answer a request, by callback or route",
+    "response_bytes": "Bytes of the response to a request, by callback or route",
+    "responses_total": "Responses sent, by callback or route and status",
+    "callback_phase_seconds": "Seconds spent in each phase of a callback",
+    "filter_states_total": "Callback requests",
+    "filter_states_repeated_total": "Callback requests for filters asked for before",
+    "figure_cache_hits_total": "Figures served from the figure cache",
+    "figure_cache_misses_total": "Figures drawn because they were not in the figure cache",
+    "metrics_start_time_seconds": "When the server's metrics started, in seconds since the epoch",
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# labels as Prometheus writes them, {name="value",...}
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Counts of values at or below each bucket's upper bound, with their sum"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    # the cumulative count of each bucket, as Prometheus expects them
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class Window:
+    """The last values of a summary, for its percentiles, with the sum and count of every value"""
+
+    def __init__(self, size=WINDOW):
+        self.values = deque(maxlen=size)
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, value):
+        self.values.append(value)
+        self.sum += value
+        self.count += 1
+
+    # the value of each quantile by the nearest rank of the values in the window
+    def quantiles(self, quantiles=QUANTILES):
+        ordered = sorted(self.values)
+        for quantile in quantiles:
+            yield quantile, ordered[max(0, math.ceil(quantile * len(ordered)) - 1)]
+
+
+class Span:
+    """A stage or table being timed; set rows to the rows it handled"""
+
+    def __init__(self, recorder, name, labels):
+        self.recorder = recorder
+        self.name = name
+        self.labels = labels
+        self.rows = None
+        self.parent = None
+        self.start = None
+        self.seconds = None
+        self._started = None
+
+    def __enter__(self):
+        self.parent = self.recorder._enter(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self._started
+        self.recorder._exit(self, None if exc_type is None else exc_type.__name__)
+
+
+class Recorder:
+    """Spans, counters and histograms of one run, written to a trace and a metrics file"""
+
+    def __init__(self, trace_path=None, metrics_path=None):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.summaries = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._trace = None
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+            self._trace = open(trace_path, "a", encoding="utf-8")
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _current(self):
+        stack = self._stack()
+        return stack[-1].name if stack else None
+
+    def _write(self, event):
+        if self._trace is not None:
+            line = json.dumps(event, separators=(",", ":"), default=str)
+            with self._lock:
+                self._trace.write(line + "\n")
+
+    def span(self, name, **labels):
+        return Span(self, name, labels)
+
+    def _enter(self, span):
+        parent = self._current()
+        self._stack().append(span)
+        return parent
+
+    def _exit(self, span, error):
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+        self.add_span(span.name, span.seconds, span.rows, start=span.start, parent=span.parent,
+                      error=error, **span.labels)
+
+    # record a span timed elsewhere, such as the per-table timings sql_database.py keeps
+    def add_span(self, name, seconds, rows=None, start=None, parent=None, error=None, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            # seconds, rows (None until a run gives them) and runs
+            totals = self.spans.setdefault(key, [0.0, None, 0])
+            totals[0] += seconds
+            if rows is not None:
+                totals[1] = (totals[1] or 0) + rows
+            totals[2] += 1
+        event = {"time": time.time() - seconds if start is None else start, "event": "span", "name": name,
+                 "labels": labels, "seconds": seconds, "parent": parent if parent else self._current()}
+        if rows is not None:
+            event["rows"] = rows
+            event["rows_per_second"] = rows / seconds if seconds else None
+        if error is not None:
+            event["error"] = error
+            self.count("exceptions_total", span=name, error=error)
+        self._write(event)
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._write({"time": time.time(), "event": "count", "name": name, "labels": labels,
+                     "value": value, "parent": self._current()})
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.add(value)
+        self._write({"time": time.time(), "event": "observe", "name": name, "labels": labels,
+                     "value": value, "parent": self._current()})
+
+    def summarize(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            window = self.summaries.get(key)
+            if window is None:
+                window = self.summaries[key] = Window()
+            window.add(value)
+        self._write({"time": time.time(), "event": "summarize", "name": name, "labels": labels,
+                     "value": value, "parent": self._current()})
+
+    # set a gauge, such as a total kept elsewhere
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    # every metric in the Prometheus text format
+    def prometheus(self):
+        families = {}
+
+        def add(name, kind, line):
+            families.setdefault(name, (kind, []))[1].append(line)
+
+        with self._lock:
+            for (name, labels), (seconds, rows, runs) in sorted(self.spans.items()):
+                labels = (("span", name),) + labels
+                add("span_seconds_total", "counter", f"{_labels(labels)} {_number(seconds)}")
+                if rows is not None:
+                    add("span_rows_total", "counter", f"{_labels(labels)} {rows}")
+                add("span_runs_total", "counter", f"{_labels(labels)} {runs}")
+                if rows and seconds:
+                    add("span_rows_per_second", "gauge", f"{_labels(labels)} {_number(rows / seconds)}")
+            for (name, labels), value in sorted(self.counters.items()):
+                add(name, "counter", f"{_labels(labels)} {_number(value)}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                add(name, "gauge", f"{_labels(labels)} {_number(value)}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bound, total in histogram.cumulative():
+                    add(name, "histogram", f"_bucket{_labels(labels + (('le', _number(bound)),))} {total}")
+                add(name, "histogram", f"_sum{_labels(labels)} {_number(histogram.sum)}")
+                add(name, "histogram", f"_count{_labels(labels)} {histogram.count}")
+            for (name, labels), window in sorted(self.summaries.items()):
+                for quantile, value in window.quantiles():
+                    add(name, "summary", f"{_labels(labels + (('quantile', quantile),))} {_number(value)}")
+                add(name, "summary", f"_sum{_labels(labels)} {_number(window.sum)}")
+                add(name, "summary", f"_count{_labels(labels)} {window.count}")
+
+        lines = []
+        for name, (kind, samples) in families.items():
+            if name in DESCRIPTIONS:
+                lines.append(f"# HELP {PREFIX}{name} {DESCRIPTIONS[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            lines.extend(f"{PREFIX}{name}{sample}" for sample in samples)
+        return "\n".join(lines) + "\n"
+
+    # write the metrics file and close the trace
+    def close(self):
+        if self.metrics_path:
+            os.makedirs(os.path.dirname(self.metrics_path) or ".", exist_ok=True)
+            temporary = f"{self.metrics_path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(temporary, self.metrics_path)
+        if self._trace is not None:
+            with self._lock:
+                self._trace.close()
+                self._trace = None
+
+
+# the recorder the module-level functions use, keeping everything in memory until configure()
+recorder = Recorder()
+
+
+# start recording to a trace file and/or a metrics file, closing the previous recorder
+def configure(trace_path=None, metrics_path=None):
+    global recorder
+    recorder.close()
+    recorder = Recorder(trace_path, metrics_path)
+    return recorder
+
+
+def span(name, **labels):
+    return recorder.span(name, **labels)
+
+
+def add_span(name, seconds, rows=None, **labels):
+    recorder.add_span(name, seconds, rows, **labels)
+
+
+def count(name, value=1, **labels):
+    recorder.count(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    recorder.observe(name, value, **labels)
+
+
+def summarize(name, value, **labels):
+    recorder.summarize(name, value, **labels)
+
+
+def close():
+    recorder.close()
+
+
+# the --trace and --metrics options every instrumented script takes
+def add_arguments(parser):
+    parser.add_argument("--trace", default=None,
+                        help="append a JSON line for every span, count and timing to this file")
+    parser.add_argument("--metrics", default=None,
+                        help="write the totals of the run to this file in the Prometheus text format")
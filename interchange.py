@@ -0,0 +1,187 @@
+"""Typed columnar files for the tables passed between web_scraping.py, clean.py
+and sql_database.py.
+
+Each stage can write its tables as Arrow IPC files or Parquet files instead of
+CSV (--output-format, --input-format). The files carry an explicit schema, so
+the next stage gets back the integers, floats and text the previous stage
+produced without parsing text or guessing dtypes again. Arrow files are memory
+mapped when read, so a table is paged in from the OS cache rather than copied;
+Parquet files are smaller on disk and memory mapped while they are decoded.
+Both need pyarrow.
+
+CSV stays the default and the export format: running this file writes a CSV
+copy of Arrow or Parquet tables, or turns CSV files into Arrow or Parquet files
+with every column as text, as raw tables from earlier scrapes are.
+
+    py interchange.py cleaned_data/*.arrow
+    py interchange.py raw_data/*.csv --to arrow
+"""
+import argparse
+import os
+
+import pandas as pd
+
+FORMATS = ("csv", "parquet", "arrow")
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+# where the table `name` is kept in a directory for a format
+def table_path(directory, name, file_format="csv"):
+    if file_format not in EXTENSIONS:
+        raise ValueError(f"unknown format {file_format!r}, expected one of {', '.join(FORMATS)}")
+    return os.path.join(directory, name + EXTENSIONS[file_format])
+
+
+# the format of a file, from its extension
+def path_format(path):
+    for file_format, extension in EXTENSIONS.items():
+        if path.endswith(extension):
+            return file_format
+    raise ValueError(f"cannot tell the format of {path}, expected one of {', '.join(EXTENSIONS.values())}")
+
+
+# an Arrow schema for columns with types given as Arrow type names ("int64", "float64"),
+# text for any column not in types
+def arrow_schema(columns, types=None):
+    import pyarrow as pa
+
+    types = types or {}
+    return pa.schema([(column, pa.type_for_alias(types.get(column, "string"))) for column in columns])
+
+
+# read an Arrow or Parquet file as a pyarrow Table, memory mapped
+def read_table(path, file_format=None):
+    import pyarrow as pa
+
+    file_format = file_format or path_format(path)
+    if file_format == "arrow":
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all()
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path, memory_map=True)
+    raise ValueError(f"{path} is not an Arrow or Parquet file")
+
+
+# the record batches of an Arrow or Parquet file, about batch_rows rows each for Parquet
+# and as written for Arrow
+def read_batches(path, file_format=None, batch_rows=65_536):
+    import pyarrow as pa
+
+    file_format = file_format or path_format(path)
+    if file_format == "arrow":
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index)
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_rows)
+    else:
+        raise ValueError(f"{path} is not an Arrow or Parquet file")
+
+
+# read a table as a DataFrame: CSV with pandas' own type inference, as the stages always have,
+# Arrow and Parquet with the types they were written with
+def read_frame(path, file_format=None):
+    file_format = file_format or path_format(path)
+    if file_format == "csv":
+        return pd.read_csv(path)
+    return read_table(path, file_format).to_pandas()
+
+
+class TableWriter:
+    """Write a table one DataFrame chunk at a time, as CSV (the header before the first
+    chunk only) or as an Arrow or Parquet file with the schema of the columns and types"""
+
+    def __init__(self, path, columns=None, types=None, file_format=None):
+        self.path = path
+        self.format = file_format or path_format(path)
+        self.types = types
+        self.schema = None if columns is None else self._schema(columns)
+        self.rows = 0
+        self.columns = 0
+        self._writer = None
+        self._started = False
+
+    def _schema(self, columns):
+        return None if self.format == "csv" else arrow_schema(columns, self.types)
+
+    def _open(self):
+        import pyarrow as pa
+
+        if self.format == "arrow":
+            return pa.ipc.new_file(self.path, self.schema)
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, df):
+        if self.format == "csv":
+            df.to_csv(self.path, mode="a" if self._started else "w",
+                      header=not self._started, index=False)
+        else:
+            import pyarrow as pa
+
+            if self.schema is None:
+                self.schema = self._schema(list(df.columns))
+            if self._writer is None:
+                self._writer = self._open()
+            self._writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+        self._started = True
+        self.rows += len(df)
+        self.columns = df.shape[1]
+
+    # finish the file; a table no chunk was written to is still written, empty
+    def close(self):
+        if self.format != "csv" and self._writer is None and self.schema is not None:
+            self._writer = self._open()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def shape(self):
+        return [self.rows, self.columns]
+
+
+# write a copy of a file in another format; CSV files are read with every column as text
+def convert(path, to_format):
+    target = os.path.splitext(path)[0] + EXTENSIONS[to_format]
+    if target == path:
+        raise ValueError(f"{path} is already a {to_format} file")
+    if path_format(path) == "csv":
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        types = None
+    else:
+        table = read_table(path)
+        df = table.to_pandas()
+        types = {field.name: str(field.type) for field in table.schema}
+    with TableWriter(target, list(df.columns), types, to_format) as writer:
+        writer.write(df)
+    return target
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Copy tables between CSV, Arrow and Parquet files.")
+    parser.add_argument("paths", nargs="+", help="files to copy, written next to them")
+    parser.add_argument("--to", choices=FORMATS, default="csv", help="format of the copies")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for path in args.paths:
+        print(f"Saved: {convert(path, args.to)}")
+
+
+if __name__ == "__main__":
+    main()
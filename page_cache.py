@@ -0,0 +1,186 @@
+"""On-disk cache of fetched pages, so reruns of web_scraping.py only download
+pages which changed since the last run.
+
+Bodies are stored zlib-compressed under the sha256 of their content, so pages
+with identical content share one file. An SQLite index maps each url to its
+body along with the ETag and Last-Modified headers used to revalidate it."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+CachedPage = namedtuple("CachedPage", ["url", "body", "etag", "last_modified", "fetched_at"])
+
+
+class PageCache:
+    """Cache of page bodies keyed by url.
+
+    ttl: seconds a page is used without asking the server again. Once it has
+        passed the page is revalidated with a conditional request.
+    max_age: seconds after which a page is evicted even if it could still be
+        revalidated. None keeps pages until they are pushed out by max_bytes.
+    max_bytes: total compressed size kept on disk. The least recently used
+        pages are evicted once it is exceeded.
+    """
+
+    def __init__(self, directory="cache/pages", ttl=24 * 60 * 60, max_age=None,
+                 max_bytes=512 * 1024 * 1024, clock=time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.db"),
+                                     check_same_thread=False)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY NOT NULL,
+            digest TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest)")
+        self._conn.commit()
+        self.evict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], f"{digest}.z")
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest, etag, last_modified, fetched_at FROM pages WHERE url = ?",
+                (url,)).fetchone()
+            if row is None:
+                return None
+            digest, etag, last_modified, fetched_at = row
+            try:
+                with open(self._path(digest), "rb") as f:
+                    body = zlib.decompress(f.read()).decode("utf-8")
+            except (OSError, zlib.error):
+                # body went missing or is corrupt, treat it as never cached
+                self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?",
+                               (self._clock(), url))
+            self._conn.commit()
+        return CachedPage(url, body, etag, last_modified, fetched_at)
+
+    # a fresh page can be used without asking the server whether it changed
+    def is_fresh(self, page):
+        return self.ttl is not None and self._clock() - page.fetched_at < self.ttl
+
+    def put(self, url, body, etag=None, last_modified=None):
+        data = body.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        compressed = zlib.compress(data, 6)
+        now = self._clock()
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+            old = self._conn.execute("SELECT digest FROM pages WHERE url = ?", (url,)).fetchone()
+            self._conn.execute("""
+                INSERT INTO pages (url, digest, size, etag, last_modified, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    digest = excluded.digest, size = excluded.size, etag = excluded.etag,
+                    last_modified = excluded.last_modified, fetched_at = excluded.fetched_at,
+                    accessed_at = excluded.accessed_at
+                """, (url, digest, len(compressed), etag, last_modified, now, now))
+            if old is not None and old[0] != digest:
+                self._remove_orphan(old[0])
+            self._conn.commit()
+        if self.max_bytes is not None and self.total_bytes() > self.max_bytes:
+            self.evict()
+
+    # the server answered 304 Not Modified, so the cached page is fresh again
+    def revalidated(self, url, etag=None, last_modified=None):
+        now = self._clock()
+        with self._lock:
+            self._conn.execute("""
+                UPDATE pages SET fetched_at = ?, accessed_at = ?,
+                    etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                WHERE url = ?
+                """, (now, now, etag, last_modified, url))
+            self._conn.commit()
+
+    def total_bytes(self):
+        with self._lock:
+            # pages sharing a body only take up its space once
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM pages)"
+            ).fetchone()[0]
+
+    def _remove_orphan(self, digest):
+        in_use = self._conn.execute("SELECT 1 FROM pages WHERE digest = ? LIMIT 1",
+                                    (digest,)).fetchone()
+        if in_use is None:
+            try:
+                os.remove(self._path(digest))
+            except FileNotFoundError:
+                pass
+
+    def _delete(self, urls):
+        for url, digest in urls:
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._remove_orphan(digest)
+
+    def evict(self):
+        """Drop pages past max_age, and stale pages which have no ETag or
+        Last-Modified to revalidate them with, then drop least recently used
+        pages until the cache fits in max_bytes. Returns the number evicted."""
+        now = self._clock()
+        evicted = 0
+        with self._lock:
+            expired = []
+            if self.max_age is not None:
+                expired += self._conn.execute(
+                    "SELECT url, digest FROM pages WHERE fetched_at < ?",
+                    (now - self.max_age,)).fetchall()
+            if self.ttl is not None:
+                expired += self._conn.execute("""
+                    SELECT url, digest FROM pages
+                    WHERE fetched_at < ? AND etag IS NULL AND last_modified IS NULL
+                    """, (now - self.ttl,)).fetchall()
+            self._delete(set(expired))
+            evicted += len(set(expired))
+
+            if self.max_bytes is not None:
+                total = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM pages)"
+                ).fetchone()[0]
+                lru = self._conn.execute(
+                    "SELECT url, digest, size FROM pages ORDER BY accessed_at").fetchall()
+                for url, digest, size in lru:
+                    if total <= self.max_bytes:
+                        break
+                    self._delete([(url, digest)])
+                    evicted += 1
+                    if not os.path.exists(self._path(digest)):
+                        total -= size
+            self._conn.commit()
+        return evicted
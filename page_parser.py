@@ -0,0 +1,275 @@
+"""Parse raw pages from https://www.baseball-almanac.com/ into rows.
+
+The html is parsed once by a C-backed parser (selectolax or lxml, whichever is
+installed, falling back to Python's html.parser) and cell text is read the way
+Selenium's .text reads it, so rows match the old Selenium scraper exactly"""
+import re
+from html.parser import HTMLParser
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+             "link", "meta", "param", "source", "track", "wbr"}
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+SPACES = re.compile(r"[ \t\r\f]+")
+
+
+# visible text: collapsed whitespace, line breaks from <br>, non-breaking spaces kept as spaces
+def visible_text(raw):
+    lines = (SPACES.sub(" ", line.replace("\n", " ")).strip()
+             for line in raw.split("\n"))
+    return "\n".join(lines).replace("\xa0", " ").strip()
+
+
+class Node:
+    """A single element of a page parsed by html.parser"""
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs or [])
+        self.parent = parent
+        self.children = []
+
+    # every element below this one with the given tag, in document order
+    def iter(self, tag):
+        for child in self.children:
+            if isinstance(child, Node):
+                if child.tag == tag:
+                    yield child
+                yield from child.iter(tag)
+
+    def raw_text(self):
+        parts = []
+        for child in self.children:
+            if isinstance(child, Node):
+                if child.tag == "br":
+                    parts.append("\n")
+                elif child.tag not in SKIPPED_TAGS:
+                    parts.append(child.raw_text())
+            else:
+                parts.append(child)
+        return "".join(parts)
+
+
+class _TreeBuilder(HTMLParser):
+    # tags which close an open tag of the same kind, up to the given boundary
+    IMPLIED_END = {"td": ("td", "th"), "th": ("td", "th"), "tr": ("tr",)}
+    BOUNDARY = {"td": ("tr", "table"), "th": ("tr", "table"), "tr": ("table",)}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("document")
+        self.current = self.root
+
+    def _close_implied(self, tag):
+        node = self.current
+        while node is not self.root and node.tag not in self.BOUNDARY[tag]:
+            if node.tag in self.IMPLIED_END[tag]:
+                self.current = node.parent
+                return
+            node = node.parent
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.IMPLIED_END:
+            self._close_implied(tag)
+        node = Node(tag, attrs, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Node(tag, attrs, self.current))
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root:
+            if node.tag == tag:
+                self.current = node.parent
+                return
+            node = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+class HtmlParserBackend:
+    """Pure Python backend, used when neither selectolax nor lxml is installed"""
+
+    name = "html.parser"
+
+    def tables(self, html):
+        builder = _TreeBuilder()
+        builder.feed(html)
+        builder.close()
+        return list(builder.root.iter("table"))
+
+    def rows(self, table):
+        return list(table.iter("tr"))
+
+    def cells(self, row):
+        return list(row.iter("td"))
+
+    def text(self, cell):
+        return visible_text(cell.raw_text())
+
+    def href(self, cell):
+        for link in cell.iter("a"):
+            if link.attrs.get("href") is not None:
+                return link.attrs["href"]
+        return None
+
+
+class LxmlBackend:
+    """libxml2 backend through lxml"""
+
+    name = "lxml"
+
+    def __init__(self):
+        from lxml import etree
+        self._parser = etree.HTMLParser(remove_comments=True)
+        self._etree = etree
+
+    def tables(self, html):
+        root = self._etree.fromstring(html, self._parser)
+        return [] if root is None else list(root.iter("table"))
+
+    def rows(self, table):
+        return list(table.iter("tr"))
+
+    def cells(self, row):
+        return list(row.iter("td"))
+
+    def _raw_text(self, element):
+        parts = [element.text or ""]
+        for child in element:
+            if child.tag == "br":
+                parts.append("\n")
+            elif isinstance(child.tag, str) and child.tag not in SKIPPED_TAGS:
+                parts.append(self._raw_text(child))
+            parts.append(child.tail or "")
+        return "".join(parts)
+
+    def text(self, cell):
+        return visible_text(self._raw_text(cell))
+
+    def href(self, cell):
+        for link in cell.iter("a"):
+            if link.get("href") is not None:
+                return link.get("href")
+        return None
+
+
+class SelectolaxBackend:
+    """lexbor backend through selectolax, which parses html the way browsers do"""
+
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def tables(self, html):
+        return self._parser(html).css("table")
+
+    def rows(self, table):
+        return table.css("tr")
+
+    def cells(self, row):
+        return row.css("td")
+
+    def _raw_text(self, node):
+        parts = []
+        for child in node.iter(include_text=True):
+            if child.tag == "-text":
+                parts.append(child.text_content)
+            elif child.tag == "br":
+                parts.append("\n")
+            elif child.tag not in SKIPPED_TAGS and child.tag != "-comment":
+                parts.append(self._raw_text(child))
+        return "".join(parts)
+
+    def text(self, cell):
+        return visible_text(self._raw_text(cell))
+
+    def href(self, cell):
+        link = cell.css_first("a[href]")
+        return None if link is None else link.attributes["href"]
+
+
+BACKENDS = {
+    "selectolax": SelectolaxBackend,
+    "lxml": LxmlBackend,
+    "html.parser": HtmlParserBackend,
+}
+_loaded = {}
+
+
+# get a parser backend by name, or the fastest one installed when no name is given
+def get_backend(name=None):
+    if name is None:
+        for candidate in BACKENDS:
+            try:
+                return get_backend(candidate)
+            except ImportError:
+                continue
+    if name not in BACKENDS:
+        raise ValueError(f"unknown parser {name!r}, expected one of {', '.join(BACKENDS)}")
+    if name not in _loaded:
+        _loaded[name] = BACKENDS[name]()
+    return _loaded[name]
+
+
+def _resolve(backend):
+    return backend if hasattr(backend, "tables") else get_backend(backend)
+
+
+# get the rows of the bases stolen leadership board (first table on the page)
+# each table row holds the American and National League leaders for one year
+def parse_leaderboard(html, backend=None):
+    backend = _resolve(backend)
+    tables = backend.tables(html)
+    if not tables:
+        raise ValueError("no table found on leadership board")
+
+    yearly_data = []
+    for row in backend.rows(tables[0])[1:]:
+        cells = backend.cells(row)
+        if len(cells) != 8:
+            continue
+        year_al, _, bases_al, team_al, year_nl, _, bases_nl, team_nl = (
+            backend.text(cell) for cell in cells)
+
+        # the player id is the end of the link to the player's page
+        player_ids = []
+        for cell in (cells[1], cells[5]):
+            href = backend.href(cell)
+            player_ids.append(href.strip().partition("p=")[2] if href else "")
+
+        yearly_data.append((year_al, "American League", player_ids[0],
+                            backend.text(cells[1]), team_al, bases_al))
+        yearly_data.append((year_nl, "National League", player_ids[1],
+                            backend.text(cells[5]), team_nl, bases_nl))
+    return yearly_data
+
+
+# get the base running stats (second to last table) and salary (last table) rows
+# from a player's page
+def parse_player_page(html, player, backend=None):
+    backend = _resolve(backend)
+    tables = backend.tables(html)
+    if len(tables) < 2:
+        raise ValueError(f"expected at least 2 tables on page for {player}, found {len(tables)}")
+
+    base_running_stats = []
+    for row in backend.rows(tables[-2])[1:]:
+        cells = backend.cells(row)
+        if len(cells) == 13:
+            team, sb, cs, sb_per = (backend.text(cell) for cell in cells[:4])
+            base_running_stats.append((player, team, sb, cs, sb_per))
+
+    player_salary = []
+    for row in backend.rows(tables[-1])[1:]:
+        cells = backend.cells(row)
+        if len(cells) == 5:
+            team_roster, uniform_number, salary = (backend.text(cell) for cell in cells[:3])
+            player_salary.append((player, team_roster, uniform_number, salary))
+
+    return base_running_stats, player_salary
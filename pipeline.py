@@ -0,0 +1,268 @@
+"""Run the whole pipeline, scraping, cleaning and loading, skipping what has not changed.
+
+The stages form a small graph:
+
+    scrape -> clean_<table>, one for each raw table -> load
+
+Each stage has a fingerprint: a hash of the contents of its input files, of the
+source of the modules it runs and of the options which change what it writes.
+A stage whose fingerprint matches its last successful run, and whose outputs
+are still the files that run wrote, is skipped. Scraping reads the website
+rather than files, so it only runs when asked for with --scrape.
+
+The three clean stages do not depend on each other and run at the same time in
+a process pool. Loading prepares the rows of its five tables in the pool too,
+then writes them from this process in one transaction, as sql_database.py does,
+since SQLite takes one writer at a time.
+
+Fingerprints are kept in cache/pipeline_state.json, along with the size, mtime
+and hash of every file seen, so unchanged files are not hashed again.
+
+    py pipeline.py                          # clean and load whatever changed
+    py pipeline.py --scrape --format arrow  # scrape too, passing typed tables between stages
+    py pipeline.py --dry-run
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import shlex
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import clean
+import interchange
+import sql_database
+
+STATE_PATH = "cache/pipeline_state.json"
+RAW_DIR = "raw_data"
+CLEANED_DIR = "cleaned_data"
+REMOVED_DIR = "removed_data"
+
+# name: the stage, after: stages whose outputs it reads, inputs and outputs: the files it reads and
+# writes, code: modules whose source decides what it writes, parameters: options which do too,
+# run: function called with the options and the pool (None inside a worker),
+# parallel: run in a worker process next to the other stages of its group
+Stage = namedtuple("Stage", ["name", "after", "inputs", "outputs", "code", "parameters", "run", "parallel"])
+
+
+def _source(module):
+    return os.path.abspath(module.__file__)
+
+
+# the sha256 of a file's contents, None when it does not exist; files whose size and mtime
+# are those recorded in known are not read again
+def file_hash(path, known):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    recorded = known.get(path)
+    if recorded and recorded[0] == stat.st_mtime_ns and recorded[1] == stat.st_size:
+        return recorded[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    known[path] = [stat.st_mtime_ns, stat.st_size, digest.hexdigest()]
+    return known[path][2]
+
+
+def fingerprint(stage, known):
+    parts = [stage.name, stage.parameters,
+             [(path, file_hash(path, known)) for path in stage.inputs],
+             [(os.path.basename(path), file_hash(path, known)) for path in stage.code]]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"stages": {}, "files": {}}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(temporary, path)
+
+
+# why a stage has to run, or None when its last run still stands
+def stale_reason(stage, state):
+    recorded = state["stages"].get(stage.name)
+    if recorded is None:
+        return "never run"
+    if recorded["fingerprint"] != fingerprint(stage, state["files"]):
+        return "inputs changed"
+    for path in stage.outputs:
+        if path not in recorded["outputs"]:
+            return f"{path} not written by the last run"
+        if file_hash(path, state["files"]) != recorded["outputs"][path]:
+            return f"{path} changed"
+    return None
+
+
+# stages in groups which only depend on stages of earlier groups
+def levels(stages):
+    done, remaining, groups = set(), list(stages), []
+    while remaining:
+        group = [stage for stage in remaining if all(name in done for name in stage.after)]
+        if not group:
+            raise ValueError(f"stages depend on each other: {', '.join(stage.name for stage in remaining)}")
+        groups.append(group)
+        done.update(stage.name for stage in group)
+        remaining = [stage for stage in remaining if stage not in group]
+    return groups
+
+
+def run_scrape(options, pool=None):
+    import web_scraping
+
+    status = web_scraping.main(["--output-format", options.raw_format, *shlex.split(options.scrape_args)])
+    # raw_data has been rewritten with only some of the rows, which must not reach the database
+    if status != 0:
+        raise RuntimeError("the scrape stopped part way, run it again to resume")
+
+
+# clean one raw table, returning the shape of every output
+def run_clean(name, options, pool=None):
+    writers = clean.clean_file(name, clean.get_kernels(options.kernels), options.chunk_rows,
+                               RAW_DIR, CLEANED_DIR, REMOVED_DIR, options.raw_format, options.format)
+    return {output: writer.shape for output, writer in writers.items()}
+
+
+# prepare the rows of every table in the pool, then write them all from this process
+def run_load(options, pool=None):
+    tables = [table for table, _, _ in sql_database.TABLE_LOADS]
+    arguments = [(table, CLEANED_DIR, options.format) for table in tables]
+    if pool is None:
+        prepared = [sql_database.load_rows(*args) for args in arguments]
+    else:
+        prepared = list(pool.map(sql_database.load_rows, *zip(*arguments)))
+    sql_database.build_database(options.db, dict(zip(tables, prepared)), options.batch_size)
+
+
+def build_stages(options):
+    stages = [Stage("scrape", (), (),
+                    [interchange.table_path(RAW_DIR, name, options.raw_format) for name in clean.TABLES],
+                    (), {}, run_scrape, False)]
+    clean_code = [_source(clean), _source(interchange)]
+    for name, (_, extra_outputs) in clean.TABLES.items():
+        outputs = [interchange.table_path(REMOVED_DIR, f"{name}_removed", options.format),
+                   interchange.table_path(CLEANED_DIR, f"{name}_cleaned", options.format)]
+        outputs += [interchange.table_path(CLEANED_DIR, output, options.format) for output in extra_outputs]
+        stages.append(Stage(f"clean_{name}", ("scrape",),
+                            [interchange.table_path(RAW_DIR, name, options.raw_format)], outputs,
+                            clean_code, {"raw_format": options.raw_format, "format": options.format},
+                            functools.partial(run_clean, name), True))
+    cleaned = [interchange.table_path(CLEANED_DIR, name, options.format)
+               for name in dict.fromkeys(sql_database.CLEANED_TABLES.values())]
+    stages.append(Stage("load", tuple(f"clean_{name}" for name in clean.TABLES), cleaned, [options.db],
+                        [_source(sql_database), _source(interchange)], {"format": options.format, "db": options.db},
+                        run_load, False))
+    return stages
+
+
+# run the stages which are out of date, returning True when none failed
+def run(stages, options, state):
+    pool = ProcessPoolExecutor(options.jobs) if options.jobs > 1 else None
+    failed, ran = set(), set()
+    try:
+        for group in levels(stages):
+            todo = []
+            for stage in group:
+                if any(name in failed for name in stage.after):
+                    print(f"[skip] {stage.name}: an earlier stage failed")
+                    failed.add(stage.name)
+                    continue
+                if stage.name == "scrape" and not options.scrape:
+                    print("[skip] scrape: only run with --scrape")
+                    continue
+                if stage.name == "scrape":
+                    reason = "asked for"
+                elif options.force:
+                    reason = "forced"
+                elif options.dry_run and any(name in ran for name in stage.after):
+                    reason = "earlier stage would run"
+                else:
+                    reason = stale_reason(stage, state)
+                if reason is None:
+                    print(f"[skip] {stage.name}: unchanged")
+                    continue
+                print(f"[{'would run' if options.dry_run else 'run'}] {stage.name}: {reason}")
+                ran.add(stage.name)
+                todo.append(stage)
+            if options.dry_run:
+                continue
+
+            start = time.perf_counter()
+            futures = {stage.name: pool.submit(stage.run, options)
+                       for stage in todo if stage.parallel and pool is not None}
+            for stage in todo:
+                try:
+                    if stage.name in futures:
+                        result = futures[stage.name].result()
+                    else:
+                        result = stage.run(options, pool)
+                except Exception as e:
+                    print(f"[failed] {stage.name}: {type(e).__name__} {e}")
+                    failed.add(stage.name)
+                    continue
+                if stage.name != "scrape":
+                    state["stages"][stage.name] = {
+                        "fingerprint": fingerprint(stage, state["files"]),
+                        "outputs": {path: file_hash(path, state["files"]) for path in stage.outputs},
+                    }
+                    save_state(state, options.state)
+                shapes = "" if not result else " " + ", ".join(f"{name} {shape}" for name, shape in result.items())
+                print(f"[done] {stage.name} in {time.perf_counter() - start:.2f}s{shapes}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return not failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape, clean and load the data, skipping stages "
+                                                 "whose inputs have not changed.")
+    parser.add_argument("--scrape", action="store_true", help="scrape the website first")
+    parser.add_argument("--scrape-args", default="",
+                        help='options passed on to web_scraping.py, such as "--incremental --workers 8"')
+    parser.add_argument("--raw-format", choices=interchange.FORMATS, default="csv",
+                        help="format of the raw tables in raw_data")
+    parser.add_argument("--format", choices=interchange.FORMATS, default="csv",
+                        help="format of the cleaned tables passed from clean.py to sql_database.py")
+    parser.add_argument("--kernels", choices=list(clean.KERNELS), default=None,
+                        help="backend the tables are cleaned with, defaults to pyarrow when installed")
+    parser.add_argument("--chunk-rows", type=int, default=None,
+                        help="clean each raw file in chunks of about this many rows")
+    parser.add_argument("--db", default=sql_database.DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=sql_database.BATCH_SIZE,
+                        help="rows sent to SQLite per executemany call")
+    parser.add_argument("--jobs", type=int, default=min(4, os.cpu_count() or 1),
+                        help="processes cleaning tables and preparing rows at once, 1 to use none")
+    parser.add_argument("--force", action="store_true", help="run every stage, changed or not")
+    parser.add_argument("--dry-run", action="store_true", help="only print which stages would run")
+    parser.add_argument("--state", default=STATE_PATH, help="file the fingerprints are kept in")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    state = load_state(options.state)
+    start = time.perf_counter()
+    ok = run(build_stages(options), options, state)
+    print(f"Pipeline {'finished' if ok else 'failed'} in {time.perf_counter() - start:.2f}s")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
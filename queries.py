@@ -0,0 +1,160 @@
+"""The SQL statements query_db.py and myapp.py run against db/base_running.db
+
+Keeping them in one place lets them be checked together: running this file
+prints EXPLAIN QUERY PLAN for every query and flags any table that is read with
+a full scan, or through an automatic index, where a real index was expected.
+It exits with status 1 when anything is flagged.
+
+    py queries.py [--db db/base_running.db]
+"""
+import argparse
+import re
+import sqlite3
+import sys
+from collections import namedtuple
+
+DB_PATH = "db/base_running.db"
+
+# sql: the statement, params: example values to explain it with,
+# scans: tables the query is meant to read in full (every yoy_leader row, for instance,
+# or the smallest table of a join with nothing to filter on, which SQLite drives it from)
+Query = namedtuple("Query", ["name", "sql", "params", "scans"])
+
+TOP_SALARIES = Query("top_salaries", """
+    SELECT l.year, p.name, s.salary
+    FROM yoy_leader as l
+    LEFT JOIN players as p on l.player_id = p.player_id
+    LEFT JOIN player_salary as s on l.player_id = s.player_id and l.year = s.year
+    WHERE l.year BETWEEN ? AND ?
+    ORDER BY s.salary desc
+    LIMIT ?
+    """, (1990, 2000, 10), ())
+
+TOP_TEAM_SB_PERC = Query("top_team_sb_perc", """
+    SELECT l.year, p.name, s.stolen_base_perc, l.team
+    FROM yoy_leader as l
+    LEFT JOIN players as p on l.player_id = p.player_id
+    LEFT JOIN player_yearly_stats as s on l.player_id = s.player_id and l.year = s.year
+    WHERE l.team = ?
+    ORDER BY s.stolen_base_perc desc
+    LIMIT ?
+    """, ("Chicago", 10), ())
+
+# TOP_TEAM_SB_PERC over every team. It is a query of its own because a filter that can be
+# switched off (l.team = ? OR ? = 1) keeps SQLite from using the team index for either
+TOP_ALL_TEAMS_SB_PERC = Query("top_all_teams_sb_perc", """
+    SELECT l.year, p.name, s.stolen_base_perc, l.team
+    FROM yoy_leader as l
+    LEFT JOIN players as p on l.player_id = p.player_id
+    LEFT JOIN player_yearly_stats as s on l.player_id = s.player_id and l.year = s.year
+    ORDER BY s.stolen_base_perc desc
+    LIMIT ?
+    """, (10,), ("yoy_leader",))
+
+TOP_SB_PERC_DIFF = Query("top_sb_perc_diff", """
+    SELECT l.year, p.name, s.stolen_base_perc, c.total_sb_perc,
+                       ABS(s.stolen_base_perc - c.total_sb_perc) AS diff
+    FROM yoy_leader as l
+    LEFT JOIN players as p on l.player_id = p.player_id
+    LEFT JOIN player_yearly_stats as s on l.player_id = s.player_id
+              and l.year = s.year
+    LEFT JOIN player_career_stats as c on l.player_id = c.player_id
+    WHERE ABS(s.stolen_base_perc - c.total_sb_perc) <= ?
+           AND s.stolen_base_perc > 0
+           AND c.total_sb_perc > 0
+    ORDER BY ABS(s.stolen_base_perc - c.total_sb_perc) desc
+    LIMIT ?
+    """, (100, 10), ("yoy_leader", "player_career_stats"))
+
+LEADER_SALARY = Query("leader_salary", """
+    SELECT l.year
+    , l.league
+    , l.team
+    , l.bases_stolen
+    , s.salary
+    FROM yoy_leader as l
+    LEFT JOIN player_salary as s on l.player_id = s.player_id
+              and l.year = s.year
+    """, (), ("yoy_leader",))
+
+TEAM_BASE_STATS = Query("team_base_stats", """
+    SELECT year, league, team, bases_stolen, caught_stealing
+    FROM team_base_stats_summary
+    """, (), ("team_base_stats_summary",))
+
+SALARY_BINS = Query("salary_bins", """
+    SELECT year, league, team, salary, players
+    FROM salary_histogram
+    """, (), ("salary_histogram",))
+
+QUERIES = [TOP_SALARIES, TOP_TEAM_SB_PERC, TOP_ALL_TEAMS_SB_PERC, TOP_SB_PERC_DIFF, LEADER_SALARY, TEAM_BASE_STATS, SALARY_BINS]
+
+
+# the rows of EXPLAIN QUERY PLAN, as (indent, detail) pairs in tree order
+def query_plan(conn, query):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query.sql}", query.params).fetchall()
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append((depth[node_id], detail))
+    return plan
+
+
+# table names by the alias a query gives them (FROM yoy_leader as l)
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:as\s+)?(\w+))?", sql, re.I):
+        if alias.upper() in ("", "LEFT", "INNER", "JOIN", "ON", "WHERE", "UNION", "ORDER", "GROUP", "LIMIT"):
+            alias = table
+        aliases[alias] = table
+    return aliases
+
+
+# problems in a plan: tables read in full that the query does not list as expected
+# scans, and automatic indexes, which SQLite builds on every run when one is missing
+def plan_problems(plan, query):
+    aliases = table_aliases(query.sql)
+    flagged = []
+    for _, detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[0] not in ("SCAN", "SEARCH"):
+            continue
+        table = aliases.get(words[1], words[1])
+        if "AUTOMATIC" in words:
+            problem = f"no index on {table}"
+        elif words[0] == "SCAN" and "INDEX" not in words and table not in query.scans:
+            problem = f"full scan of {table}"
+        else:
+            continue
+        if problem not in flagged:
+            flagged.append(problem)
+    return flagged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show the query plan of every query the project runs.")
+    parser.add_argument("--db", default=DB_PATH)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    problems = 0
+    try:
+        for query in QUERIES:
+            plan = query_plan(conn, query)
+            flagged = plan_problems(plan, query)
+            print(f"{query.name}{'  <-- ' + '; '.join(flagged) if flagged else ''}")
+            for depth, detail in plan:
+                print(f"  {'  ' * depth}{detail}")
+            problems += bool(flagged)
+    finally:
+        conn.close()
+    print(f"\n{len(QUERIES)} queries, {problems} with unindexed access paths")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
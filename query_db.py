@@ -1,14 +1,102 @@
-"""This program allows users to query the database base_running from 3 predefined queries"""
+"""This program allows users to query the database base_running from 3 predefined queries
+
+Run without arguments it asks for the values of a query in a menu. Given queries
+on the command line, or a JSON-lines file of them, it runs them all over one
+connection and writes the rows as JSON lines or CSV:
+
+    py query_db.py top_salaries:year_start=1990,year_end=2000,top_n=5 top_sb_perc_diff:threshold=0.1
+    py query_db.py --jsonl nightly.jsonl --format csv > report.csv
+
+Each line of the JSON-lines file is an object naming the query and its values,
+such as {"query": "top_team_sb_perc", "team": "Miami", "top_n": 3}. Scripts can
+call top_salaries(), top_team_sb_perc() and top_sb_perc_diff() directly, which
+return typed rows, and arrow_table() turns rows into an Arrow table (needs pyarrow).
+"""
+import argparse
+import csv
+import inspect
+import itertools
+import json
 import sqlite3
+import sys
+from collections import namedtuple
+import connections
+import queries
+
+# read-only connections to the database, one per thread, reused by every query
+database = connections.ReadOnlyDatabase()
 
 # allows you to connect to database when needed
 def get_connected():
     try:
-        return sqlite3.connect("db/base_running.db")
+        return database.connection()
     except sqlite3.Error as e:
         print(f"Error connecting to DB: {e}")
         return None
 
+# values used for anything left blank
+YEAR_START = 1900
+YEAR_END = 3000
+THRESHOLD = 100
+TOP_N = 10
+
+# the columns each query returns and their types, as Arrow type names
+COLUMNS = {
+    queries.TOP_SALARIES.name: (("year", "int64"), ("name", "string"), ("salary", "float64")),
+    queries.TOP_TEAM_SB_PERC.name: (("year", "int64"), ("name", "string"), ("stolen_base_perc", "float64"),
+                                    ("team", "string")),
+    queries.TOP_SB_PERC_DIFF.name: (("year", "int64"), ("name", "string"), ("stolen_base_perc", "float64"),
+                                    ("total_sb_perc", "float64"), ("diff", "float64")),
+}
+PYTHON_TYPES = {"int64": int, "float64": float, "string": str}
+
+# the type of each parameter of the query functions, for values given as text
+PARAMETER_TYPES = {"year_start": int, "year_end": int, "team": str, "threshold": float, "top_n": int}
+
+# a named tuple type for the rows of each query
+ROWS = {name: namedtuple("".join(word.title() for word in name.split("_")) + "Row",
+                         [column for column, _ in columns])
+        for name, columns in COLUMNS.items()}
+
+# the rows of a query with each value converted to its column's type (None stays None),
+# typed as the rows of the query called name when given
+def typed_rows(conn, query, parameters, name=None):
+    name = name or query.name
+    row_type = ROWS[name]
+    converters = [PYTHON_TYPES[kind] for _, kind in COLUMNS[name]]
+    return [row_type(*(None if value is None else convert(value)
+                       for convert, value in zip(converters, row)))
+            for row in conn.execute(query.sql, parameters)]
+
+# players who were top base stealers between two years, by salary descending
+def top_salaries(conn, year_start=YEAR_START, year_end=YEAR_END, top_n=TOP_N):
+    return typed_rows(conn, queries.TOP_SALARIES, (year_start, year_end, top_n))
+
+# leading years by stolen base percentage, of one team or of every team when team is empty
+def top_team_sb_perc(conn, team=None, top_n=TOP_N):
+    if not team:
+        return typed_rows(conn, queries.TOP_ALL_TEAMS_SB_PERC, (top_n,), queries.TOP_TEAM_SB_PERC.name)
+    return typed_rows(conn, queries.TOP_TEAM_SB_PERC, (team, top_n))
+
+# leading years whose stolen base percentage is within threshold of the player's career one,
+# by the difference descending
+def top_sb_perc_diff(conn, threshold=THRESHOLD, top_n=TOP_N):
+    return typed_rows(conn, queries.TOP_SB_PERC_DIFF, (threshold, top_n))
+
+# the query functions by the name of their query
+QUERY_FUNCTIONS = {
+    queries.TOP_SALARIES.name: top_salaries,
+    queries.TOP_TEAM_SB_PERC.name: top_team_sb_perc,
+    queries.TOP_SB_PERC_DIFF.name: top_sb_perc_diff,
+}
+
+# rows of a query as an Arrow table with the query's column types (needs pyarrow)
+def arrow_table(query_name, rows):
+    import pyarrow as pa
+
+    schema = pa.schema([(column, pa.type_for_alias(kind)) for column, kind in COLUMNS[query_name]])
+    return pa.Table.from_pylist([row._asdict() for row in rows], schema=schema)
+
 # shows menu of options to pick from
 def show_menu():
     print("\nQuery options include:")
@@ -36,7 +124,7 @@ def option_1(conn):
             year_start = input("Enter year (start): ").strip()
             try:
                 if not year_start:
-                    year_start = 1900
+                    year_start = YEAR_START
                 year_start = int(year_start)
                 break  # Exit the loop if conversion is successful
             except ValueError:
@@ -46,7 +134,7 @@ def option_1(conn):
             year_end = input("Enter year (end): ").strip()
             try:
                 if not year_end:
-                    year_end = 3000
+                    year_end = YEAR_END
                 year_end = int(year_end)
                 break  # Exit the loop if conversion is successful
             except ValueError:
@@ -56,24 +144,14 @@ def option_1(conn):
             top_n = input("Enter top n: ").strip()
             try:
                 if not top_n:
-                    top_n = 10
+                    top_n = TOP_N
                 top_n = int(top_n)
                 break  # Exit the loop if conversion is successful
             except ValueError:
                 print("Invalid input. Please enter a valid number.")
 
         # send query and get results
-        cursor = conn.execute(
-            """SELECT l.year, p.name, s.salary
-            FROM yoy_leader as l
-            LEFT JOIN players as p on l.player_id = p.player_id
-            LEFT JOIN player_salary as s on l.player_id = s.player_id and l.year = s.year
-            WHERE l.year BETWEEN ? AND ?
-            ORDER BY s.salary desc
-            LIMIT ?
-            """, (year_start, year_end, top_n))
-
-        results = cursor.fetchall()
+        results = top_salaries(conn, year_start, year_end, top_n)
 
         # print results to user
         if results:
@@ -99,32 +177,21 @@ def option_2(conn):
 
         # validate input
         selected_team = input("Enter team: ").strip()
-        all_team = 1 if not selected_team else 0
 
         while True:
             top_n = input("Enter top n: ").strip()
             try:
                 if not top_n:
-                    top_n = 10
+                    top_n = TOP_N
                 top_n = int(top_n)
                 break  # Exit the loop if conversion is successful
             except ValueError:
                 print("Invalid input. Please enter a valid number.")
 
         # send query and get results
-        cursor = conn.execute(
-            """
-            SELECT l.year, p.name, s.stolen_base_perc, l.team
-            FROM yoy_leader as l
-            LEFT JOIN players as p on l.player_id = p.player_id
-            LEFT JOIN player_yearly_stats as s on l.player_id = s.player_id and l.year = s.year
-            WHERE l.team = ? OR ? = 1
-            ORDER BY s.stolen_base_perc desc
-            LIMIT ?
-            """, (selected_team, all_team, top_n))
+        results = top_team_sb_perc(conn, selected_team, top_n)
         
         # print results to user
-        results = cursor.fetchall()
         if results:
             print(f"\nTop {top_n} players by Stolen Base %: ")
             print("\nYear: Team, Player Name - Stolen Base Perc")
@@ -151,7 +218,7 @@ def option_3(conn):
             threshold = input("Enter max threshold: ").strip()
             try:
                 if not threshold:
-                    threshold = 100
+                    threshold = THRESHOLD
                 threshold = float(threshold)
                 break  # Exit the loop if conversion is successful
             except ValueError:
@@ -161,30 +228,16 @@ def option_3(conn):
             top_n = input("Enter top n: ").strip()
             try:
                 if not top_n:
-                    top_n = 10
+                    top_n = TOP_N
                 top_n = int(top_n)
                 break  # Exit the loop if conversion is successful
             except ValueError:
                 print("Invalid input. Please enter a valid number.")
 
         # send query and get results
-        cursor = conn.execute("""
-            SELECT l.year, p.name, s.stolen_base_perc, c.total_sb_perc,
-                               ABS(s.stolen_base_perc - c.total_sb_perc) AS diff
-            FROM yoy_leader as l 
-            LEFT JOIN players as p on l.player_id = p.player_id 
-            LEFT JOIN player_yearly_stats as s on l.player_id = s.player_id 
-                      and l.year = s.year 
-            LEFT JOIN player_career_stats as c on l.player_id = c.player_id 
-            WHERE ABS(s.stolen_base_perc - c.total_sb_perc) <= ? 
-                   AND s.stolen_base_perc > 0
-                   AND c.total_sb_perc > 0
-            ORDER BY ABS(s.stolen_base_perc - c.total_sb_perc) desc 
-            LIMIT ?
-            """, (threshold, top_n))
+        results = top_sb_perc_diff(conn, threshold, top_n)
         
         # print results to user
-        results = cursor.fetchall()
         if results:
             print(f"\nTop {top_n} players by salary: ")
             print("\nYear: Player Name - SB Per from Year - SB Per from Career - Difference")
@@ -196,16 +249,127 @@ def option_3(conn):
         print(f"Error: {e}")
 
 # Print welcome and manage flow of query request
-print("Welcome! With this menu, you will be able to query the base_running db.")
-query_num = "0"
-while query_num != "4":
-    show_menu()
-    query_num = input("Please enter query selection: ").strip()
-
-    match query_num:
-        case "1": option_1(get_connected())
-        case "2": option_2(get_connected())
-        case "3": option_3(get_connected())
-        case "4": print("Thank you for exploring! Have a good day!")
-        case _: print("That was an invalid entry, please try again.")
+def menu():
+    print("Welcome! With this menu, you will be able to query the base_running db.")
+    query_num = "0"
+    while query_num != "4":
+        show_menu()
+        query_num = input("Please enter query selection: ").strip()
+
+        match query_num:
+            case "1": option_1(get_connected())
+            case "2": option_2(get_connected())
+            case "3": option_3(get_connected())
+            case "4": print("Thank you for exploring! Have a good day!")
+            case _: print("That was an invalid entry, please try again.")
+
+# a request checked against its query function: (query name, values by parameter)
+def make_request(name, values):
+    if name not in QUERY_FUNCTIONS:
+        raise ValueError(f"unknown query {name!r}, expected one of {', '.join(QUERY_FUNCTIONS)}")
+    parameters = inspect.signature(QUERY_FUNCTIONS[name]).parameters
+    unknown = [key for key in values if key == "conn" or key not in parameters]
+    if unknown:
+        raise ValueError(f"{name} has no parameter {', '.join(unknown)}")
+    typed = {}
+    for key, value in values.items():
+        try:
+            typed[key] = None if value is None else PARAMETER_TYPES[key](value)
+        except ValueError:
+            raise ValueError(f"{name} {key} must be {PARAMETER_TYPES[key].__name__}, not {value!r}") from None
+    return name, typed
+
+# a request written on the command line as query:name=value,name=value
+def parse_request(text):
+    name, _, assignments = text.partition(":")
+    values = {}
+    for assignment in filter(None, assignments.split(",")):
+        key, equals, value = assignment.partition("=")
+        if not equals:
+            raise ValueError(f"expected name=value in {text!r}")
+        values[key.strip()] = value.strip()
+    return make_request(name.strip(), values)
+
+# the requests of a JSON-lines file, read as they are needed
+def read_requests(f):
+    for number, line in enumerate(f, start=1):
+        if line.strip():
+            try:
+                values = json.loads(line)
+                if not isinstance(values, dict):
+                    raise ValueError("expected a JSON object")
+                yield make_request(values.pop("query", None), values)
+            except ValueError as e:
+                raise ValueError(f"line {number}: {e}") from None
+
+# every column any query returns, in the order of COLUMNS, for a CSV all requests can share
+def csv_columns():
+    columns = []
+    for query_columns in COLUMNS.values():
+        columns += [column for column, _ in query_columns if column not in columns]
+    return ["request", "query"] + columns
+
+# run the requests over one connection, writing each row as it comes as JSON lines or CSV
+def run_requests(conn, requests, out, output_format="json"):
+    writer = None
+    if output_format == "csv":
+        writer = csv.DictWriter(out, csv_columns(), lineterminator="\n")
+        writer.writeheader()
+    count = 0
+    for index, (name, values) in enumerate(requests):
+        for row in QUERY_FUNCTIONS[name](conn, **values):
+            record = {"request": index, "query": name, **row._asdict()}
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                out.write(json.dumps(record) + "\n")
+            count += 1
+        out.flush()
+    return count
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query the base_running database, "
+                                                 "with a menu when no queries are given")
+    parser.add_argument("requests", nargs="*", metavar="QUERY[:NAME=VALUE,...]",
+                        help=f"queries to run: {', '.join(QUERY_FUNCTIONS)}")
+    parser.add_argument("--jsonl", metavar="FILE", help="JSON-lines file of queries to run (- for stdin)")
+    parser.add_argument("--format", choices=("json", "csv"), default="json", help="how rows are written")
+    parser.add_argument("--db", default=connections.DB_PATH)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global database
+    args = parse_args(argv)
+    database = connections.ReadOnlyDatabase(args.db)
+    try:
+        if not args.requests and not args.jsonl:
+            menu()
+            return
+        try:
+            requests = [parse_request(text) for text in args.requests]
+        except ValueError as e:
+            sys.exit(f"error: {e}")
+        try:
+            if args.jsonl:
+                try:
+                    f = sys.stdin if args.jsonl == "-" else open(args.jsonl, encoding="utf-8")
+                except OSError as e:
+                    sys.exit(f"error: {args.jsonl}: {e.strerror}")
+                try:
+                    run_requests(database.connection(), itertools.chain(requests, read_requests(f)),
+                                 sys.stdout, args.format)
+                except ValueError as e:
+                    sys.exit(f"error: {args.jsonl} {e}")
+                finally:
+                    if f is not sys.stdin:
+                        f.close()
+            else:
+                run_requests(database.connection(), requests, sys.stdout, args.format)
+        # a database which is missing, locked or not one, reported like the errors in the requests
+        except sqlite3.Error as e:
+            sys.exit(f"error: {args.db}: {e}")
+    finally:
+        database.close()
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Durable work queue for web_scraping.py, kept in an SQLite file.
+
+Every player page is a job which is pending, done or failed. A player's rows
+are stored in the same transaction that marks their job done, so a run which
+crashes loses nothing it already scraped, and a restarted run picks up the
+pending jobs where the last one stopped. Jobs which fail are retried with
+exponential backoff until they run out of attempts"""
+import os
+import sqlite3
+import time
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class ScrapeQueue:
+    """Jobs and scraped rows of one scrape run.
+
+    max_attempts: times a page is tried before its job is marked failed.
+    base_delay, max_delay: seconds waited before the first retry, doubling
+        after every further failure up to max_delay.
+    """
+
+    def __init__(self, path="cache/scrape_jobs.db", max_attempts=4,
+                 base_delay=30, max_delay=15 * 60, clock=time.time):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY NOT NULL,
+            value TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS jobs (
+            player_id TEXT PRIMARY KEY NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            position INTEGER PRIMARY KEY,
+            year TEXT, league TEXT, player_id TEXT,
+            player_name TEXT, team TEXT, bases_stolen TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS base_running_stats (
+            player_id TEXT NOT NULL,
+            team TEXT, stolen_bases TEXT, caught_stealing TEXT, stolen_base_perc TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS player_salary (
+            player_id TEXT NOT NULL,
+            team TEXT, uniform_numbers TEXT, salary TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_attempt_at);
+        CREATE INDEX IF NOT EXISTS base_running_stats_player ON base_running_stats (player_id);
+        CREATE INDEX IF NOT EXISTS player_salary_player ON player_salary (player_id);
+        """)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # a run is unfinished while it still has jobs waiting to be scraped
+    def unfinished(self):
+        return self.counts().get(PENDING, 0) > 0
+
+    # forget the previous run and everything it scraped
+    def reset(self, **meta):
+        with self.conn:
+            for table in ("meta", "jobs", "leaderboard", "base_running_stats", "player_salary"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                  [(key, str(value)) for key, value in meta.items()])
+
+    def meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def save_leaderboard(self, yearly_data):
+        with self.conn:
+            self.conn.execute("DELETE FROM leaderboard")
+            self.conn.executemany("""
+                INSERT INTO leaderboard (year, league, player_id, player_name, team, bases_stolen)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, yearly_data)
+
+    def load_leaderboard(self):
+        return self.conn.execute("""
+            SELECT year, league, player_id, player_name, team, bases_stolen
+            FROM leaderboard ORDER BY position
+            """).fetchall()
+
+    def enqueue(self, player_ids):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (player_id, status) VALUES (?, ?)",
+                [(player, PENDING) for player in player_ids])
+
+    # give jobs which ran out of attempts in an earlier run another go
+    def retry_failed(self):
+        with self.conn:
+            return self.conn.execute("""
+                UPDATE jobs SET status = ?, attempts = 0, next_attempt_at = 0
+                WHERE status = ?
+                """, (PENDING, FAILED)).rowcount
+
+    # player ids of pending jobs which are not waiting out a backoff
+    def due(self):
+        return [row[0] for row in self.conn.execute("""
+            SELECT player_id FROM jobs
+            WHERE status = ? AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, player_id
+            """, (PENDING, self._clock()))]
+
+    # seconds until the next pending job is due, or None when nothing is pending
+    def next_due_in(self):
+        next_at = self.conn.execute(
+            "SELECT MIN(next_attempt_at) FROM jobs WHERE status = ?", (PENDING,)).fetchone()[0]
+        return None if next_at is None else max(0.0, next_at - self._clock())
+
+    def complete(self, player_id, base_running_stats, player_salary):
+        with self.conn:
+            self.conn.execute("DELETE FROM base_running_stats WHERE player_id = ?", (player_id,))
+            self.conn.execute("DELETE FROM player_salary WHERE player_id = ?", (player_id,))
+            self.conn.executemany("INSERT INTO base_running_stats VALUES (?, ?, ?, ?, ?)",
+                                  base_running_stats)
+            self.conn.executemany("INSERT INTO player_salary VALUES (?, ?, ?, ?)",
+                                  player_salary)
+            self.conn.execute("UPDATE jobs SET status = ?, last_error = NULL WHERE player_id = ?",
+                              (DONE, player_id))
+
+    def backoff(self, attempts):
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    # record a failed attempt; returns True when the job will be retried
+    def fail(self, player_id, error):
+        with self.conn:
+            attempts = self.conn.execute("SELECT attempts FROM jobs WHERE player_id = ?",
+                                         (player_id,)).fetchone()[0] + 1
+            retry = attempts < self.max_attempts
+            self.conn.execute("""
+                UPDATE jobs SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+                WHERE player_id = ?
+                """, (PENDING if retry else FAILED, attempts,
+                      self._clock() + self.backoff(attempts), f"{type(error).__name__} {error}",
+                      player_id))
+        return retry
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def failures(self):
+        return self.conn.execute(
+            "SELECT player_id, attempts, last_error FROM jobs WHERE status = ?", (FAILED,)).fetchall()
+
+    # rows carried over from an earlier scrape (incremental mode). Rows of players
+    # with a job are replaced once that job is done, and kept if it fails
+    def import_rows(self, base_running_stats, player_salary):
+        with self.conn:
+            self.conn.executemany("INSERT INTO base_running_stats VALUES (?, ?, ?, ?, ?)",
+                                  base_running_stats)
+            self.conn.executemany("INSERT INTO player_salary VALUES (?, ?, ?, ?)",
+                                  player_salary)
+
+    def _rows(self, table, statuses, include_unqueued):
+        placeholders = ", ".join("?" for _ in statuses)
+        unqueued = "j.status IS NULL OR " if include_unqueued else ""
+        return self.conn.execute(f"""
+            SELECT r.* FROM {table} AS r
+            LEFT JOIN jobs AS j ON r.player_id = j.player_id
+            WHERE {unqueued}j.status IN ({placeholders})
+            ORDER BY r.rowid
+            """, statuses)
+
+    # rows which will not change any more in this run: players who were not
+    # queued and players whose page has been scraped. Returns a cursor
+    def settled_rows(self, table):
+        return self._rows(table, (DONE,), include_unqueued=True)
+
+    # rows kept for players whose page could not be scraped
+    def failed_rows(self, table):
+        return self._rows(table, (FAILED,), include_unqueued=False)
@@ -0,0 +1,279 @@
+"""Latency and size of the Dash server's responses, served at /metrics.
+
+install() hooks into the Flask server of the Dash app. Every request's time and
+the bytes of its response are recorded per callback for Dash callback requests
+(named by the outputs they update) and per route for everything else. /metrics
+gives them in the Prometheus text format, as summaries with the 50th, 90th and
+99th percentiles of the last 1024 requests of each, and also:
+
+    callback_phase_seconds          time of each phase of a callback timed with timed();
+                                    myapp.py times filtering the data and building the figures
+    filter_states_total             callback requests, and of those
+    filter_states_repeated_total    the requests for filters asked for before
+    figure_cache_hits/misses_total  lookups of the figure cache
+
+Each process keeps the measurements of its requests in memory and a thread
+writes them every FLUSH_SECONDS, in one transaction, to an SQLite file every
+process serving the app shares, so a request never waits for the file. Under
+gunicorn /metrics gives the totals of all the workers whichever one answers
+(the other workers' last FLUSH_SECONDS may not be in them yet), and counters
+only go up.
+gunicorn.conf.py gives the workers of a server a file of their own and removes
+it when the server stops; otherwise METRICS_DB names it, or each process uses
+a temporary file.
+
+METRICS_PATH changes the path of the endpoint; set it empty to turn it off.
+"""
+import atexit
+import contextlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+import figure_cache
+import instrumentation
+
+METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")
+
+# distinct filter states remembered to tell whether a request repeats one, the oldest are forgotten first
+MAX_STATES = 10_000
+# requests between dropping the values older than the last instrumentation.WINDOW of each summary
+TRIM_EVERY = 1000
+# seconds between the writes of the requests each process has recorded
+FLUSH_SECONDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value NUMERIC NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+CREATE TABLE IF NOT EXISTS summary_totals (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+CREATE TABLE IF NOT EXISTS summary_values (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_summary_values_series ON summary_values (name, labels, id);
+CREATE TABLE IF NOT EXISTS filter_states (
+    key TEXT PRIMARY KEY NOT NULL
+);
+CREATE TABLE IF NOT EXISTS started (
+    time REAL NOT NULL
+);
+"""
+
+
+def _labels_key(labels):
+    return json.dumps(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _labels_pairs(key):
+    return tuple(tuple(pair) for pair in json.loads(key))
+
+
+class MetricsStore:
+    """Counters and summaries kept in an SQLite file shared by every process serving the app"""
+
+    def __init__(self, path, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.requests = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flusher_pid = None
+        # what is still pending when the process exits
+        atexit.register(self.flush)
+
+    # this process's connection; one opened before gunicorn forks the workers is not used after it
+    def _connection(self):
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            # with a write-ahead log, NORMAL only syncs the file at checkpoints instead of every request
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            with conn:
+                conn.executescript(SCHEMA)
+                conn.execute("INSERT INTO started SELECT ? WHERE NOT EXISTS (SELECT 1 FROM started)",
+                             (time.time(),))
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    # keep the counters and summaries of a request, each given as (name, value, labels), until the next
+    # flush. state is the (key, labels) of a callback request's filters, counted in filter_states_total
+    # and, when they were asked for before, filter_states_repeated_total
+    def record(self, counts=(), summaries=(), state=None):
+        with self._pending_lock:
+            self._pending.append((list(counts), list(summaries), state))
+            # threads do not survive a fork, so each worker starts its own
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_every, daemon=True).start()
+
+    def _flush_every(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    # write the requests recorded by this process since the last flush; they are dropped when the
+    # file cannot be written, so serving the app never fails because of its metrics
+    def flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            try:
+                self.write(pending)
+            except sqlite3.Error as e:
+                print(f"Metrics of {len(pending)} requests could not be recorded: {e}")
+
+    # add the (counts, summaries, state) of each request, as given to record(), in one transaction
+    def write(self, requests):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for counts, summaries, state in requests:
+                    counts = list(counts)
+                    if state is not None:
+                        key, labels = state
+                        counts.append(("filter_states_total", 1, labels))
+                        if conn.execute("INSERT OR IGNORE INTO filter_states VALUES (?)", (key,)).rowcount == 0:
+                            counts.append(("filter_states_repeated_total", 1, labels))
+                    conn.executemany("INSERT INTO counters VALUES (?, ?, ?) ON CONFLICT (name, labels) "
+                                     "DO UPDATE SET value = value + excluded.value",
+                                     [(name, _labels_key(labels), value) for name, value, labels in counts])
+                    rows = [(name, _labels_key(labels), value) for name, value, labels in summaries]
+                    conn.executemany("INSERT INTO summary_values (name, labels, value) VALUES (?, ?, ?)", rows)
+                    conn.executemany("INSERT INTO summary_totals VALUES (?, ?, ?, 1) ON CONFLICT (name, labels) "
+                                     "DO UPDATE SET sum = sum + excluded.sum, count = count + 1", rows)
+                    self.requests += 1
+                    if self.requests % TRIM_EVERY == 0:
+                        self._trim(conn)
+
+    @staticmethod
+    def _trim(conn):
+        conn.execute("""
+            DELETE FROM summary_values WHERE id IN (
+                SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY name, labels ORDER BY id DESC) AS age
+                                FROM summary_values)
+                WHERE age > ?)
+            """, (instrumentation.WINDOW,))
+        conn.execute("DELETE FROM filter_states WHERE rowid <= (SELECT MAX(rowid) FROM filter_states) - ?",
+                     (MAX_STATES,))
+
+    # the totals of every process as a Recorder, which writes them in the Prometheus text format
+    def recorder(self):
+        recorder = instrumentation.Recorder()
+        with self._lock:
+            conn = self._connection()
+            for name, labels, value in conn.execute("SELECT name, labels, value FROM counters"):
+                recorder.counters[(name, _labels_pairs(labels))] = value
+            for name, labels, total, count in conn.execute(
+                    "SELECT name, labels, sum, count FROM summary_totals").fetchall():
+                window = instrumentation.Window()
+                window.values.extend(value for value, in conn.execute(
+                    "SELECT value FROM summary_values WHERE name = ? AND labels = ? ORDER BY id DESC LIMIT ?",
+                    (name, labels, instrumentation.WINDOW)))
+                window.sum, window.count = total, count
+                recorder.summaries[(name, _labels_pairs(labels))] = window
+            started, = conn.execute("SELECT time FROM started").fetchone()
+        recorder.set("metrics_start_time_seconds", started)
+        return recorder
+
+
+def _temporary_path():
+    path = os.path.join(tempfile.gettempdir(), f"mlb_metrics_{os.getpid()}.db")
+    atexit.register(remove_store, path, os.getpid())
+    return path
+
+
+# delete a metrics file, only from the process given when there is one (not from forked workers)
+def remove_store(path, pid=None):
+    if pid is not None and pid != os.getpid():
+        return
+    for suffix in ("", "-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path + suffix)
+
+
+store = MetricsStore(os.environ.get("METRICS_DB") or _temporary_path())
+
+
+# time a phase of a callback, such as filtering the data or building the figures; it is
+# recorded with the request, so nothing is recorded when the callback is called outside one
+@contextlib.contextmanager
+def timed(callback, phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            g.setdefault("metrics_phases", []).append(
+                ("callback_phase_seconds", time.perf_counter() - start, {"callback": callback, "phase": phase}))
+
+
+# record every request of a Dash app's server and serve the metrics at METRICS_PATH,
+# with the hits and misses of a FigureCache when one is given
+def install(app, figures=None):
+    if not METRICS_PATH:
+        return
+    server = app.server
+    callback_path = f"{app.config.routes_pathname_prefix}_dash-update-component"
+    # the figure cache's hits and misses already recorded, which are kept by each process
+    recorded = {"hits": 0, "misses": 0}
+    recorded_lock = threading.Lock()
+
+    def before_request():
+        g.metrics_start = time.perf_counter()
+
+    def after_request(response):
+        start = g.pop("metrics_start", None)
+        if start is None or request.path == METRICS_PATH:
+            return response
+        seconds = time.perf_counter() - start
+        state = None
+        if request.path == callback_path:
+            body = request.get_json(silent=True) or {}
+            labels = {"callback": str(body.get("output", "unknown")).strip(".")}
+            state = (figure_cache.canonical_key(labels["callback"], [
+                item.get("value") if isinstance(item, dict) else item for item in body.get("inputs", [])]), labels)
+        else:
+            labels = {"route": request.url_rule.rule if request.url_rule is not None else "unmatched"}
+        counts = [("responses_total", 1, {"status": response.status_code, **labels})]
+        summaries = [("request_seconds", seconds, labels), *g.pop("metrics_phases", [])]
+        size = response.calculate_content_length()
+        if size is not None:
+            summaries.append(("response_bytes", size, labels))
+        if figures is not None:
+            with recorded_lock:
+                for name in ("hits", "misses"):
+                    new = getattr(figures, name) - recorded[name]
+                    if new:
+                        counts.append((f"figure_cache_{name}_total", new, {}))
+                        recorded[name] += new
+        store.record(counts, summaries, state)
+        return response
+
+    def metrics():
+        # this worker's requests are written first; the others' are written by their own threads
+        store.flush()
+        return Response(store.recorder().prometheus(), mimetype="text/plain; version=0.0.4")
+
+    server.before_request(before_request)
+    server.after_request(after_request)
+    server.add_url_rule(METRICS_PATH, "metrics", metrics)
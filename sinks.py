@@ -0,0 +1,213 @@
+"""Streaming writers for scraped rows.
+
+A sink buffers rows as they are parsed and appends them to a CSV file, a
+Parquet file (one row group per batch), an Arrow IPC file (one record batch
+per batch, see interchange.py) or an SQLite table once the buffer
+reaches batch_size rows or flush_interval seconds have passed since the last
+write (checked as rows are written, so a caller which stops writing for a
+while should call flush() itself). Memory stays flat however long the run is.
+CSV and SQLite output can be read while the scrape is still going; a Parquet
+or Arrow file is only readable once close() has written its footer"""
+import abc
+import csv
+import os
+import sqlite3
+import time
+
+FORMATS = ("csv", "parquet", "arrow", "sqlite")
+SQLITE_FILE = "raw_data.db"
+
+
+class RowSink(abc.ABC):
+    """Base class of the sinks, subclasses implement _write_batch"""
+
+    def __init__(self, columns, batch_size=1000, flush_interval=5.0, clock=time.monotonic):
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._clock = clock
+        self._buffer = []
+        self._last_flush = clock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, row):
+        self._buffer.append(tuple(row))
+        if (len(self._buffer) >= self.batch_size
+                or self._clock() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if self._buffer:
+            self._write_batch(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+        self._last_flush = self._clock()
+
+    def close(self):
+        self.flush()
+
+    @abc.abstractmethod
+    def _write_batch(self, rows):
+        """Write one batch of rows to the output"""
+
+
+class CsvSink(RowSink):
+    """Append rows to a CSV file, formatted the same way pandas' to_csv writes them"""
+
+    def __init__(self, path, columns, append=False, **kwargs):
+        super().__init__(columns, **kwargs)
+        self.path = path
+        write_header = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        if write_header:
+            self._writer.writerow(self.columns)
+            self._file.flush()
+
+    def _write_batch(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class ParquetSink(RowSink):
+    """Write every batch of rows as a row group of a Parquet file (needs pyarrow)"""
+
+    def __init__(self, path, columns, schema=None, **kwargs):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        super().__init__(columns, **kwargs)
+        self.path = path
+        self._pa = pa
+        self.schema = schema or pa.schema([(column, pa.string()) for column in self.columns])
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def _write_batch(self, rows):
+        arrays = [self._pa.array(values, type=field.type)
+                  for values, field in zip(zip(*rows), self.schema)]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self._writer.close()
+
+
+class ArrowSink(RowSink):
+    """Write every batch of rows as a record batch of an Arrow IPC file (needs pyarrow)"""
+
+    def __init__(self, path, columns, schema=None, **kwargs):
+        import pyarrow as pa
+
+        super().__init__(columns, **kwargs)
+        self.path = path
+        self._pa = pa
+        self.schema = schema or pa.schema([(column, pa.string()) for column in self.columns])
+        self._writer = pa.ipc.new_file(path, self.schema)
+
+    def _write_batch(self, rows):
+        arrays = [self._pa.array(values, type=field.type)
+                  for values, field in zip(zip(*rows), self.schema)]
+        self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self._writer.close()
+
+
+class SqliteSink(RowSink):
+    """Insert rows into an SQLite table, one transaction per batch"""
+
+    def __init__(self, path, table, columns, append=False, **kwargs):
+        super().__init__(columns, **kwargs)
+        self.path = path
+        self.table = table
+        self._conn = sqlite3.connect(path, timeout=30)
+        quoted = ", ".join(f'"{column}" TEXT' for column in self.columns)
+        with self._conn:
+            if not append:
+                self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({quoted})')
+        placeholders = ", ".join("?" for _ in self.columns)
+        self._insert = f'INSERT INTO "{table}" VALUES ({placeholders})'
+
+    def _write_batch(self, rows):
+        with self._conn:
+            self._conn.executemany(self._insert, rows)
+
+    def close(self):
+        super().close()
+        self._conn.close()
+
+
+# where a table is written to for each format
+def sink_path(output_format, directory, name):
+    if output_format == "csv":
+        return os.path.join(directory, f"{name}.csv")
+    if output_format == "parquet":
+        return os.path.join(directory, f"{name}.parquet")
+    if output_format == "arrow":
+        return os.path.join(directory, f"{name}.arrow")
+    if output_format == "sqlite":
+        return os.path.join(directory, SQLITE_FILE)
+    raise ValueError(f"unknown output format {output_format!r}, expected one of {', '.join(FORMATS)}")
+
+
+# open a sink writing the table `name` into `directory` in the given format
+def open_sink(output_format, directory, name, columns, **kwargs):
+    path = sink_path(output_format, directory, name)
+    if output_format == "csv":
+        return CsvSink(path, columns, **kwargs)
+    if output_format == "parquet":
+        return ParquetSink(path, columns, **kwargs)
+    if output_format == "arrow":
+        return ArrowSink(path, columns, **kwargs)
+    return SqliteSink(path, name, columns, **kwargs)
+
+
+# read back the rows a sink wrote, as tuples of strings; nothing if it was never written
+def read_rows(output_format, directory, name):
+    path = sink_path(output_format, directory, name)
+    if not os.path.exists(path):
+        return
+    if output_format == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                yield tuple(row)
+    elif output_format == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+    elif output_format == "arrow":
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                batch = reader.get_batch(index)
+                yield from zip(*(column.to_pylist() for column in batch.columns))
+    else:
+        conn = sqlite3.connect(path)
+        try:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (name,)).fetchone()
+            if exists:
+                yield from conn.execute(f'SELECT * FROM "{name}"')
+        finally:
+            conn.close()
@@ -1,120 +1,465 @@
-"""Create database based on tables from cleaned data from clean.py"""
+"""Create database based on tables from cleaned data from clean.py
+
+Every table is bulk loaded: its columns are turned into plain Python values
+once and inserted with executemany in large batches, all inside a single
+transaction with PRAGMAs tuned for loading. Rows per second are reported for
+each table so slow loads are easy to spot.
+
+Rows are matched on their natural key (a player and season, for instance), so
+running it again only writes what changed: new rows are inserted, changed rows
+updated and rows no longer in the cleaned data deleted.
+
+The aggregates the dashboard draws are kept in summary tables, refreshed the
+same way after every load, so myapp.py reads small rollups instead of grouping
+every leader row each time a filter changes
+
+The cleaned tables are read from csv files, or with --input-format from the
+typed Arrow or Parquet files clean.py can write (see interchange.py).
+--trace and --metrics record the time and rows of each table (see instrumentation.py)"""
+import argparse
 import sqlite3
-import pandas as pd
+import time
+from itertools import islice
+import instrumentation
+import interchange
 
-try:
-    # Connect to SQLite database, db/base_running.db
-    yoy_leader_df = pd.read_csv("cleaned_data/bases_stolen_league_leaders_cleaned.csv")
-    career_stats_df = pd.read_csv("cleaned_data/base_running_stats_cleaned_career.csv")
-    year_stats_df = pd.read_csv("cleaned_data/base_running_stats_cleaned_yoy.csv")
-    salary_df = pd.read_csv("cleaned_data/player_salary_cleaned.csv")
-    player_df = yoy_leader_df[["Player ID", "Player Name"]].drop_duplicates()
+DB_PATH = "db/base_running.db"
+BATCH_SIZE = 50_000
 
-    with sqlite3.connect("db/base_running.db") as conn:
-        print("Database created successfully")
+# settings used while loading, the journal mode is put back afterwards. The load updates the
+# database the dashboard reads in place, so it keeps a write-ahead log and only skips the fsync
+# of each commit: a crash can lose the load but not corrupt the database
+LOAD_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64_000,  # in KiB, so about 64MB
+    "temp_store": "MEMORY",
+}
 
-        conn.execute("PRAGMA foreign_keys = 1")
-        cursor = conn.cursor()
+TABLE_DEFINITIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS players (
+        player_id TEXT PRIMARY KEY NOT NULL,
+        name TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS yoy_leader (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        year INTEGER NOT NULL,
+        league TEXT NOT NULL,
+        player_id TEXT NOT NULL,
+        team TEXT NOT NULL,
+        bases_stolen INTEGER NOT NULL,
+        FOREIGN KEY (player_id) REFERENCES players (player_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_career_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_id TEXT NOT NULL,
+        total_bases_stolen INTEGER NOT NULL,
+        total_caught_stealing INTEGER NOT NULL,
+        total_sb_perc FLOAT NOT NULL,
+        total_years INTEGER NOT NULL,
+        FOREIGN KEY (player_id) REFERENCES players (player_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_yearly_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_id TEXT NOT NULL,
+        bases_stolen INTEGER NOT NULL,
+        caught_stealing INTEGER NOT NULL,
+        stolen_base_perc FLOAT NOT NULL,
+        year INTEGER NOT NULL,
+        team TEXT NOT NULL,
+        FOREIGN KEY (player_id) REFERENCES players (player_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_salary (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_id TEXT NOT NULL,
+        uniform_nums TEXT,
+        salary FLOAT,
+        year INTEGER NOT NULL,
+        team TEXT NOT NULL,
+        FOREIGN KEY (player_id) REFERENCES players (player_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS team_base_stats_summary (
+        year INTEGER NOT NULL,
+        league TEXT NOT NULL,
+        team TEXT NOT NULL,
+        bases_stolen INTEGER NOT NULL,
+        caught_stealing INTEGER NOT NULL,
+        PRIMARY KEY (year, league, team)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS salary_histogram (
+        year INTEGER NOT NULL,
+        league TEXT NOT NULL,
+        team TEXT NOT NULL,
+        salary REAL NOT NULL,
+        players INTEGER NOT NULL,
+        PRIMARY KEY (year, league, team, salary)
+    )
+    """,
+]
 
-        # Define Database Structure
-        # Create tables
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS players (
-            player_id TEXT PRIMARY KEY NOT NULL,
-            name TEXT NOT NULL 
-        )
-        """)
+# the summary tables and the query each is refreshed from
+SUMMARIES = {
+    # bases stolen by the leaders of each season, league and team, and the times they were caught
+    # stealing that season (over every team they played for, as the dashboard has always counted it)
+    "team_base_stats_summary": """
+        SELECT l.year, l.league, l.team,
+               SUM(l.bases_stolen) AS bases_stolen,
+               COALESCE(SUM(t.caught_stealing), 0) AS caught_stealing
+        FROM yoy_leader AS l
+        LEFT JOIN (SELECT player_id, year, SUM(caught_stealing) AS caught_stealing
+                   FROM player_yearly_stats GROUP BY player_id, year) AS t
+               ON l.player_id = t.player_id AND l.year = t.year
+        GROUP BY l.year, l.league, l.team
+        """,
+    # how many leaders had each salary. A row per distinct salary keeps the table about as small as
+    # the leaders with a salary, and the dashboard can still merge them into bins of any width
+    "salary_histogram": """
+        SELECT l.year, l.league, l.team,
+               s.salary,
+               COUNT(*) AS players
+        FROM yoy_leader AS l
+        JOIN player_salary AS s ON l.player_id = s.player_id AND l.year = s.year
+        WHERE s.salary IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        """,
+}
+
+# the natural key of each table, enforced by a unique index so loads can upsert on it
+NATURAL_KEYS = {
+    "players": ("player_id",),
+    "yoy_leader": ("year", "league", "player_id"),
+    "player_career_stats": ("player_id",),
+    "player_yearly_stats": ("player_id", "year", "team"),
+    "player_salary": ("player_id", "year", "team"),
+    "team_base_stats_summary": ("year", "league", "team"),
+    "salary_histogram": ("year", "league", "team", "salary"),
+}
+
+# the indexes behind the joins on (player_id, year) and the year and team filters in queries.py,
+# besides the natural key indexes, which already cover (year) and (player_id, year) lookups
+INDEX_DEFINITIONS = [
+    "CREATE INDEX IF NOT EXISTS idx_yoy_leader_team_year ON yoy_leader (team, year)",
+    "CREATE INDEX IF NOT EXISTS idx_yoy_leader_player_year ON yoy_leader (player_id, year)",
+]
+
+# indexes of earlier versions which a natural key index has replaced
+SUPERSEDED_INDEXES = [
+    "idx_yoy_leader_year",
+    "idx_player_career_stats_player",
+    "idx_player_yearly_stats_player_year",
+    "idx_player_salary_player_year",
+]
+
+# each table, the cleaned frame it is loaded from, and which frame column goes into which table column
+TABLE_LOADS = [
+    ("players", "player", {"Player ID": "player_id", "Player Name": "name"}),
+    ("yoy_leader", "yoy_leader", {"Year": "year", "League": "league", "Player ID": "player_id",
+                                  "Team": "team", "Bases Stolen": "bases_stolen"}),
+    ("player_career_stats", "career_stats", {"Player ID": "player_id",
+                                             "Stolen Bases (SB)": "total_bases_stolen",
+                                             "Caught Stealing (CS)": "total_caught_stealing",
+                                             "Stolen Bases Percentage": "total_sb_perc",
+                                             "Total Years": "total_years"}),
+    ("player_yearly_stats", "year_stats", {"Player ID": "player_id",
+                                           "Stolen Bases (SB)": "bases_stolen",
+                                           "Caught Stealing (CS)": "caught_stealing",
+                                           "Stolen Bases Percentage": "stolen_base_perc",
+                                           "Year": "year", "Team": "team"}),
+    ("player_salary", "salary", {"Player ID": "player_id", "Uniform Numbers": "uniform_nums",
+                                 "Salary": "salary", "Year": "year", "Team": "team"}),
+]
+
+
+# the cleaned table each frame is read from
+CLEANED_TABLES = {
+    "yoy_leader": "bases_stolen_league_leaders_cleaned",
+    "career_stats": "base_running_stats_cleaned_career",
+    "year_stats": "base_running_stats_cleaned_yoy",
+    "salary": "player_salary_cleaned",
+    "player": "bases_stolen_league_leaders_cleaned",
+}
+
+
+def _frame(frame, df):
+    return df[["Player ID", "Player Name"]].drop_duplicates() if frame == "player" else df
+
+
+def read_cleaned(directory="cleaned_data", file_format="csv"):
+    tables = {}
+    for name in dict.fromkeys(CLEANED_TABLES.values()):
+        tables[name] = interchange.read_frame(interchange.table_path(directory, name, file_format), file_format)
+    return {frame: _frame(frame, tables[name]) for frame, name in CLEANED_TABLES.items()}
+
+
+# turn a frame's columns into rows of plain Python values (missing values become NULL)
+# converting whole columns at once avoids boxing every value the way iterrows does
+def typed_rows(df, columns):
+    values = []
+    for column in columns:
+        series = df[column]
+        if series.hasnans:
+            series = series.astype(object).where(series.notna(), None)
+        values.append(series.tolist())
+    return zip(*values)
+
+
+# the rows of every table in TABLE_LOADS, from the cleaned frames
+def table_rows(frames):
+    return {table: typed_rows(frames[frame], list(columns)) for table, frame, columns in TABLE_LOADS}
+
+
+# the rows of one table in TABLE_LOADS, read from its cleaned file on their own,
+# so the tables can be prepared in separate processes
+def load_rows(table, directory="cleaned_data", file_format="csv"):
+    frame, columns = next((frame, columns) for name, frame, columns in TABLE_LOADS if name == table)
+    path = interchange.table_path(directory, CLEANED_TABLES[frame], file_format)
+    return list(typed_rows(_frame(frame, interchange.read_frame(path, file_format)), list(columns)))
+
+
+def bulk_insert(cursor, table, table_columns, rows, batch_size=BATCH_SIZE):
+    placeholders = ", ".join("?" for _ in table_columns)
+    statement = f"INSERT INTO {table} ({', '.join(table_columns)}) VALUES ({placeholders})"
+    count = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return count
+        cursor.executemany(statement, batch)
+        count += len(batch)
+
+
+def staging_table(table):
+    return f"temp.stage_{table}"
+
+
+# bulk insert rows into an empty temporary copy of the table
+def stage(cursor, table, table_columns, rows, batch_size=BATCH_SIZE):
+    staged = staging_table(table)
+    cursor.execute(f"DROP TABLE IF EXISTS {staged}")
+    cursor.execute(f"CREATE TABLE {staged} AS SELECT {', '.join(table_columns)} FROM main.{table} WHERE 0")
+    return bulk_insert(cursor, staged, table_columns, rows, batch_size)
+
+
+# stage the rows of a query instead, returning their column names
+def stage_query(cursor, table, select):
+    staged = staging_table(table)
+    cursor.execute(f"DROP TABLE IF EXISTS {staged}")
+    cursor.execute(f"CREATE TABLE {staged} AS {select}")
+    return [row[1] for row in cursor.execute(f"PRAGMA temp.table_info(stage_{table})")]
 
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS yoy_leader (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            year INTEGER NOT NULL,
-            league TEXT NOT NULL,
-            player_id TEXT NOT NULL,
-            team TEXT NOT NULL,
-            bases_stolen INTEGER NOT NULL,
-            FOREIGN KEY (player_id) REFERENCES players (player_id)
-        )
-        """)
 
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS player_career_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            player_id TEXT NOT NULL,
-            total_bases_stolen INTEGER NOT NULL,
-            total_caught_stealing INTEGER NOT NULL,
-            total_sb_perc FLOAT NOT NULL,
-            total_years INTEGER NOT NULL,
-            FOREIGN KEY (player_id) REFERENCES players (player_id)
-        )
+# copy the staged rows into the table, inserting new keys and updating only rows whose values differ
+def upsert_staged(cursor, table, table_columns):
+    key = NATURAL_KEYS[table]
+    values = [column for column in table_columns if column not in key]
+    if values:
+        assignments = ", ".join(f"{column} = excluded.{column}" for column in values)
+        changed = " OR ".join(f"{column} IS NOT excluded.{column}" for column in values)
+        conflict = f"DO UPDATE SET {assignments} WHERE {changed}"
+    else:
+        conflict = "DO NOTHING"
+    columns = ", ".join(table_columns)
+    cursor.execute(f"""
+        INSERT INTO main.{table} ({columns})
+        SELECT {columns} FROM {staging_table(table)} WHERE true
+        ON CONFLICT ({', '.join(key)}) {conflict}
         """)
+    return cursor.rowcount
 
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS player_yearly_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            player_id TEXT NOT NULL,
-            bases_stolen INTEGER NOT NULL,
-            caught_stealing INTEGER NOT NULL,
-            stolen_base_perc FLOAT NOT NULL,
-            year INTEGER NOT NULL,
-            team TEXT NOT NULL,
-            FOREIGN KEY (player_id) REFERENCES players (player_id)
-        )
+
+# delete the rows whose key is no longer in the staged rows
+def delete_missing(cursor, table):
+    key = ", ".join(NATURAL_KEYS[table])
+    cursor.execute(f"""
+        DELETE FROM main.{table}
+        WHERE ({key}) NOT IN (SELECT {key} FROM {staging_table(table)})
         """)
+    return cursor.rowcount
 
-        cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS player_salary (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            player_id TEXT NOT NULL,
-            uniform_nums TEXT,
-            salary FLOAT,
-            year INTEGER NOT NULL,
-            team TEXT NOT NULL,
-            FOREIGN KEY (player_id) REFERENCES players (player_id)
-        )""")
 
-        print("Tables created successfully.")
+def apply_pragmas(conn, pragmas):
+    previous = {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in pragmas}
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return previous
+
+
+# leave write-ahead logging once the load is done, which also copies the log into the database
+# file so readers watching its modification time see the change. While another connection has
+# the database open the mode can't change, so only the log is copied back
+def restore_journal_mode(conn, journal_mode):
+    try:
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    except sqlite3.OperationalError:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def create_tables(cursor):
+    for definition in TABLE_DEFINITIONS:
+        cursor.execute(definition)
+
+
+# bring a database built by an earlier version up to date: drop the duplicate rows
+# re-running the old loader appended (keeping the newest copy of each) and add the
+# natural key indexes; returns the number of duplicates removed from each table
+def migrate(conn):
+    removed = {}
+    with conn:
+        # salary_histogram's salary column was named salary_bin; the summary is rebuilt by refresh_summaries
+        if "salary_bin" in {row[1] for row in conn.execute("PRAGMA table_info(salary_histogram)")}:
+            conn.execute("DROP TABLE salary_histogram")
+            create_tables(conn.cursor())
+        for table, _, _ in TABLE_LOADS:
+            if table == "players":
+                continue
+            key = NATURAL_KEYS[table]
+            cursor = conn.execute(f"""
+                DELETE FROM {table}
+                WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY {', '.join(key)})
+                """)
+            removed[table] = cursor.rowcount
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table} ON {table} ({', '.join(key)})")
+        for index in SUPERSEDED_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+    return removed
+
+
+# build the indexes once the rows are in and refresh the planner's statistics
+def create_indexes(conn):
+    with conn:
+        for definition in INDEX_DEFINITIONS:
+            conn.execute(definition)
+    conn.execute("ANALYZE")
+
+
+# load every table in one transaction from its rows (see table_rows), returning (table, rows, seconds,
+# inserted, updated, deleted) for each; tables are upserted parents first and their missing rows
+# deleted children first
+def load_tables(conn, rows, batch_size=BATCH_SIZE):
+    stats = {}
+    cursor = conn.cursor()
+    with conn:
+        for table, _, columns in TABLE_LOADS:
+            start = time.perf_counter()
+            table_columns = list(columns.values())
+            before = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            count = stage(cursor, table, table_columns, iter(rows[table]), batch_size)
+            written = upsert_staged(cursor, table, table_columns)
+            after = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            stats[table] = [count, time.perf_counter() - start, after - before, written - (after - before)]
+        for table, _, _ in reversed(TABLE_LOADS):
+            start = time.perf_counter()
+            stats[table].append(delete_missing(cursor, table))
+            cursor.execute(f"DROP TABLE {staging_table(table)}")
+            stats[table][1] += time.perf_counter() - start
+    return [(table, *stats[table]) for table, _, _ in TABLE_LOADS]
+
+
+# bring the summary tables up to date with the loaded rows, returning stats as load_tables does
+def refresh_summaries(conn):
+    stats = []
+    cursor = conn.cursor()
+    with conn:
+        for table, select in SUMMARIES.items():
+            start = time.perf_counter()
+            before = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            table_columns = stage_query(cursor, table, select)
+            count = cursor.execute(f"SELECT COUNT(*) FROM {staging_table(table)}").fetchone()[0]
+            written = upsert_staged(cursor, table, table_columns)
+            deleted = delete_missing(cursor, table)
+            cursor.execute(f"DROP TABLE {staging_table(table)}")
+            inserted = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - before + deleted
+            stats.append((table, count, time.perf_counter() - start, inserted, written - inserted, deleted))
+    return stats
+
+
+# record the stats of load_tables or refresh_summaries as spans of each table and counts of rows written
+def record(span, stats):
+    for table, count, seconds, inserted, updated, deleted in stats:
+        instrumentation.add_span(span, seconds, count, table=table)
+        for change, rows in (("inserted", inserted), ("updated", updated), ("deleted", deleted)):
+            instrumentation.count("rows_total", rows, stage=span, table=table, change=change)
 
-        # Add entries to tables
-        for _, row in player_df.iterrows():
-            cursor.execute(
-                """
-                INSERT INTO players (player_id, name)
-                VALUES (?, ?)
-                """, (row["Player ID"], row["Player Name"]))
-
-        for _, row in yoy_leader_df.iterrows():
-            cursor.execute(
-                """
-                INSERT INTO yoy_leader (year, league, player_id, team, bases_stolen)
-                VALUES (?, ?, ?, ?, ?)
-                """, (row["Year"], row["League"], row["Player ID"], row["Team"], row["Bases Stolen"]))
-
-        for _, row in career_stats_df.iterrows():
-            cursor.execute(
-                """
-                INSERT INTO player_career_stats (player_id, total_bases_stolen, total_caught_stealing, total_sb_perc, total_years)
-                VALUES (?, ?, ?, ?, ?)
-                """, (row["Player ID"], row["Stolen Bases (SB)"], row["Caught Stealing (CS)"], row["Stolen Bases Percentage"], row["Total Years"]))
-
-        for _, row in year_stats_df.iterrows():
-            cursor.execute(
-                """
-                INSERT INTO player_yearly_stats (player_id, bases_stolen, caught_stealing, stolen_base_perc, year, team)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """, (row["Player ID"], row["Stolen Bases (SB)"], row["Caught Stealing (CS)"], row["Stolen Bases Percentage"], row["Year"], row["Team"]))
-
-        for _, row in salary_df.iterrows():
-            cursor.execute(
-                """
-                INSERT INTO player_salary (player_id, uniform_nums, salary, year, team)
-                VALUES (?, ?, ?, ?, ?)
-                """, (row["Player ID"], row["Uniform Numbers"], row["Salary"], row["Year"], row["Team"]))
 
+def report(stats):
+    for table, count, seconds, inserted, updated, deleted in stats:
+        rate = count / seconds if seconds else float("inf")
+        print(f"{table:<24} {count:>9} rows {seconds:>8.3f}s {rate:>12,.0f} rows/s"
+              f"  {inserted} inserted, {updated} updated, {deleted} deleted")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create db/base_running.db from the cleaned data.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="rows sent to SQLite per executemany call")
+    parser.add_argument("--input-format", choices=interchange.FORMATS, default="csv",
+                        help="format of the cleaned tables clean.py wrote")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+# create or update the database at db_path from the rows of every table (see table_rows)
+def build_database(db_path, rows, batch_size=BATCH_SIZE):
+    # Connect to SQLite database, db/base_running.db
+    conn = sqlite3.connect(db_path)
+    try:
+        print("Database created successfully")
+        conn.execute("PRAGMA foreign_keys = 1")
+        previous = apply_pragmas(conn, LOAD_PRAGMAS)
+
+        # Define Database Structure
+        create_tables(conn.cursor())
         conn.commit()
+        duplicates = sum(migrate(conn).values())
+        if duplicates:
+            print(f"Removed {duplicates} duplicate rows left by earlier runs")
+        print("Tables created successfully.")
+
+        # Add entries to tables
+        stats = load_tables(conn, rows, batch_size)
         print("Tables populated successfully.")
+        report(stats)
+        record("load", stats)
+        summaries = refresh_summaries(conn)
+        report(summaries)
+        record("summaries", summaries)
+
+        with instrumentation.span("indexes") as span:
+            create_indexes(conn)
+        print(f"Indexes built and analyzed in {span.seconds:.3f}s")
+
+        restore_journal_mode(conn, previous["journal_mode"])
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    instrumentation.configure(args.trace, args.metrics)
+    try:
+        with instrumentation.span("load"):
+            with instrumentation.span("read"):
+                frames = read_cleaned(file_format=args.input_format)
+            build_database(args.db, table_rows(frames), args.batch_size)
+    except Exception as e:
+        print(f"Database could not be created: {e}")
+    finally:
+        instrumentation.close()
 
 
-except Exception as e:
-    print(f"Database could not be created: {e}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import csv
+
+import pandas as pd
+import pytest
+
+import clean
+from benchmarks import bench_clean
+
+LEADERS = [
+    ["Year", "League", "Player ID", "Player Name", "Team", "Bases Stolen"],
+    # the header of each league's column, repeated on the website
+    ["Year", "American League", "", "American League", "Team(s)", "Stolen Bases"],
+    ["Year", "National League", "", "National League", "Team(s)", "Stolen Bases"],
+    ["1876", "American League", "", "-", "-", "-"],
+    ["1886", "American League", "stoveha01", " Harry Stovey ", "Philadelphia", "68"],
+    ["1886", "National League", "wardjo01", "John Ward", "New York ", "56"],
+    ["1887", "Union League", "nicolhu01", "Hugh Nicol", "Cincinnati", "138"],
+]
+
+BASE_RUNNING = [
+    ["Player ID", "Team", "Stolen Bases (SB)", "Caught Stealing (CS)", "Stolen Bases Percentage"],
+    ["brocklo01", "Team", "SB", "CS", "SB%"],
+    ["brocklo01", "1961 Cubs", "0", "0", ".000"],
+    ["brocklo01", "1962 Cubs", "16", "-", "-"],
+    ["brocklo01", "19 Years", "1,234", "307", ".753"],
+    ["brocklo01", "1963 Chicago Cubs ", "", "12", ".667"],
+    ["ricke01", "Team", "SB", "CS", "SB%"],
+]
+
+SALARY = [
+    ["Player ID", "Team", "Uniform Numbers", "Salary"],
+    ["hoydu01", "Team | Roster", "Uniform Numbers", "Salary"],
+    ["hoydu01", "1887 Washington Senators", "n/a", "Undetermined"],
+    ["hoydu01", "1888 Washington Senators", "-", "Undetermined"],
+    ["hoydu01", "1889 Washington Senators", "-", clean.BLANK_SALARY],
+    ["stirnsn01", "1949 St. Louis Browns", "2", "$4,800.00"],
+    ["stirnsn01", "1950 St. Louis Browns", "2", clean.BLANK_SALARY],
+    ["stirnsn01", "1951 St. Louis Browns", " 2-12 ", "$12,500.50"],
+    ["stirnsn01", "1952", "2", "$13,000.00"],
+]
+
+TABLES = [
+    ("bases_stolen_league_leaders", LEADERS, clean.LEADERS_SCHEMA, bench_clean.legacy_leaders),
+    ("base_running_stats", BASE_RUNNING, clean.BASE_RUNNING_SCHEMA, bench_clean.legacy_base_running),
+    ("player_salary", SALARY, clean.SALARY_SCHEMA, bench_clean.legacy_salary),
+]
+
+
+def installed_kernels():
+    kernels = []
+    for name in clean.KERNELS:
+        try:
+            kernels.append(clean.get_kernels(name))
+        except ImportError:
+            continue
+    return kernels
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+# frames equal value for value, whatever their index, dtypes or kind of missing value
+def assert_same(left, right):
+    left, right = left.reset_index(drop=True), right.reset_index(drop=True)
+    pd.testing.assert_frame_equal(left.astype(object).where(left.notna(), None),
+                                  right.astype(object).where(right.notna(), None), check_dtype=False)
+
+
+# the original code's patterns have groups, which pandas warns are not used by contains
+@pytest.mark.filterwarnings("ignore:This pattern is interpreted as a regular expression")
+@pytest.mark.parametrize("kernels", installed_kernels(), ids=lambda kernels: kernels.name)
+@pytest.mark.parametrize("name, rows, schema, legacy", TABLES, ids=[table[0] for table in TABLES])
+def test_clean_table_matches_the_original_cleaning_code(tmp_path, kernels, name, rows, schema, legacy):
+    path = write_csv(tmp_path / f"{name}.csv", rows)
+    expected_cleaned, expected_removed = legacy(pd.read_csv(path))
+    cleaned, removed = clean.clean_table(clean.read_raw(path, kernels), schema, kernels)
+    assert list(cleaned.columns) == list(expected_cleaned.columns)
+    assert_same(cleaned, expected_cleaned)
+    assert_same(removed, expected_removed)
+    # the repeated headers and the rows with a missing or unknown value (n/a is read as missing) are removed
+    assert len(removed) == {"bases_stolen_league_leaders": 4, "base_running_stats": 3, "player_salary": 3}[name]
+
+
+# player pages of salaries, each a repeated header, a salary (every seventh "Undetermined") and blank
+# salaries which take it, so most chunks of the file start with salaries set in an earlier chunk
+def salary_pages(pages=300):
+    rows = [SALARY[0]]
+    for page in range(pages):
+        player = f"player{page:03}"
+        salary = "Undetermined" if page % 7 == 0 else f"${page + 1},000.00"
+        rows.append([player, "Team | Roster", "Uniform Numbers", "Salary"])
+        rows.append([player, f"{1900 + page % 100} Chicago Cubs", "24", salary])
+        rows.extend([player, f"{1901 + page % 100 + year} Chicago Cubs", "24", clean.BLANK_SALARY]
+                    for year in range(5))
+    return rows
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("kernels", installed_kernels(), ids=lambda kernels: kernels.name)
+def test_chunked_clean_writes_the_same_files_as_a_whole_file_clean(tmp_path, kernels):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    path = write_csv(raw_dir / "player_salary.csv", salary_pages())
+
+    # the salary of a chunk's first valid row comes from the chunk before it
+    first_salaries = []
+    for chunk in clean.read_raw_chunks(path, kernels, chunk_rows=50):
+        salaries = kernels.table_to_frame(chunk)["Salary"]
+        first_salaries.append(salaries[salaries != "Salary"].iloc[0])
+    assert len(first_salaries) > 5
+    assert clean.BLANK_SALARY in first_salaries[1:]
+
+    outputs = {}
+    for chunk_rows in (None, 50):
+        out = tmp_path / str(chunk_rows)
+        (out / "cleaned").mkdir(parents=True)
+        (out / "removed").mkdir()
+        writers = clean.clean_file("player_salary", kernels, chunk_rows, str(raw_dir),
+                                   str(out / "cleaned"), str(out / "removed"))
+        outputs[chunk_rows] = {output: read(writer.path) for output, writer in writers.items()}
+    assert outputs[50] == outputs[None]
+    cleaned = pd.read_csv(tmp_path / "None" / "cleaned" / "player_salary_cleaned.csv")
+    assert cleaned["Salary"].notna().sum() == 6 * (300 - 43)
+
+
+@pytest.mark.parametrize("kernels", installed_kernels(), ids=lambda kernels: kernels.name)
+def test_salary_state_carries_into_the_next_chunk(tmp_path, kernels):
+    raw = clean.read_raw(write_csv(tmp_path / "player_salary.csv", SALARY), kernels)
+    whole, _ = clean.clean_table(raw, clean.SALARY_SCHEMA, kernels)
+    assert list(whole["Salary"].astype(object).where(whole["Salary"].notna(), None)) == [
+        None, None, 4800.0, 4800.0, 12500.5]
+    # split before every row, including the blanks after "Undetermined" and after $4,800.00
+    for split in range(1, len(raw)):
+        state = {}
+        chunks = [clean.clean_table(raw[:split], clean.SALARY_SCHEMA, kernels, state)[0],
+                  clean.clean_table(raw[split:], clean.SALARY_SCHEMA, kernels, state)[0]]
+        assert_same(pd.concat(chunks), whole)
@@ -0,0 +1,58 @@
+import pytest
+
+from fetcher import Fetcher, FetchConfig, FetchError, TokenBucket
+
+PAGE = "<html><body><table><tr><td>1</td></tr></table></body></html>"
+
+
+class FakeDriver:
+    """Stands in for the Selenium driver, returning html for any url"""
+
+    def __init__(self, html):
+        self.page_source = html
+        self.urls = []
+        self.quit_called = False
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def quit(self):
+        self.quit_called = True
+
+
+def fast_config(page_server, **kwargs):
+    return FetchConfig(requests_per_second=1000, burst=100, timeout=5,
+                       base_url=page_server.url, **kwargs)
+
+
+def test_token_bucket_waits_for_each_token_after_the_burst(clock):
+    bucket = TokenBucket(rate=2, burst=2, clock=clock, sleep=clock.sleep)
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, 0.5, 0.5]
+    assert clock.now == 1001.0
+
+
+def test_fetch_many_gets_every_page(page_server):
+    for index in range(10):
+        page_server.pages[f"/p{index}"] = (200, PAGE.replace("1", str(index)), None)
+    urls = [f"{page_server.url}/p{index}" for index in range(10)]
+    with Fetcher(fast_config(page_server, selenium_fallback=False)) as fetcher:
+        results = {url: (html, error) for url, html, error in fetcher.fetch_many(urls)}
+    assert set(results) == set(urls)
+    assert all(error is None for _, error in results.values())
+    assert results[urls[3]][0] == PAGE.replace("1", "3")
+
+
+def test_http_error_without_fallback_raises(page_server):
+    page_server.pages["/broken"] = (500, "error", None)
+    with Fetcher(fast_config(page_server, selenium_fallback=False)) as fetcher:
+        with pytest.raises(FetchError, match="HTTPError"):
+            fetcher.fetch(f"{page_server.url}/broken")
+
+
+def test_page_without_tables_falls_back_to_selenium(page_server):
+    page_server.pages["/script"] = (200, "<html><body>loading...</body></html>", None)
+    driver = FakeDriver(PAGE)
+    with Fetcher(fast_config(page_server), driver_factory=lambda user_agent: driver) as fetcher:
+        assert fetcher.fetch(f"{page_server.url}/script") == PAGE
+    assert driver.urls == [f"{page_server.url}/script"]
+    assert driver.quit_called
@@ -0,0 +1,53 @@
+from fetcher import Fetcher, FetchConfig
+from page_cache import PageCache
+
+PAGE = "<html><body><table><tr><td>1</td></tr></table></body></html>"
+CHANGED = "<html><body><table><tr><td>2</td></tr></table></body></html>"
+
+
+def fast_config(page_server):
+    return FetchConfig(requests_per_second=1000, burst=100, timeout=5, base_url=page_server.url,
+                       selenium_fallback=False)
+
+
+def test_fresh_cached_page_is_not_requested_again(page_server, tmp_path):
+    page_server.pages["/page"] = (200, PAGE, '"v1"')
+    url = f"{page_server.url}/page"
+    with PageCache(str(tmp_path), ttl=3600) as cache, \
+            Fetcher(fast_config(page_server), cache=cache) as fetcher:
+        assert fetcher.fetch(url) == PAGE
+        assert fetcher.fetch(url) == PAGE
+    assert len(page_server.requests) == 1
+
+
+def test_stale_page_is_revalidated_with_its_etag(page_server, tmp_path, clock):
+    page_server.pages["/page"] = (200, PAGE, '"v1"')
+    url = f"{page_server.url}/page"
+    with PageCache(str(tmp_path), ttl=60, clock=clock) as cache, \
+            Fetcher(fast_config(page_server), cache=cache) as fetcher:
+        fetcher.fetch(url)
+        clock.now += 120
+        assert fetcher.fetch(url) == PAGE
+        _, headers = page_server.requests[-1]
+        assert headers["If-None-Match"] == '"v1"'
+        # the 304 made the page fresh again
+        assert cache.is_fresh(cache.get(url))
+
+        page_server.pages["/page"] = (200, CHANGED, '"v2"')
+        clock.now += 120
+        assert fetcher.fetch(url) == CHANGED
+        assert cache.get(url).etag == '"v2"'
+    assert len(page_server.requests) == 3
+
+
+def test_cache_evicts_least_recently_used_pages_over_max_bytes(tmp_path, clock):
+    with PageCache(str(tmp_path), max_bytes=None, clock=clock) as cache:
+        for index in range(3):
+            clock.now += 1
+            cache.put(f"u{index}", f"page {index} " * 100, etag=f"e{index}")
+        clock.now += 1
+        cache.get("u0")
+        cache.max_bytes = cache.total_bytes() - 1
+        assert cache.evict() == 1
+        assert cache.get("u1") is None
+        assert cache.get("u0") is not None and cache.get("u2") is not None
@@ -0,0 +1,78 @@
+import pytest
+
+import page_parser
+
+LEADERBOARD = """<!DOCTYPE html>
+<html><head><title>Stolen Bases Leaders</title></head><body>
+<div class="menu"><a href="/">Home</a></div>
+<table>
+<tr><td colspan="8">Year by Year Leaders for Stolen Bases</td></tr>
+<tr><td>Year</td><td>American League</td><td>Stolen Bases</td><td>Team(s)</td>
+    <td>Year</td><td>National League</td><td>Stolen Bases</td><td>Team(s)</td></tr>
+<tr><td><a href="../yearly/yr1886a.shtml">1886</a></td>
+    <td><a href="../players/player.php?p=stoveha01">Harry  Stovey</a></td><td>68</td><td>Philadelphia</td>
+    <td><a href="../yearly/yr1886n.shtml">1886</a></td>
+    <td><a href="../players/player.php?p=wardjo01">John Montgomery<br>Ward</a></td><td>56</td><td>New York</td></tr>
+<tr><td>1887</td><td>Hugh Nicol &amp; Co</td><td>138</td><td>Cincinnati</td>
+    <td>1887</td><td><a href="../players/player.php?p=wardjo01"><b>John Ward</b></a></td>
+    <td> 111 </td><td>New&nbsp;York</td></tr>
+<tr><td colspan="8">Stolen Bases leaders by year</td></tr>
+</table>
+</body></html>"""
+
+PLAYER = """<!DOCTYPE html>
+<html><head><title>Player</title></head><body>
+<table><tr><td>Batting</td></tr><tr><td>filler</td></tr></table>
+<table>
+<tr><td>Team</td><td>SB</td><td>CS</td><td>SB%</td>""" + "<td>x</td>" * 9 + """</tr>
+<tr><td>Boston</td><td>20</td><td>5</td><td>.800</td>""" + "<td>1</td>" * 9 + """</tr>
+<tr><td>3 Years</td><td>40</td><td>-</td><td>-</td>""" + "<td>&nbsp;</td>" * 9 + """</tr>
+<tr><td colspan="13">Totals</td></tr>
+</table>
+<table>
+<tr><td>Year</td><td>Uniform</td><td>Salary</td><td>a</td><td>b</td></tr>
+<tr><td>1950 <a href="team.php">Boston</a></td><td>n/a</td><td>$12,500.00</td><td></td><td></td></tr>
+<tr><td>1951 Boston</td><td>7</td><td>&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</td><td></td><td></td></tr>
+</table>
+</body></html>"""
+
+
+def installed_backends():
+    backends = []
+    for name in page_parser.BACKENDS:
+        try:
+            backends.append(page_parser.get_backend(name))
+        except ImportError:
+            continue
+    return backends
+
+
+def test_html_parser_reads_the_leaderboard():
+    rows = page_parser.parse_leaderboard(LEADERBOARD, "html.parser")
+    # the repeated header row is kept, clean.py removes it
+    assert rows[0] == ("Year", "American League", "", "American League", "Team(s)", "Stolen Bases")
+    assert rows[2:4] == [
+        ("1886", "American League", "stoveha01", "Harry Stovey", "Philadelphia", "68"),
+        ("1886", "National League", "wardjo01", "John Montgomery\nWard", "New York", "56"),
+    ]
+    assert rows[4][1:3] == ("American League", "")
+    assert len(rows) == 6
+
+
+@pytest.mark.parametrize("backend", installed_backends(), ids=lambda backend: backend.name)
+def test_every_backend_reads_pages_the_same(backend):
+    assert (page_parser.parse_leaderboard(LEADERBOARD, backend)
+            == page_parser.parse_leaderboard(LEADERBOARD, "html.parser"))
+    assert (page_parser.parse_player_page(PLAYER, "ted01", backend)
+            == page_parser.parse_player_page(PLAYER, "ted01", "html.parser"))
+
+
+def test_player_page_rows():
+    stats, salaries = page_parser.parse_player_page(PLAYER, "ted01", "html.parser")
+    assert stats == [("ted01", "Boston", "20", "5", ".800"), ("ted01", "3 Years", "40", "-", "-")]
+    assert salaries == [("ted01", "1950 Boston", "n/a", "$12,500.00"), ("ted01", "1951 Boston", "7", "")]
+
+
+def test_page_without_tables_is_an_error():
+    with pytest.raises(ValueError):
+        page_parser.parse_leaderboard("<html><body>nothing</body></html>", "html.parser")
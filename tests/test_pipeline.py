@@ -0,0 +1,97 @@
+import argparse
+
+import pytest
+
+import pipeline
+
+
+# two stages, upper copying a.txt to b.txt in upper case and count writing b.txt's length to c.txt;
+# the fixture gives a.txt's path, the names of the stages in the order they ran, and run()
+@pytest.fixture
+def project(tmp_path):
+    a, b, c = (str(tmp_path / name) for name in ("a.txt", "b.txt", "c.txt"))
+    ran = []
+    state = {"stages": {}, "files": {}}
+
+    def upper(options, pool=None):
+        ran.append("upper")
+        with open(a) as source, open(b, "w") as target:
+            target.write(source.read().upper())
+
+    def count(options, pool=None):
+        ran.append("count")
+        if options.fail_count:
+            raise RuntimeError("broken")
+        with open(b) as source, open(options.count_to, "w") as target:
+            target.write(str(len(source.read())))
+
+    # count_to names another file for count to write, without changing count's fingerprint
+    def run(**kwargs):
+        values = {"jobs": 1, "scrape": False, "force": False, "dry_run": False, "fail_count": False,
+                  "count_to": c, "state": str(tmp_path / "state.json")}
+        values.update(kwargs)
+        stages = [pipeline.Stage("upper", (), [a], [b], [], {}, upper, False),
+                  pipeline.Stage("count", ("upper",), [b], [values["count_to"]], [], {}, count, False)]
+        return pipeline.run(stages, argparse.Namespace(**values), state)
+
+    with open(a, "w") as f:
+        f.write("abc")
+    return argparse.Namespace(a=a, ran=ran, state=state, run=run)
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_unchanged_stages_are_skipped(project):
+    assert project.run()
+    assert project.ran == ["upper", "count"]
+    assert project.run()
+    assert project.ran == ["upper", "count"]
+
+
+def test_changed_input_reruns_its_stage_and_only_then_what_it_changed(project):
+    project.run()
+    # upper writes the same b.txt as before, so count has nothing new to read
+    write(project.a, "ABC")
+    project.run()
+    assert project.ran[2:] == ["upper"]
+    write(project.a, "xyzw")
+    project.run()
+    assert project.ran[3:] == ["upper", "count"]
+
+
+def test_failed_stage_is_run_again_and_stops_later_stages(project):
+    assert not project.run(fail_count=True)
+    assert "count" not in project.state["stages"]
+    assert project.run()
+    assert project.ran == ["upper", "count", "count"]
+
+
+def test_force_runs_every_stage(project):
+    project.run()
+    project.run(force=True)
+    assert project.ran == ["upper", "count"] * 2
+
+
+def test_dry_run_runs_nothing(project):
+    project.run(dry_run=True)
+    assert project.ran == []
+
+
+def test_stage_with_an_output_its_last_run_did_not_write_runs_again(project, tmp_path):
+    project.run()
+    elsewhere = str(tmp_path / "elsewhere.txt")
+    project.run(count_to=elsewhere)
+    assert project.ran == ["upper", "count", "count"]
+    with open(elsewhere) as f:
+        assert f.read() == "3"
+
+
+def test_load_runs_again_for_another_database(tmp_path):
+    def load(db):
+        stages = pipeline.build_stages(pipeline.parse_args(["--db", str(tmp_path / db)]))
+        return next(stage for stage in stages if stage.name == "load")
+
+    assert pipeline.fingerprint(load("a.db"), {}) != pipeline.fingerprint(load("b.db"), {})
@@ -0,0 +1,42 @@
+from scrape_queue import DONE, FAILED, PENDING, ScrapeQueue
+
+
+def test_failed_jobs_back_off_exponentially_then_give_up(tmp_path, clock):
+    with ScrapeQueue(str(tmp_path / "jobs.db"), max_attempts=3, base_delay=10, max_delay=15,
+                     clock=clock) as queue:
+        queue.enqueue(["a", "b"])
+        assert queue.due() == ["a", "b"]
+
+        assert queue.fail("a", OSError("timed out"))
+        assert queue.due() == ["b"]
+        assert queue.next_due_in() == 0
+        queue.complete("b", [("b", "Boston", "1", "0", "1.000")], [])
+        assert queue.next_due_in() == 10
+
+        clock.now += 10
+        assert queue.due() == ["a"]
+        assert queue.fail("a", OSError("timed out"))
+        # doubled, but capped at max_delay
+        assert queue.next_due_in() == 15
+
+        clock.now += 15
+        assert not queue.fail("a", OSError("timed out"))
+        assert queue.counts() == {DONE: 1, FAILED: 1}
+        assert queue.failures() == [("a", 3, "OSError timed out")]
+        assert not queue.unfinished()
+
+
+def test_done_rows_replace_imported_ones_and_failed_players_keep_theirs(tmp_path):
+    with ScrapeQueue(str(tmp_path / "jobs.db"), max_attempts=1) as queue:
+        queue.import_rows([("a", "Boston", "1", "1", ".500"), ("b", "Chicago", "2", "0", "1.000"),
+                           ("c", "Detroit", "3", "1", ".750")], [])
+        queue.enqueue(["a", "b"])
+        queue.complete("a", [("a", "Boston", "9", "1", ".900")], [])
+        queue.fail("b", ValueError("no tables"))
+        assert queue.counts() == {DONE: 1, FAILED: 1}
+        assert list(queue.settled_rows("base_running_stats")) == [
+            ("c", "Detroit", "3", "1", ".750"), ("a", "Boston", "9", "1", ".900")]
+        assert list(queue.failed_rows("base_running_stats")) == [("b", "Chicago", "2", "0", "1.000")]
+
+        assert queue.retry_failed() == 1
+        assert queue.counts() == {DONE: 1, PENDING: 1}
@@ -0,0 +1,37 @@
+import server_metrics
+
+
+def totals(store):
+    recorder = store.recorder()
+    counters = {name: value for (name, labels), value in recorder.counters.items()}
+    counts = {name: window.count for (name, labels), window in recorder.summaries.items()}
+    return counters, counts
+
+
+def request(store, seconds, key="1990-2000"):
+    labels = {"callback": "graphs"}
+    store.record([("responses_total", 1, {"status": 200, **labels})],
+                 [("request_seconds", seconds, labels)], (key, labels))
+
+
+def test_requests_are_written_when_flushed(tmp_path):
+    store = server_metrics.MetricsStore(str(tmp_path / "metrics.db"), flush_seconds=3600)
+    request(store, 0.1)
+    assert totals(store) == ({}, {})
+    store.flush()
+    assert totals(store) == ({"responses_total": 1, "filter_states_total": 1}, {"request_seconds": 1})
+
+
+def test_every_process_adds_to_the_same_totals(tmp_path):
+    path = str(tmp_path / "metrics.db")
+    workers = [server_metrics.MetricsStore(path, flush_seconds=3600) for _ in range(2)]
+    request(workers[0], 0.1)
+    request(workers[1], 0.3)
+    request(workers[1], 0.2, key="2000-2010")
+    for worker in workers:
+        worker.flush()
+    counters, counts = totals(workers[0])
+    assert counters == {"responses_total": 3, "filter_states_total": 3, "filter_states_repeated_total": 1}
+    assert counts == {"request_seconds": 3}
+    assert sorted(workers[1].recorder().summaries[("request_seconds", (("callback", "graphs"),))].values) == [
+        0.1, 0.2, 0.3]
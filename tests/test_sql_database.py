@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+import sql_database
+
+
+def tables(players=None, leaders=None, salaries=None):
+    players = players or [("aaa01", "Ann A"), ("bbb01", "Bob B")]
+    return {
+        "players": players,
+        "yoy_leader": leaders or [(1950, "American League", "aaa01", "Boston", 30),
+                                  (1950, "National League", "bbb01", "Chicago", 25)],
+        "player_career_stats": [(player, 100, 20, 0.833, 10) for player, _ in players],
+        "player_yearly_stats": [(player, 30, 5, 0.857, 1950, "Boston") for player, _ in players],
+        "player_salary": salaries or [("aaa01", "7", 12500.0, 1950, "Boston"),
+                                      ("bbb01", "3", 9000.0, 1950, "Chicago")],
+    }
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("PRAGMA foreign_keys = 1")
+    sql_database.create_tables(conn.cursor())
+    sql_database.migrate(conn)
+    yield conn
+    conn.close()
+
+
+# (inserted, updated, deleted) of each table
+def changes(stats):
+    return {table: tuple(counts) for table, _, _, *counts in stats}
+
+
+def test_first_load_inserts_every_row(conn):
+    stats = changes(sql_database.load_tables(conn, tables()))
+    assert stats["players"] == (2, 0, 0)
+    assert stats["yoy_leader"] == (2, 0, 0)
+    assert stats["player_salary"] == (2, 0, 0)
+
+
+def test_reload_of_the_same_rows_changes_nothing(conn):
+    sql_database.load_tables(conn, tables())
+    ids = conn.execute("SELECT id FROM yoy_leader ORDER BY id").fetchall()
+    stats = changes(sql_database.load_tables(conn, tables()))
+    assert set(stats.values()) == {(0, 0, 0)}
+    assert conn.execute("SELECT id FROM yoy_leader ORDER BY id").fetchall() == ids
+
+
+def test_reload_inserts_updates_and_deletes_by_natural_key(conn):
+    sql_database.load_tables(conn, tables())
+    leaders = [(1950, "American League", "aaa01", "Boston", 31),   # changed
+               (1951, "American League", "aaa01", "Boston", 40)]   # new; the 1950 NL leader is gone
+    stats = changes(sql_database.load_tables(conn, tables(leaders=leaders)))
+    assert stats["yoy_leader"] == (1, 1, 1)
+    assert conn.execute("SELECT year, league, bases_stolen FROM yoy_leader ORDER BY year").fetchall() == [
+        (1950, "American League", 31), (1951, "American League", 40)]
+
+
+def test_summaries_follow_the_loaded_rows(conn):
+    sql_database.load_tables(conn, tables())
+    stats = {table: counts for table, _, _, *counts in sql_database.refresh_summaries(conn)}
+    assert stats["team_base_stats_summary"] == [2, 0, 0]
+    assert conn.execute("SELECT year, league, team, salary, players FROM salary_histogram "
+                        "ORDER BY league").fetchall() == [
+        (1950, "American League", "Boston", 12500.0, 1), (1950, "National League", "Chicago", 9000.0, 1)]
+
+    salaries = [("aaa01", "7", 13000.5, 1950, "Boston"), ("bbb01", "3", 9000.0, 1950, "Chicago")]
+    sql_database.load_tables(conn, tables(salaries=salaries))
+    stats = {table: counts for table, _, _, *counts in sql_database.refresh_summaries(conn)}
+    assert stats["salary_histogram"] == [1, 0, 1]
+    assert conn.execute("SELECT salary FROM salary_histogram WHERE league = 'American League'").fetchall() == [
+        (13000.5,)]
+
+
+def test_migrate_rebuilds_the_salary_histogram_of_older_databases(conn):
+    conn.execute("DROP TABLE salary_histogram")
+    conn.execute("CREATE TABLE salary_histogram (year INTEGER NOT NULL, league TEXT NOT NULL, team TEXT NOT NULL, "
+                 "salary_bin INTEGER NOT NULL, players INTEGER NOT NULL, "
+                 "PRIMARY KEY (year, league, team, salary_bin))")
+    sql_database.migrate(conn)
+    sql_database.load_tables(conn, tables())
+    sql_database.refresh_summaries(conn)
+    assert conn.execute("SELECT COUNT(*) FROM salary_histogram WHERE salary = 12500").fetchone() == (1,)
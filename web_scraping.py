@@ -1,161 +1,254 @@
-"""This program gathers data from the website https://www.baseball-almanac.com/ 
-via web scraping with Selenium"""
+"""This program gathers data from the website https://www.baseball-almanac.com/
+via web scraping. Pages are fetched concurrently over plain HTTP (see fetcher.py),
+with Selenium only as a fallback, and parsed from their raw html (see page_parser.py).
+--trace and --metrics record how long each stage, fetch and parse took, and the
+pages which failed or were retried (see instrumentation.py)"""
+import argparse
+import sys
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import pandas as pd
-
-# initialize Selenium and the appropriate driver
-# configure driver to run in 'headless' mode
-options = Options()
-options.add_argument('--headless')  # Enable headless mode
-options.add_argument('--disable-gpu')  # Optional, recommended for Windows
-options.add_argument('user-agent=Mozilla/5.0')
-options.add_argument("--log-level=3")
-
-# fetch a web page
-yearly_data = []
-base_running_stats = []
-player_salary = []
-
-try:
-    driver = webdriver.Chrome(options=options)
-
-    # visit the website for bases stolen leadership board
-    driver.get("https://www.baseball-almanac.com/hitting/hisb4.shtml")
-    wait = WebDriverWait(driver, 10)
-
-    # look for a table
-    table = wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-    rows = table.find_elements(By.TAG_NAME, "tr")[1:]
-
-    # gather all data from leadership board and store to a table called yearly data
-    for row in rows:
-        try:
-            cells = row.find_elements(By.TAG_NAME, "td")
-            if len(cells) == 8:
-                year_al = cells[0].text.strip()
-                player_al = cells[1]
-                bases_al = cells[2].text.strip()
-                team_al = cells[3].text.strip()
-
-                year_nl = cells[4].text.strip()
-                player_nl = cells[5]
-                bases_nl = cells[6].text.strip()
-                team_nl = cells[7].text.strip()
-
-                # to gather data on players, their id must be gathered and stored
-                # the id can be found as part of the link, at the end. Only the ending player id is gathered not the entire link
-                player_al_id = ""
-                player_al_name = player_al.text.strip()
-                player_al_href = player_al.find_elements(By.CSS_SELECTOR, 'a[href]')
-                if player_al_href:
-                    player_al_link = player_al_href[0].get_attribute('href').strip()
-                    _, _, player_al_id = player_al_link.partition("p=")
-
-                player_nl_id = ""
-                player_nl_name = player_nl.text.strip()
-                player_nl_href = player_nl.find_elements(By.CSS_SELECTOR, 'a[href]')
-                if player_nl_href:
-                    player_nl_link = player_nl_href[0].get_attribute('href').strip()
-                    _, _, player_nl_id = player_nl_link.partition("p=")
-                
-                # add row from table on website to table yearly data
-                yearly_data.append([year_al, "American League", player_al_id, player_al_name, team_al, bases_al])
-                yearly_data.append([year_nl, "National League", player_nl_id, player_nl_name, team_nl, bases_nl])
-
-        except Exception as row_err:
-            print(f"Row Exception: {type(row_err).__name__} {row_err}")
-
-    # once yearly data has be retrieved, need to gather data on players
-    # to not go to the same player pager multiple time, unique values were gathered
-    player_ids = list(set(row[2] for row in yearly_data if row[2]))
-    index = 0
-
-    # go to each player's page. The base link is the same but the player ids differ
-    # This player id will allow for it to be easier to match between the yearly table
-    # and table related to players
-    for player in player_ids:
-        index = index + 1
-        print(f"Page {index} of {len(player_ids)}") # used to help keep track of how many pages were scraped
+
+import instrumentation
+from fetcher import Fetcher, FetchConfig, BASE_URL, leaderboard_url, player_url
+from incremental import ACTIVE_WINDOW, players_to_fetch
+from page_cache import PageCache
+from page_parser import BACKENDS, parse_leaderboard, parse_player_page
+from scrape_queue import DONE, ScrapeQueue
+from sinks import FORMATS, open_sink, read_rows
+
+
+# gather all data from leadership board and return it as the yearly data table
+def scrape_leaderboard(fetcher, parser=None):
+    html = fetcher.fetch(leaderboard_url(fetcher.config.base_url))
+    start = time.perf_counter()
+    yearly_data = parse_leaderboard(html, parser)
+    instrumentation.observe("parse_seconds", time.perf_counter() - start, page="leaderboard")
+    return yearly_data
+
+
+# go to each player's page. The base link is the same but the player ids differ
+# This player id will allow for it to be easier to match between the yearly table
+# and table related to players
+# every page is a job in the queue: its rows are saved as soon as it is scraped,
+# then streamed to the raw data sinks, and pages which fail are tried again after a backoff
+# returns the number of rows scraped
+def scrape_players(fetcher, queue, sinks, parser=None):
+    total = sum(queue.counts().values())
+    rows = 0
+    while True:
+        due = queue.due()
+        if not due:
+            wait = queue.next_due_in()
+            if wait is None:
+                break
+            print(f"Waiting {wait:.0f}s to retry failed pages")
+            # the sinks only flush when written to, so write out what they hold before waiting
+            for sink in sinks.values():
+                sink.flush()
+            time.sleep(wait)
+            continue
+
+        urls = {player_url(player, fetcher.config.base_url): player for player in due}
+        for url, html, error in fetcher.fetch_many(urls):
+            player = urls[url]
+            try:
+                if error is not None:
+                    raise error
+                start = time.perf_counter()
+                stats_rows, salary_rows = parse_player_page(html, player, parser)
+                instrumentation.observe("parse_seconds", time.perf_counter() - start, page="player")
+            except Exception as e:
+                retry = queue.fail(player, e)
+                instrumentation.count("page_errors_total", error=type(e).__name__)
+                instrumentation.count("page_retries_total" if retry else "pages_failed_total")
+                print(f"Exception: {type(e).__name__} {e} ({'will retry' if retry else 'giving up'})")
+                continue
+            queue.complete(player, stats_rows, salary_rows)
+            sinks["base_running_stats"].write_many(stats_rows)
+            sinks["player_salary"].write_many(salary_rows)
+            instrumentation.count("pages_total")
+            instrumentation.count("rows_total", len(stats_rows), stage="scrape", table="base_running_stats")
+            instrumentation.count("rows_total", len(salary_rows), stage="scrape", table="player_salary")
+            rows += len(stats_rows) + len(salary_rows)
+            print(f"Page {queue.counts().get(DONE, 0)} of {total}") # used to help keep track of how many pages were scraped
+    return rows
+
+
+RAW_TABLES = {
+    "bases_stolen_league_leaders": ["Year", "League",
+                                    "Player ID", "Player Name",
+                                    "Team", "Bases Stolen"],
+    "base_running_stats": ["Player ID",
+                           "Team", "Stolen Bases (SB)",
+                           "Caught Stealing (CS)",
+                           "Stolen Bases Percentage"],
+    "player_salary": ["Player ID", "Team",
+                      "Uniform Numbers", "Salary"],
+}
+PLAYER_TABLES = ("base_running_stats", "player_salary")
+
+
+# open a sink for each raw data table, starting the files over
+def open_raw_sinks(output_format="csv", directory="raw_data", **kwargs):
+    sinks = {}
+    try:
+        for name, columns in RAW_TABLES.items():
+            sinks[name] = open_sink(output_format, directory, name, columns, **kwargs)
+    except Exception:
+        close_sinks(sinks)
+        raise
+    return sinks
+
+
+def close_sinks(sinks):
+    for name, sink in sinks.items():
+        sink.close()
+        print(f"Saved {name} ({sink.rows_written} rows)")
+
+
+# write everything the queue already holds which will not change in this run:
+# the leadership board, and the rows of players who are done or were not queued
+def replay(queue, sinks):
+    sinks["bases_stolen_league_leaders"].write_many(queue.load_leaderboard())
+    for name in PLAYER_TABLES:
+        sinks[name].write_many(queue.settled_rows(name))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape stolen base leaders and their player pages.")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of player pages fetched at the same time")
+    parser.add_argument("--rate", type=float, default=0.2,
+                        help="requests per second allowed against the website")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="requests allowed back to back before the rate applies")
+    parser.add_argument("--timeout", type=float, default=10,
+                        help="seconds to wait for a page before giving up on it")
+    parser.add_argument("--base-url", default=BASE_URL,
+                        help="website to scrape, e.g. a local server of saved pages")
+    parser.add_argument("--no-selenium-fallback", action="store_true",
+                        help="never open a browser for pages plain HTTP cannot read")
+    parser.add_argument("--parser", choices=list(BACKENDS), default=None,
+                        help="html parser to use, defaults to the fastest one installed")
+    parser.add_argument("--cache-dir", default="cache/pages",
+                        help="directory pages are cached in between runs")
+    parser.add_argument("--cache-ttl", type=float, default=24,
+                        help="hours a cached page is used before checking whether it changed")
+    parser.add_argument("--cache-max-mb", type=float, default=512,
+                        help="size the page cache is kept under")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="download every page again")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only scrape players who are new or may have played since the database was built")
+    parser.add_argument("--db", default="db/base_running.db",
+                        help="database compared against in incremental mode")
+    parser.add_argument("--active-window", type=int, default=ACTIVE_WINDOW,
+                        help="in incremental mode, players whose last season is within this many years "
+                             "of the newest season in the database are scraped again")
+    parser.add_argument("--jobs-db", default="cache/scrape_jobs.db",
+                        help="file the scrape's progress is saved in, so a stopped run can resume")
+    parser.add_argument("--fresh", action="store_true",
+                        help="start over instead of resuming an unfinished run")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="when resuming, try again the pages an earlier run gave up on")
+    parser.add_argument("--max-attempts", type=int, default=4,
+                        help="times a page is tried before giving up on it")
+    parser.add_argument("--retry-delay", type=float, default=30,
+                        help="seconds before the first retry of a failed page, doubled on each retry")
+    parser.add_argument("--output-format", choices=FORMATS, default="csv",
+                        help="format the raw data tables are written in")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="rows buffered before they are written out")
+    parser.add_argument("--flush-interval", type=float, default=5,
+                        help="seconds after which buffered rows are written out regardless")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+# scrape the website into raw_data, returning 0 when every page was scraped or given up on,
+# or 1 when the scrape stopped part way and raw_data only holds some of the rows
+def main(argv=None):
+    args = parse_args(argv)
+    instrumentation.configure(args.trace, args.metrics)
+    config = FetchConfig(max_workers=args.workers,
+                         requests_per_second=args.rate,
+                         burst=args.burst,
+                         timeout=args.timeout,
+                         base_url=args.base_url,
+                         selenium_fallback=not args.no_selenium_fallback)
+
+    cache = None
+    if not args.no_cache:
+        cache = PageCache(args.cache_dir,
+                          ttl=args.cache_ttl * 60 * 60,
+                          max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+    queue = ScrapeQueue(args.jobs_db,
+                        max_attempts=args.max_attempts,
+                        base_delay=args.retry_delay)
+    sinks = {}
+    finished = False
+
+    try:
+        with Fetcher(config, cache=cache) as fetcher, instrumentation.span("scrape"):
+            resume = ((queue.unfinished() or (args.retry_failed and queue.failures()))
+                      and not args.fresh
+                      and queue.meta("incremental") == str(args.incremental))
+            if resume:
+                print(f"Resuming unfinished scrape: {queue.counts()}")
+            else:
+                queue.reset(incremental=args.incremental)
+                with instrumentation.span("leaderboard") as span:
+                    yearly_data = scrape_leaderboard(fetcher, args.parser)
+                    span.rows = len(yearly_data)
+                instrumentation.count("rows_total", len(yearly_data), stage="scrape",
+                                      table="bases_stolen_league_leaders")
+                queue.save_leaderboard(yearly_data)
+
+                # once yearly data has be retrieved, need to gather data on players
+                # to not go to the same player pager multiple time, unique values were gathered
+                player_ids = list(set(row[2] for row in yearly_data if row[2]))
+                if args.incremental:
+                    player_ids = sorted(players_to_fetch(yearly_data, args.db, args.active_window))
+                    print(f"Incremental: scraping {len(player_ids)} player pages")
+                    # the rows scraped last time are kept, except for players scraped again
+                    queue.import_rows(*(read_rows(args.output_format, "raw_data", name)
+                                        for name in PLAYER_TABLES))
+                queue.enqueue(player_ids)
+
+            if args.retry_failed:
+                print(f"Retrying {queue.retry_failed()} failed pages")
+
+            sinks = open_raw_sinks(args.output_format,
+                                   batch_size=args.batch_size,
+                                   flush_interval=args.flush_interval)
+            replay(queue, sinks)
+            with instrumentation.span("player_pages") as span:
+                span.rows = scrape_players(fetcher, queue, sinks, args.parser)
+
+            for player, attempts, error in queue.failures():
+                print(f"Failed after {attempts} attempts: {player} {error}")
+            # players whose page could not be scraped keep the rows they had
+            for name in PLAYER_TABLES:
+                sinks[name].write_many(queue.failed_rows(name))
+        finished = True
+    except Exception as e:
+        print(f"Exception: {type(e).__name__} {e}")
+    finally:
+        if cache is not None:
+            cache.close()
         try:
-            # go to each indivual player page
-            time.sleep(5)
-            driver.get(f"https://www.baseball-almanac.com/players/player.php?p={player}")
-            wait = WebDriverWait(driver, 10)
-
-            # get all tables on page
-            tables = driver.find_elements(By.TAG_NAME, "table")
-
-            # get second to last table, which stores overall base running stats
-            base_running_stats_table = tables[-2]
-            brs_rows = base_running_stats_table.find_elements(By.TAG_NAME, "tr")[1:]
-            for row in brs_rows:
-                try:
-                    cells = row.find_elements(By.TAG_NAME, "td")
-
-                    if len(cells) == 13:
-                        team = cells[0].text.strip()
-                        sb = cells[1].text.strip()
-                        cs = cells[2].text.strip()
-                        sb_per = cells[3].text.strip()
-
-                        # add to base running stats table
-                        base_running_stats.append([player, team, sb, cs, sb_per])
-
-                except Exception as row_err:
-                    print(f"Row Exception: {type(row_err).__name__} {row_err}")
-
-            # get last table which stores information on player salary
-            salary_table = tables[-1]
-            salary_rows = salary_table.find_elements(By.TAG_NAME, "tr")[1:]
-            for row in salary_rows:
-                try:
-                    cells = row.find_elements(By.TAG_NAME, "td")
-
-                    if len(cells) == 5:
-                        team_roster = cells[0].text.strip()
-                        uniform_number = cells[1].text.strip()
-                        salary = cells[2].text.strip()
-
-                        # add to player salary table
-                        player_salary.append([player, team_roster, uniform_number, salary])
-
-                except Exception as row_err:
-                    print(f"Row Exception: {type(row_err).__name__} {row_err}")
-        except Exception as e:
-            print(f"Exception: {type(e).__name__} {e}")
-except Exception as e:
-    print(f"Exception: {type(e).__name__} {e}")
-
-finally:
-    driver.quit()
-
-try:
-    # store each table into a csv file
-    yearly_df = pd.DataFrame(yearly_data,
-                             columns=["Year", "League",
-                                      "Player ID", "Player Name",
-                                      "Team", "Bases Stolen"])
-    yearly_df.to_csv("raw_data/bases_stolen_league_leaders.csv", index=False)
-    print("Saved bases_stolen_league_leaders.csv")
-
-    base_stat_df = pd.DataFrame(base_running_stats,
-                                columns=["Player ID",
-                                         "Team", "Stolen Bases (SB)",
-                                         "Caught Stealing (CS)",
-                                         "Stolen Bases Percentage"])
-    base_stat_df.to_csv("raw_data/base_running_stats.csv", index=False)
-    print("Saved base_running_stats.csv")
-
-    salary_df = pd.DataFrame(player_salary,
-                             columns=["Player ID", "Team",
-                                      "Uniform Numbers", "Salary"])
-    salary_df.to_csv("raw_data/player_salary.csv", index=False)
-    print("Saved player_salary.csv")
-
-except Exception as file_err:
-    print(f"File Exception: {type(file_err).__name__} {file_err}")
+            close_sinks(sinks)
+        except Exception as file_err:
+            print(f"File Exception: {type(file_err).__name__} {file_err}")
+            finished = False
+        if queue.unfinished():
+            finished = False
+            print(f"Scrape stopped with pages left to do: {queue.counts()}. "
+                  "Run again to resume.")
+        queue.close()
+        instrumentation.close()
+    return 0 if finished else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())